@@ -5,16 +5,45 @@ https://github.com/jpgallegoar/Spanish-F5
 """
 
 import os
-import io
-import gc
-import sys
+import json
+import re
 import time
 import uuid
 import logging
+import threading
 import soundfile as sf
 import numpy as np
-from flask import Flask, request, jsonify, send_file
-from datetime import datetime
+from flask import Flask, request, jsonify, send_file, Response, stream_with_context
+from concurrent.futures import (
+    ThreadPoolExecutor, Future, CancelledError, TimeoutError as FutureTimeoutError, wait, FIRST_COMPLETED
+)
+
+from reference_cache import ReferenceCache
+from f5_inference import supports_conditioning, infer_with_conditioning, infer_batch, cross_fade
+from worker_pool import WorkerPool, CLI_WORKERS, cpu_pool_layout
+from scheduler import (
+    InferenceScheduler, QueueFullError, DeadlineExceededError, JobCancelledError,
+    PRIORITIES, MAX_BATCH_SIZE
+)
+from audio_cache import AudioCache, cache_key
+from debug_capture import DebugCapture
+from voices import VoiceRegistry
+from readiness import Readiness
+from quality import (
+    QualitySelector, QUALITY_TIER, AUTO as AUTO_QUALITY, TIERS as QUALITY_TIERS, DEFAULT_TIER as DEFAULT_QUALITY,
+    ESTIMATED_CHARS_PER_SECOND, with_model_solver
+)
+from longform import LongFormRender, LONG_FORM_MIN_CHARS
+from singleflight import SingleFlight
+from phrase_store import PhraseStore, load_catalog, PHRASE_CATALOG
+from memory_governor import MemoryGovernor, MemoryBudgetError, reference_seconds
+from cost_model import CostModel, CROSS_FADE_SECONDS
+import spanish_text
+import bulk
+import postprocess
+import metrics
+import encoding
+from encoding import to_pcm16, wav_stream_header
 
 # Configurar logging
 logging.basicConfig(level=logging.INFO)
@@ -24,58 +53,180 @@ app = Flask(__name__)
 
 # Variables globales - usar variables de entorno
 f5_model = None
-device = "cuda" if os.system("nvidia-smi > /dev/null 2>&1") == 0 else "cpu"
+device = None  # Se detecta al inicializar el modelo (detect_device)
 model_name = os.getenv('F5_MODEL', 'jpgallegoar/F5-Spanish')
-debug_dir = "/app/debug_audio"
-
-# Configuración de voces españolas
-SPANISH_VOICES = {
-    'default': os.getenv('DEFAULT_VOICE', 'es_female'),
-    'language': os.getenv('DEFAULT_LANGUAGE', 'es'),
-    'model': 'spanish-f5',
-    'voices': {
-        'default': os.getenv('DEFAULT_VOICE', 'es_female'),
-        'female': ['es_female', 'es_maria', 'es_elena', 'es_sofia'],
-        'male': ['es_male', 'es_carlos', 'es_diego', 'es_pablo']
-    }
-}
+checkpoint_id = "jpgallegoar/F5-Spanish/model_1200000.safetensors"
+
+# Resolución del checkpoint y del vocoder: primero la caché local, la red solo si faltan
+MODELS_DIR = os.getenv('MODELS_DIR', '/app/models')
+CHECKPOINT_REPO = "jpgallegoar/F5-Spanish"
+CHECKPOINT_FILE = "model_1200000.safetensors"
+VOCODER_REPO = "charactr/vocos-mel-24khz"
+VOCODER_FILES = ("config.yaml", "pytorch_model.bin")
+MODELS_OFFLINE = os.getenv('HF_HUB_OFFLINE', '0').lower() in ('1', 'true')
+
+# Calentamiento: una síntesis corta por voz antes de declararse listo
+WARMUP = os.getenv('WARMUP', 'true').lower() == 'true'
+WARMUP_TEXT = os.getenv('WARMUP_TEXT', 'Hola, esto es una prueba de calentamiento.')
+
+# Estado del arranque para /ready
+readiness = Readiness()
+
+# Registro de voces (manifiesto del directorio de referencias, recargado si cambia)
+voice_registry = VoiceRegistry()
+
+# Nivel de muestreo (NFE, solver, sway) por petición, con bajada automática bajo carga
+quality_selector = QualitySelector()
+
+# Caché de referencias preprocesadas (audio en el dispositivo + texto tokenizado)
+reference_cache = ReferenceCache()
+
+# Pool de workers persistentes (método CLI o modo CPU multiproceso)
+cli_pool = None
+
+# Caché de audio sintetizado (memoria + disco compartido entre réplicas)
+audio_cache = AudioCache()
+
+# Captura de audio de debug en segundo plano (muestreo, cuotas e índice SQLite)
+debug_capture = DebugCapture()
+
+# Frases frecuentes del catálogo pre-renderizadas (archivo empaquetado y mapeado en memoria)
+phrase_store = PhraseStore()
+
+# Presupuesto de memoria de la inferencia: admisión, partición de lotes y liberación
+memory_governor = MemoryGovernor()
+
+# Duración y cómputo previstos de cada síntesis, calibrados con los lotes ejecutados
+cost_model = CostModel()
+
+# Síntesis idénticas en curso: una sola inferencia para todas las peticiones
+in_flight_syntheses = SingleFlight()
+
+# Post-procesado y guardado en caché al terminar cada síntesis (fuera de los ejecutores del modelo)
+postprocess_executor = ThreadPoolExecutor(max_workers=int(os.getenv('POSTPROCESS_WORKERS', 4)), thread_name_prefix="f5-post")
+
+# Cambiar al modificar improve_audio_clarity: invalida la caché de audio
+POSTPROCESS_VERSION = "clarity-v2-sos-f32"
+
+# Streaming por frases: frecuencia de salida y frases sintetizadas por adelantado
+STREAM_SAMPLE_RATE = 24000
+STREAM_LOOKAHEAD = int(os.getenv('STREAM_LOOKAHEAD', 1))
+STREAM_MAX_SENTENCE_CHARS = int(os.getenv('STREAM_MAX_SENTENCE_CHARS', 200))
+
+DEFAULT_LANGUAGE = os.getenv('DEFAULT_LANGUAGE', 'es')
+
+class ModelUnavailableError(Exception):
+    """El modelo no está cargado: el servicio no puede atender síntesis"""
+
+def detect_device():
+    """Dispositivo del modelo: F5_DEVICE o CUDA si torch la ve (sin lanzar nvidia-smi)"""
+    global device
+    if device is None:
+        device = os.getenv('F5_DEVICE')
+        if not device:
+            import torch
+            device = "cuda" if torch.cuda.is_available() else "cpu"
+        logger.info(f"🖥️  Dispositivo: {device}")
+    return device
+
+def resolve_checkpoint():
+    """Ruta del checkpoint español: F5_CHECKPOINT, caché local o, si falta, descarga"""
+    explicit = os.getenv('F5_CHECKPOINT')
+    if explicit and os.path.isfile(explicit):
+        return explicit
+    
+    local = find_spanish_checkpoint()
+    if local:
+        logger.info(f"📦 Checkpoint en caché local: {local}")
+        return local
+    if MODELS_OFFLINE:
+        return None
+    
+    from huggingface_hub import hf_hub_download
+    logger.info("⬇️  Checkpoint no encontrado en caché, descargando de HuggingFace Hub...")
+    return hf_hub_download(repo_id=CHECKPOINT_REPO, filename=CHECKPOINT_FILE, cache_dir=MODELS_DIR)
+
+def resolve_vocoder_dir():
+    """Directorio local con el vocoder Vocos, descargándolo a MODELS_DIR solo la primera vez"""
+    try:
+        from huggingface_hub import try_to_load_from_cache, hf_hub_download
+    except ImportError:
+        return None
+    
+    paths = []
+    for filename in VOCODER_FILES:
+        path = None
+        for cache_dir in (MODELS_DIR, None):
+            cached = try_to_load_from_cache(VOCODER_REPO, filename, cache_dir=cache_dir)
+            if isinstance(cached, str):
+                path = cached
+                break
+        if path is None and not MODELS_OFFLINE:
+            try:
+                path = hf_hub_download(repo_id=VOCODER_REPO, filename=filename, cache_dir=MODELS_DIR)
+            except Exception as e:
+                logger.warning(f"⚠️  No se pudo descargar el vocoder: {e}")
+        if path is None:
+            return None
+        paths.append(path)
+    
+    directories = {os.path.dirname(path) for path in paths}
+    return directories.pop() if len(directories) == 1 else None
 
 def initialize_spanish_f5():
     """Inicializar el modelo Spanish-F5 oficial usando el método correcto"""
     global f5_model
     
     try:
-        logger.info(f"🇪🇸 Inicializando Spanish-F5 oficial desde HuggingFace")
+        logger.info(f"🇪🇸 Inicializando Spanish-F5 oficial")
         logger.info(f"📦 Modelo: {model_name}")
         
-        # Crear directorio de debug
-        os.makedirs(debug_dir, exist_ok=True)
+        # Directorio e índice de debug, y escritor en segundo plano
+        debug_capture.start()
+        
+        # Registro de voces: se lee una vez aquí, no en cada síntesis
+        voice_registry.load()
         
-        # Método 1: Intentar cargar directamente desde HuggingFace
-        logger.info("⏳ Método 1: Cargando desde HuggingFace Hub...")
+        # Método 1: checkpoint de la caché local (HuggingFace Hub solo si no está)
+        logger.info("⏳ Método 1: Cargando checkpoint Spanish-F5...")
         try:
-            from huggingface_hub import hf_hub_download
-            import torch
+            with readiness.track('resolve_checkpoint'):
+                model_path = resolve_checkpoint()
+                vocoder_dir = resolve_vocoder_dir()
+            if not model_path:
+                raise FileNotFoundError(f"Checkpoint {CHECKPOINT_FILE} no disponible sin conexión")
             
-            # Descargar modelo español específico
-            model_path = hf_hub_download(
-                repo_id="jpgallegoar/F5-Spanish",
-                filename="model_1200000.safetensors",
-                cache_dir="/app/models"
-            )
+            logger.info(f"✅ Modelo localizado: {model_path}")
             
-            logger.info(f"✅ Modelo descargado: {model_path}")
+            # Solo CPU: varios procesos con el modelo, cada uno en sus núcleos
+            if detect_device() == "cpu":
+                cpu_sets = cpu_pool_layout()
+                if cpu_sets:
+                    with readiness.track('load_model'):
+                        if start_cpu_pool(model_path, cpu_sets):
+                            return True
             
-            # Inicializar con el modelo español
-            from f5_tts.api import F5TTS
-            f5_model = F5TTS(
-                model_type="F5-TTS",
-                ckpt_file=model_path,
-                vocab_file=None,  # Usar vocab por defecto
-                ode_method="euler",
-                use_ema=True,
-                device=device
-            )
+            with readiness.track('load_model'):
+                import inspect
+                from f5_tts.api import F5TTS
+                
+                # Vocoder desde disco: sin consultas a la red en cada arranque
+                vocoder_kwargs = {}
+                parameters = inspect.signature(F5TTS).parameters
+                for name in ('local_path', 'vocoder_local_path'):
+                    if vocoder_dir and name in parameters:
+                        vocoder_kwargs[name] = vocoder_dir
+                
+                # Inicializar con el modelo español
+                f5_model = F5TTS(
+                    model_type="F5-TTS",
+                    ckpt_file=model_path,
+                    vocab_file=None,  # Usar vocab por defecto
+                    ode_method="euler",
+                    use_ema=True,
+                    device=device,
+                    **vocoder_kwargs
+                )
             
             logger.info("✅ Spanish-F5 inicializado con modelo HuggingFace")
             return True
@@ -91,13 +242,165 @@ def initialize_spanish_f5():
         logger.error(f"❌ Error inicializando Spanish-F5: {e}")
         return initialize_f5_cli_method()
 
+def start_cpu_pool(model_path, cpu_sets):
+    """Modo CPU: un worker por bloque de núcleos, con el audio de vuelta por memoria compartida"""
+    global f5_model, cli_pool
+    
+    try:
+        pool = WorkerPool(model_path, device="cpu", cpu_sets=cpu_sets)
+        pool.start()
+    except Exception as e:
+        logger.warning(f"⚠️  Pool CPU no disponible, se usa un único modelo: {e}")
+        return False
+    
+    cli_pool = pool
+    # Un ejecutor del planificador por worker; el pool reparte al menos cargado
+    batch_scheduler.configure(executors=pool.size, max_batch_size=1)
+    f5_model = {"method": "pool", "available": True}
+    logger.info(f"✅ Pool CPU listo: {pool.size} workers x {len(cpu_sets[0])} hilos")
+    return True
+
+def warmup_model():
+    """Una síntesis corta por voz registrada antes de recibir tráfico
+    
+    Inicializa kernels y vocoder, y deja cada referencia preprocesada en la
+    caché. Pasa por el planificador (mismo camino que las peticiones) pero
+    no por la caché de audio.
+    """
+    if not WARMUP or f5_model is None:
+        return
+    if isinstance(f5_model, dict) and f5_model.get("method") == "cli" and cli_pool is None:
+        logger.info("⏭️  Calentamiento omitido: el CLI de un solo uso no conserva estado")
+        return
+    
+    voices = voice_registry.list()
+    logger.info(f"🔥 Calentando el modelo con {len(voices)} voces...")
+    with readiness.track('warmup'):
+        # Filtros de claridad (importa scipy.signal una vez, fuera de las peticiones)
+        postprocess.design_filters(STREAM_SAMPLE_RATE)
+        if cli_pool is not None:
+            # Cada worker tiene su propio modelo y caché de referencias: se calientan todos
+            cli_pool.warmup([(WARMUP_TEXT, voice.file, voice.text) for voice in voices])
+            return
+        for voice in voices:
+            started = time.time()
+            try:
+                wav_data, sample_rate = batch_scheduler.submit(WARMUP_TEXT, voice.file, 1.0, priority='high').result()
+                improve_audio_clarity(wav_data, sample_rate)
+                logger.info(f"🔥 Voz {voice.id} caliente en {time.time() - started:.2f}s")
+            except Exception as e:
+                logger.warning(f"⚠️  Calentamiento de {voice.id} falló: {e}")
+
+def phrase_store_signature():
+    """Lo que invalida el almacén de frases entero: checkpoint y post-procesado"""
+    return f"{checkpoint_id}|{POSTPROCESS_VERSION}"
+
+def phrase_catalog_keys():
+    """Clave de caché -> parámetros de cada frase del catálogo con cada voz
+    
+    Se renderizan con el nivel que elige 'auto' sin carga (el techo), que es
+    también el que se busca primero en el almacén.
+    """
+    keys = {}
+    voices = [voice.id for voice in voice_registry.list()]
+    for phrase in load_catalog(PHRASE_CATALOG):
+        for voice in ([phrase['voice']] if phrase['voice'] else voices):
+            key = synthesis_cache_key(phrase['text'], voice, phrase['speed'], True, catalog_quality())
+            keys.setdefault(key, (dict(phrase, voice=voice), []))
+    return keys
+
+def prerender_phrase_catalog():
+    """Sintetizar las frases del catálogo que falten en el almacén y reescribirlo"""
+    if not PHRASE_CATALOG or f5_model is None:
+        return
+    try:
+        phrase_store.load()
+        keys = phrase_catalog_keys()
+        signature = phrase_store_signature()
+        missing = phrase_store.missing(keys, signature)
+        if not missing:
+            logger.info(f"🗂️  Catálogo de frases al día: {len(keys)} audios")
+            return
+        
+        logger.info(f"🗂️  Pre-renderizando {len(missing)} de {len(keys)} frases del catálogo...")
+        started = time.time()
+        rendered = {}
+        
+        def submit(phrase):
+            return submit_synthesis(
+                phrase['text'], phrase['voice'], phrase['speed'], priority='low',
+                endpoint='phrase_catalog', quality=catalog_quality(), long_form=False
+            )
+        
+        groups = {key: keys[key] for key in missing}
+        for key, phrase, _, future in bulk.run_groups(groups, submit):
+            try:
+                rendered[key] = future.result()
+            except Exception as e:
+                logger.warning(f"⚠️  Frase del catálogo no renderizada ('{phrase['text'][:30]}', {phrase['voice']}): {e}")
+        
+        phrase_store.write(signature, keys, rendered)
+        logger.info(f"🗂️  Catálogo renderizado en {time.time() - started:.1f}s")
+    except Exception as e:
+        logger.error(f"❌ Error pre-renderizando el catálogo de frases: {e}")
+
+def startup():
+    """Arranque completo: modelo, calentamiento y marca de listo para /ready"""
+    try:
+        if not initialize_spanish_f5():
+            readiness.mark_failed("No se pudo inicializar Spanish-F5")
+            return False
+        # Con el modelo ya en memoria: lo que queda libre es lo que se puede repartir.
+        # Con workers o CLI el modelo vive en otros procesos que este no puede medir
+        memory_governor.configure(device, enabled=not isinstance(f5_model, dict))
+        warmup_model()
+        readiness.mark_ready()
+        # Listo para tráfico: el catálogo se completa en segundo plano, con prioridad baja
+        threading.Thread(target=prerender_phrase_catalog, name="f5-phrases", daemon=True).start()
+        return True
+    except Exception as e:
+        logger.error(f"❌ Error en el arranque: {e}")
+        readiness.mark_failed(e)
+        return False
+
+def start_background_startup():
+    """Arrancar en segundo plano: /health responde mientras se carga el modelo
+    
+    Si la inicialización falla el proceso termina, como antes, para que el
+    orquestador lo reinicie.
+    """
+    def run():
+        if not startup():
+            logger.error("❌ Error inicializando modelo")
+            logging.shutdown()
+            os._exit(1)
+    
+    thread = threading.Thread(target=run, name="f5-startup", daemon=True)
+    thread.start()
+    return thread
+
 def initialize_f5_cli_method():
     """Método alternativo usando comandos CLI de F5-TTS"""
-    global f5_model
+    global f5_model, cli_pool, checkpoint_id
     
     try:
         logger.info("🔧 Intentando método CLI alternativo...")
         
+        # Preferir workers persistentes que cargan el modelo una sola vez
+        spanish_model_path = find_spanish_checkpoint()
+        if spanish_model_path and CLI_WORKERS > 0:
+            try:
+                pool = WorkerPool(spanish_model_path)
+                pool.start()
+                cli_pool = pool
+                # Un ejecutor del planificador por worker, sin lotes (cada worker atiende uno)
+                batch_scheduler.configure(executors=pool.size, max_batch_size=1)
+                logger.info(f"✅ {pool.size} workers Spanish-F5 persistentes listos")
+                f5_model = {"method": "cli", "available": True}
+                return True
+            except Exception as e:
+                logger.warning(f"⚠️  Workers persistentes no disponibles: {e}")
+        
         # Verificar si f5-tts_infer-cli está disponible
         import subprocess
         result = subprocess.run(['which', 'f5-tts_infer-cli'], 
@@ -105,6 +408,9 @@ def initialize_f5_cli_method():
         
         if result.returncode == 0:
             logger.info("✅ CLI f5-tts_infer-cli disponible")
+            if not spanish_model_path:
+                checkpoint_id = "f5-tts_infer-cli/default"
+            batch_scheduler.configure(max_batch_size=1)
             f5_model = {"method": "cli", "available": True}
             return True
         else:
@@ -115,77 +421,34 @@ def initialize_f5_cli_method():
         logger.error(f"❌ Error en método CLI: {e}")
         return False
 
-def get_reference_audio():
-    """Obtener archivo de referencia español"""
-    references_dir = "/app/references"
+def find_spanish_checkpoint():
+    """Buscar el checkpoint español ya descargado en MODELS_DIR, sin usar la red"""
+    try:
+        from huggingface_hub import try_to_load_from_cache
+        cached = try_to_load_from_cache(CHECKPOINT_REPO, CHECKPOINT_FILE, cache_dir=MODELS_DIR)
+        if isinstance(cached, str):
+            return cached
+    except ImportError:
+        pass
     
-    if not os.path.exists(references_dir):
-        return None
-        
-    # Buscar archivos WAV
     import glob
-    wav_files = glob.glob(os.path.join(references_dir, "*.wav"))
-    
-    if wav_files:
-        return wav_files[0]  # Usar el primero disponible
-    
-    return None
+    spanish_models = glob.glob(
+        os.path.join(MODELS_DIR, "models--jpgallegoar--F5-Spanish", "**", CHECKPOINT_FILE), recursive=True
+    )
+    return spanish_models[0] if spanish_models else None
 
 def get_reference_text(audio_file):
     """Obtener el texto exacto correspondiente al archivo de referencia"""
-    # Mapeo de archivos de referencia a sus textos exactos
-    reference_texts = {
-        "es_masc_presentacion.wav": "Hola, soy Carlos y esta es mi voz natural hablando en español castellano.",
-        "es_masc_tecnico.wav": "La síntesis de texto a voz permite convertir cualquier texto escrito en audio hablado.",
-        "es_masc_geografia.wav": "España, México, Argentina, Colombia, Chile, Perú, Venezuela son países hispanohablantes.",
-        "es_masc_tiempo.wav": "Hoy hace sol, ayer llovió, mañana estará nublado, la temperatura es agradable.",
-        "es_masc_despedida.wav": "Gracias por escuchar esta grabación de referencia para el sistema de síntesis de voz."
-    }
-    
-    # Obtener nombre del archivo
-    filename = os.path.basename(audio_file)
-    
-    # Devolver texto correspondiente o texto genérico
-    return reference_texts.get(filename, "Esta es una voz de referencia en español con pronunciación natural.")
+    return voice_registry.text_for(audio_file)
 
+@metrics.stage('clarity')
 def improve_audio_clarity(wav_data, sample_rate):
     """Mejorar la claridad del audio sintetizado"""
     try:
-        import numpy as np
-        from scipy import signal
-        
         logger.info("🔧 Mejorando claridad del audio...")
         
-        # Convertir a numpy si no lo es
-        if not isinstance(wav_data, np.ndarray):
-            wav_data = np.array(wav_data)
-        
-        # 1. Normalización suave
-        max_val = np.max(np.abs(wav_data))
-        if max_val > 0:
-            wav_data = wav_data / max_val * 0.9
-        
-        # 2. Filtro pasa-altos suave para remover ruido de baja frecuencia
-        nyquist = sample_rate / 2
-        low_cutoff = 80 / nyquist  # Cortar por debajo de 80Hz
-        b_high, a_high = signal.butter(2, low_cutoff, btype='high')
-        wav_data = signal.filtfilt(b_high, a_high, wav_data)
-        
-        # 3. Realce de frecuencias medias (claridad de voz)
-        # Filtro pasa-banda para realzar 1-4kHz (rango de claridad vocal)
-        mid_low = 1000 / nyquist
-        mid_high = 4000 / nyquist
-        b_mid, a_mid = signal.butter(2, [mid_low, mid_high], btype='band')
-        mid_enhancement = signal.filtfilt(b_mid, a_mid, wav_data)
-        wav_data = wav_data + mid_enhancement * 0.15  # Realce sutil
-        
-        # 4. Suavizado de picos para evitar distorsión
-        wav_data = np.tanh(wav_data * 1.2) * 0.8
-        
-        # 5. Normalización final
-        max_val = np.max(np.abs(wav_data))
-        if max_val > 0:
-            wav_data = wav_data / max_val * 0.85
+        # Filtros precalculados por sample rate, todo en float32 (ver postprocess.py)
+        wav_data = postprocess.process(wav_data, sample_rate)
         
         logger.info("✅ Claridad mejorada")
         return wav_data
@@ -194,33 +457,262 @@ def improve_audio_clarity(wav_data, sample_rate):
         logger.warning(f"⚠️  Error mejorando claridad: {e}, usando audio original")
         return wav_data
 
-def synthesize_spanish_f5(text, voice="es_female", speed=1.0):
-    """Sintetizar usando Spanish-F5 oficial"""
+def synthesize_spanish_f5(text, voice="es_female", speed=1.0, clarity=True, priority='normal', deadline=None,
+                          endpoint='internal', quality=QUALITY_TIER, long_form=None):
+    """Sintetizar usando Spanish-F5 oficial
+    
+    Con clarity=False se devuelve la salida del modelo sin la cadena de
+    claridad, para que el llamador la aplique por bloques (streaming).
+    Si se pasa un plazo (deadline, instante time.time()) y vence, la
+    síntesis se cancela y se lanza DeadlineExceededError.
+    Con long_form el texto se sintetiza por segmentos concurrentes (ver
+    longform.py); por defecto, si pasa de LONG_FORM_MIN_CHARS bytes.
+    """
     try:
-        if f5_model is None:
-            raise Exception("Modelo Spanish-F5 no inicializado")
-        
-        logger.info(f"🎤 Sintetizando con Spanish-F5: '{text[:50]}...'")
-        logger.info(f"🎭 Voz: {voice}, Velocidad: {speed}")
-        
-        # Obtener archivo de referencia
-        ref_audio = get_reference_audio()
-        if not ref_audio:
-            raise Exception("No hay archivos de referencia disponibles")
-        
-        logger.info(f"📁 Usando referencia: {os.path.basename(ref_audio)}")
-        
-        # Verificar qué método usar
-        if isinstance(f5_model, dict) and f5_model.get("method") == "cli":
-            return synthesize_with_cli(text, ref_audio, speed)
-        else:
-            return synthesize_with_api(text, ref_audio, speed)
-        
+        future = submit_synthesis(text, voice, speed, clarity, priority, deadline, endpoint, quality, long_form)
+        return wait_synthesis(future, deadline)
     except Exception as e:
         logger.error(f"❌ Error en síntesis Spanish-F5: {e}")
         raise e
 
-def synthesize_with_api(text, ref_audio, speed=1.0):
+def wait_synthesis(future, deadline=None):
+    """Esperar el resultado de submit_synthesis; al vencer el plazo se cancela"""
+    timeout = max(0.0, deadline - time.time()) if deadline is not None else None
+    try:
+        return future.result(timeout=timeout)
+    except FutureTimeoutError:
+        future.cancel()
+        raise DeadlineExceededError("El plazo de la petición venció durante la síntesis")
+
+def synthesis_cache_key(text, voice, speed, clarity=True, quality=DEFAULT_QUALITY):
+    """Clave de caché del audio que produciría submit_synthesis con estos parámetros
+    
+    Se usa la voz resuelta (alias y voces desconocidas incluidos) y la huella
+    de su referencia: sustituir el WAV o la transcripción invalida la caché.
+    `quality` es un nivel concreto (no 'auto'): cada nivel produce otro audio.
+    """
+    resolved = voice_registry.get(voice)
+    voice_key = resolved.fingerprint if resolved else voice
+    return cache_key(
+        spanish_text.normalize(text), voice_key, speed, checkpoint_id,
+        POSTPROCESS_VERSION if clarity else "raw", QUALITY_TIERS[quality].signature
+    )
+
+def estimate_cost(text, ref_audio, speed, tier):
+    """Duración y cómputo previstos de sintetizar `text` (ya normalizado) con la referencia"""
+    return cost_model.estimate(
+        text, speed, tier, reference_seconds(ref_audio),
+        len((get_reference_text(ref_audio) or '').encode('utf-8')), voice=ref_audio
+    )
+
+def select_quality(quality, text, speed, deadline=None, ref_audio=None, priority=None, record=True):
+    """Nivel de muestreo de una síntesis: el pedido o el que permite la carga actual
+    
+    Con `ref_audio` el plazo se contrasta con el modelo de coste y con la
+    espera de lo que se adelantaría a esta petición en la cola.
+    """
+    estimate = None
+    if ref_audio is not None:
+        estimate = lambda name: estimate_cost(text, ref_audio, speed, name).compute_seconds
+    wait_seconds = 0.0
+    if deadline is not None:
+        cost = estimate(quality_selector.ladder[0]) if estimate else None
+        wait_seconds = batch_scheduler.estimate_wait(priority, cost)
+    return backend_tier(quality_selector.select(
+        quality, text, speed,
+        queue_depth=batch_scheduler.pending(),
+        wait_seconds=wait_seconds,
+        deadline=deadline,
+        estimate=estimate,
+        record=record
+    ))
+
+def solver_selectable():
+    """¿Puede el backend cargado cambiar el método ODE? (F5TTS.infer y el CLI de un solo uso no)"""
+    if isinstance(f5_model, dict):
+        return cli_pool is not None
+    return f5_model is not None and supports_conditioning(f5_model)
+
+def backend_tier(tier):
+    """Nivel que el backend ejecuta de verdad: sin elección de método, su equivalente euler
+    
+    Así 'quality' no se cachea ni se factura aparte cuando genera el mismo
+    audio que 'balanced'.
+    """
+    return tier if solver_selectable() else with_model_solver(tier)
+
+def catalog_quality():
+    """Nivel con el que se renderiza y se busca el catálogo de frases (el techo de 'auto')"""
+    return backend_tier(QUALITY_TIERS[quality_selector.ceiling]).name
+
+def served_from_catalog(requested):
+    """¿Puede una petición con este nivel servirse del catálogo pre-renderizado?"""
+    if requested == AUTO_QUALITY:
+        return True
+    return requested in QUALITY_TIERS and backend_tier(QUALITY_TIERS[requested]).name == catalog_quality()
+
+def submit_synthesis(text, voice="es_female", speed=1.0, clarity=True, priority='normal', deadline=None,
+                     endpoint='internal', quality=QUALITY_TIER, long_form=None):
+    """Encolar una síntesis y devolver un Future con (audio, sample_rate)
+    
+    Lanza QueueFullError si la cola de inferencia está llena y
+    ModelUnavailableError si el modelo no está cargado. Las peticiones
+    idénticas simultáneas comparten una sola síntesis (singleflight.py):
+    cancelar el Future devuelto suelta solo a esta petición, y el trabajo se
+    cancela en el planificador cuando ya no lo espera nadie.
+    `endpoint` solo etiqueta las métricas de factor de tiempo real.
+    `quality` es un nivel de QUALITY_TIERS o 'auto' (según cola y plazo).
+    
+    El audio terminado (clarity=True) es un array PCM16 de solo lectura: el
+    mismo buffer que guarda la caché y que se sirve sin copias; el Future
+    lleva su clave en `cache_key` (handle para /audio/<key>).
+    `long_form` (None = según la longitud) reparte el texto en segmentos.
+    """
+    if f5_model is None:
+        raise ModelUnavailableError("Modelo Spanish-F5 no inicializado")
+    
+    # Voz pedida -> referencia registrada (las desconocidas usan la voz por defecto)
+    resolved = voice_registry.get(voice)
+    if resolved is None:
+        raise Exception("No hay archivos de referencia disponibles")
+    
+    # Números, fechas, abreviaturas... expandidos (memorizado por texto)
+    text = spanish_text.normalize(text)
+    
+    # Frase del catálogo: audio pre-renderizado, sin inferencia ni cola
+    if PHRASE_CATALOG and clarity and served_from_catalog(quality):
+        key = synthesis_cache_key(text, voice, speed, clarity, catalog_quality())
+        stored = phrase_store.get(key)
+        if stored is not None:
+            logger.info(f"🗂️  Frase servida desde el catálogo ({key[:12]})")
+            result = Future()
+            result.set_result(stored)
+            result.cache_key = key
+            result.quality = catalog_quality()
+            return result
+    
+    logger.info(f"🎤 Sintetizando con Spanish-F5: '{text[:50]}...'")
+    tier = select_quality(quality, text, speed, deadline, resolved.file, priority)
+    metrics.QUALITY_TIERS.labels(tier.name, 'auto' if quality == AUTO_QUALITY else 'fixed').inc()
+    logger.info(f"🎭 Voz: {voice} -> {resolved.id}, Velocidad: {speed}, Calidad: {tier.name}")
+    
+    # Texto ya sintetizado antes: servir desde la caché
+    key = synthesis_cache_key(text, voice, speed, clarity, tier.name)
+    cached = audio_cache.get(key)
+    if cached is not None:
+        logger.info(f"⚡ Audio servido desde caché ({key[:12]})")
+        result = Future()
+        result.set_result(cached)
+        result.cache_key = key
+        result.quality = tier.name
+        return result
+    
+    # La misma síntesis ya en curso (p. ej. tras un aviso masivo): esperar a esa
+    result = in_flight_syntheses.submit(key, lambda: start_synthesis(
+        text, resolved, speed, clarity, priority, deadline, endpoint, tier, key, long_form
+    ), priority, deadline)
+    result.cache_key = key
+    result.quality = tier.name
+    return result
+
+def start_synthesis(text, resolved, speed, clarity, priority, deadline, endpoint, tier, key, long_form=None):
+    """Lanzar una síntesis que no está en caché ni en curso y devolver su Future"""
+    ref_audio = resolved.file
+    logger.info(f"📁 Usando referencia: {os.path.basename(ref_audio)}")
+    
+    # Lo que no cabría en memoria ni partido se rechaza antes de encolarlo
+    memory_governor.check(memory_governor.estimate(text, speed, reference_seconds(ref_audio)))
+    
+    if long_form is None:
+        long_form = len(text.encode('utf-8')) > LONG_FORM_MIN_CHARS
+    if long_form:
+        segments = spanish_text.segment(
+            text, STREAM_MAX_SENTENCE_CHARS, spanish_text.target_chars(ESTIMATED_CHARS_PER_SECOND, speed)
+        )
+        if len(segments) > 1:
+            return submit_long_form(segments, key, resolved, speed, clarity, priority, deadline, endpoint, tier)
+    
+    result = Future()
+    submitted_at = time.time()
+    
+    # El planificador agrupa esta petición con otras de la misma voz (las cortas primero)
+    cost = estimate_cost(text, ref_audio, speed, tier).compute_seconds
+    job_future = batch_scheduler.submit(text, ref_audio, speed, priority, deadline, tier.name, cost)
+    metrics.IN_FLIGHT.inc()
+    job_future.add_done_callback(lambda done: metrics.IN_FLIGHT.dec())
+    backend = f5_model.get("method", "api") if isinstance(f5_model, dict) else "api"
+    is_cli = backend == "cli"
+    
+    def finish(done):
+        if done.cancelled():
+            return
+        try:
+            wav_data, sample_rate = done.result()
+            
+            # Post-procesar para mejorar claridad (el método CLI entrega el audio tal cual)
+            if clarity and not is_cli:
+                wav_data = improve_audio_clarity(wav_data, sample_rate)
+            
+            # Audio final: PCM16 una sola vez (la mitad que float32), ya listo para servir
+            if clarity:
+                wav_data = encoding.pcm16_array(wav_data)
+            
+            metrics.observe_realtime_factor(
+                endpoint, resolved.id, backend, submitted_at, wav_data, sample_rate
+            )
+            
+            # Aunque el cliente se haya ido, el audio ya está pagado: queda en caché
+            entry = audio_cache.put(key, wav_data, sample_rate)
+            if not result.cancelled():
+                result.set_result(entry)
+        except Exception as e:
+            if not result.done():
+                result.set_exception(e)
+    
+    def abandon(done):
+        if done.cancelled():
+            batch_scheduler.cancel(job_future)
+    
+    job_future.add_done_callback(lambda done: postprocess_executor.submit(finish, done))
+    result.add_done_callback(abandon)
+    # Peticiones idénticas adjuntas pueden mejorar la prioridad o el plazo (singleflight.py)
+    result.promote = lambda priority, deadline: batch_scheduler.promote(job_future, priority, deadline)
+    return result
+
+def submit_long_form(segments, key, resolved, speed, clarity, priority, deadline, endpoint, tier):
+    """Texto largo: segmentos concurrentes unidos con fundido y claridad una sola vez
+    
+    Cada segmento es una síntesis sin claridad (en caché por separado: volver
+    a pedir un artículo retocado solo genera lo que cambió) con el mismo
+    nivel de calidad. Devuelve un Future como submit_synthesis.
+    """
+    backend = f5_model.get("method", "api") if isinstance(f5_model, dict) else "api"
+    submitted_at = time.time()
+    logger.info(f"📚 Texto largo: {len(segments)} segmentos en paralelo | Calidad: {tier.name}")
+    
+    def submit(segment, priority, deadline):
+        return submit_synthesis(
+            segment, resolved.id, speed, clarity=False, priority=priority, deadline=deadline,
+            endpoint='long_form', quality=tier.name, long_form=False
+        )
+    
+    def finish(waves, sample_rate):
+        with metrics.stage('stitch'):
+            wav_data = cross_fade(waves, sample_rate)
+        
+        # Claridad y normalización de nivel sobre el audio completo, no por segmento
+        if clarity and backend != "cli":
+            wav_data = improve_audio_clarity(wav_data, sample_rate)
+        if clarity:
+            wav_data = encoding.pcm16_array(wav_data)
+        
+        metrics.observe_realtime_factor(endpoint, resolved.id, backend, submitted_at, wav_data, sample_rate)
+        logger.info(f"📚 Texto largo unido: {len(wav_data) / sample_rate:.1f}s en {time.time() - submitted_at:.1f}s")
+        return audio_cache.put(key, wav_data, sample_rate)
+    
+    return LongFormRender(segments, submit, finish, priority, deadline).start()
+
+def synthesize_with_api(text, ref_audio, speed=1.0, tier=None):
     """Sintetizar usando API correcta de Spanish-F5"""
     try:
         # Obtener el texto exacto del archivo de referencia
@@ -232,16 +724,36 @@ def synthesize_with_api(text, ref_audio, speed=1.0):
         
         logger.info(f"🔧 Sintetizando con Spanish-F5 modelo oficial...")
         logger.info(f"🎭 Velocidad ajustada: {adjusted_speed}")
+        tier = tier or QUALITY_TIERS[DEFAULT_QUALITY]
         
-        # Usar la API correcta de Spanish-F5 según documentación oficial
-        output_audio = f5_model.infer(
-            ref_file=ref_audio,
-            ref_text=ref_text,
-            gen_text=text,
-            model="F5-TTS",  # Especificar modelo
-            remove_silence=False,  # Spanish-F5 maneja esto internamente
-            speed=adjusted_speed
-        )
+        if supports_conditioning(f5_model):
+            # Referencia ya preprocesada y tokenizada desde la caché
+            with metrics.stage('reference_load'):
+                conditioning = reference_cache.get(ref_audio, ref_text, device)
+            logger.info(f"⚡ Condicionamiento de referencia en caché ({conditioning.duration:.1f}s)")
+            with metrics.stage('inference'):
+                output_audio = infer_with_conditioning(
+                    f5_model,
+                    conditioning,
+                    text,
+                    speed=adjusted_speed,
+                    **tier.params()
+                )
+        else:
+            # Usar la API correcta de Spanish-F5 según documentación oficial
+            with metrics.stage('inference'):
+                output_audio = f5_model.infer(
+                    ref_file=ref_audio,
+                    ref_text=ref_text,
+                    gen_text=text,
+                    model="F5-TTS",  # Especificar modelo
+                    remove_silence=False,  # Spanish-F5 maneja esto internamente
+                    speed=adjusted_speed,
+                    # El método ODE es el del modelo: F5TTS.infer no permite cambiarlo
+                    nfe_step=tier.nfe_step,
+                    cfg_strength=tier.cfg_strength,
+                    sway_sampling_coef=tier.sway_sampling_coef
+                )
         
         logger.info(f"🔍 Tipo de salida: {type(output_audio)}")
         
@@ -275,10 +787,7 @@ def synthesize_with_api(text, ref_audio, speed=1.0):
         if hasattr(wav_data, 'ndim') and wav_data.ndim > 1:
             wav_data = wav_data.squeeze()
         
-        # Post-procesar para mejorar claridad
-        wav_data = improve_audio_clarity(wav_data, sample_rate)
-        
-        logger.info(f"✅ Audio procesado y mejorado: {len(wav_data)} samples, {sample_rate}Hz")
+        logger.info(f"✅ Audio generado: {len(wav_data)} samples, {sample_rate}Hz")
         return wav_data, sample_rate
         
     except Exception as e:
@@ -287,27 +796,156 @@ def synthesize_with_api(text, ref_audio, speed=1.0):
         logger.error(f"📋 Traceback: {traceback.format_exc()}")
         raise e
 
-def synthesize_with_cli(text, ref_audio, speed=1.0):
-    """Sintetizar usando CLI oficial de Spanish-F5"""
+def synthesize_with_api_batch(texts, ref_audio, speeds, stop_reason=None, tier=None, max_batch_size=MAX_BATCH_SIZE):
+    """Sintetizar varios textos con la misma referencia en un único lote
+    
+    stop_reason(i) devuelve la excepción con la que abandonar el texto i
+    (cancelado o fuera de plazo), o None para seguir generándolo. Todo el
+    lote se muestrea con el mismo nivel de calidad (`tier`), con como mucho
+    `max_batch_size` fragmentos a la vez en el modelo.
+    """
     try:
-        import subprocess
-        import tempfile
+        ref_text = get_reference_text(ref_audio)
+        adjusted_speeds = [max(0.8, min(1.2, speed)) for speed in speeds]
+        
+        with metrics.stage('reference_load'):
+            conditioning = reference_cache.get(ref_audio, ref_text, device)
+        tier = tier or QUALITY_TIERS[DEFAULT_QUALITY]
+        logger.info(f"🔧 Sintetizando lote de {len(texts)} con Spanish-F5 modelo oficial (calidad {tier.name})...")
+        
+        with metrics.stage('inference'):
+            waves = infer_batch(
+                f5_model,
+                conditioning,
+                texts,
+                adjusted_speeds,
+                max_batch_size=max_batch_size,
+                is_cancelled=(lambda i: stop_reason(i) is not None) if stop_reason else None,
+                **tier.params()
+            )
+        
+        sample_rate = conditioning.sample_rate
+        results = [
+            (wav_data, sample_rate) if wav_data is not None
+            else (stop_reason(i) if stop_reason else None) or JobCancelledError("Síntesis cancelada")
+            for i, wav_data in enumerate(waves)
+        ]
+        
+        logger.info(f"✅ Lote procesado: {len(results)} audios, {sample_rate}Hz")
+        return results
         
+    except Exception as e:
+        logger.error(f"❌ Error en lote API: {e}")
+        raise e
+
+def run_synthesis_batch(jobs):
+    """Ejecutar un micro-lote del planificador (todos comparten referencia y nivel de calidad)"""
+    started = time.time()
+    for job in jobs:
+        metrics.observe_stage('queue_wait', started - job.enqueued_at)
+    
+    tier = QUALITY_TIERS[jobs[0].quality or DEFAULT_QUALITY]
+    
+    # Cada parte del lote espera a que su pico estimado quepa en el presupuesto de memoria
+    estimates = [memory_governor.estimate(job.text, job.speed, reference_seconds(job.ref_audio)) for job in jobs]
+    results = [None] * len(jobs)
+    inference_seconds = 0.0
+    for indices, chunk_batch, estimated in memory_governor.plan(estimates, batch_scheduler.max_batch_size):
+        with memory_governor.reserve(estimated):
+            part_started = time.time()
+            part = run_tier_batch([jobs[i] for i in indices], tier, chunk_batch)
+            inference_seconds += time.time() - part_started
+        for i, result in zip(indices, part):
+            results[i] = result
+    
+    # RTF real del nivel y calibración del modelo de coste (el calentamiento no cuenta)
+    if readiness.ready:
+        audio = [len(r[0]) / r[1] for r in results if isinstance(r, tuple) and r[1]]
+        quality_selector.observe(tier.name, inference_seconds, sum(audio))
+        # Solo lotes completos: un trabajo cancelado a medias no dice cuánto cuesta
+        if len(audio) == len(jobs):
+            costs = [estimate_cost(job.text, job.ref_audio, job.speed, tier) for job in jobs]
+            ratio = cost_model.observe(costs, inference_seconds, audio, voice=jobs[0].ref_audio)
+            if ratio is not None:
+                metrics.COST_ESTIMATE_RATIO.observe(ratio)
+    return results
+
+def run_tier_batch(jobs, tier, max_batch_size=MAX_BATCH_SIZE):
+    """Sintetizar un micro-lote con el backend cargado y los parámetros de `tier`"""
+    if isinstance(f5_model, dict) and f5_model.get("method") in ("cli", "pool"):
+        # Un trabajo por worker del pool (o por proceso CLI)
+        results = []
+        for job in jobs:
+            if job.stop_reason() is not None:
+                results.append(job.stop_reason())
+                continue
+            try:
+                results.append(synthesize_with_cli(job.text, job.ref_audio, job.speed, tier))
+            except Exception as e:
+                results.append(e)
+        return results
+    
+    if supports_conditioning(f5_model):
+        return synthesize_with_api_batch(
+            [job.text for job in jobs],
+            jobs[0].ref_audio,
+            [job.speed for job in jobs],
+            stop_reason=lambda i: jobs[i].stop_reason(),
+            tier=tier,
+            max_batch_size=max_batch_size
+        )
+    
+    # Sin acceso al modelo interno: una inferencia por petición
+    results = []
+    for job in jobs:
+        if job.stop_reason() is not None:
+            results.append(job.stop_reason())
+            continue
+        try:
+            results.append(synthesize_with_api(job.text, job.ref_audio, job.speed, tier))
+        except Exception as e:
+            results.append(e)
+    return results
+
+# Planificador de micro-lotes entre los endpoints y el modelo
+batch_scheduler = InferenceScheduler(run_synthesis_batch)
+metrics.register_service(audio_cache, reference_cache, batch_scheduler, in_flight_syntheses, memory_governor)
+
+def synthesize_with_cli(text, ref_audio, speed=1.0, tier=None):
+    """Sintetizar usando CLI oficial de Spanish-F5"""
+    try:
         # Obtener el texto exacto del archivo de referencia
         ref_text = get_reference_text(ref_audio)
         logger.info(f"📝 Texto de referencia CLI: '{ref_text[:50]}...'")
         
-        # Crear archivo temporal para salida
-        with tempfile.NamedTemporaryFile(suffix=".wav", delete=False) as tmp_file:
-            output_file = tmp_file.name
-        
-        # Comando CLI forzando uso del modelo español específico
-        output_dir = os.path.dirname(output_file)
-        
-        # Buscar el modelo español dinámicamente
-        import glob
-        spanish_models = glob.glob("/app/models/models--jpgallegoar--F5-Spanish/**/model_1200000.safetensors", recursive=True)
+        if cli_pool is not None:
+            # Worker ya caliente: el audio vuelve por el pipe, sin archivos temporales
+            logger.info(f"🔧 Sintetizando en worker Spanish-F5 persistente...")
+            with metrics.stage('inference'):
+                wav_data, sample_rate = cli_pool.synthesize(
+                    text, ref_audio, ref_text, speed, quality=tier.params() if tier else None
+                )
+            logger.info(f"✅ Audio generado por worker Spanish-F5: {len(wav_data)} samples, {sample_rate}Hz")
+            return wav_data, sample_rate
         
+        with metrics.stage('inference'):
+            return run_cli_once(text, ref_audio, ref_text, speed, tier)
+            
+    except Exception as e:
+        logger.error(f"❌ Error en Spanish-F5 CLI: {e}")
+        raise e
+
+def run_cli_once(text, ref_audio, ref_text, speed=1.0, tier=None):
+    """Lanzar f5-tts_infer-cli para una sola petición"""
+    import glob
+    import shutil
+    import subprocess
+    import tempfile
+    
+    # Directorio de salida propio de la petición: evita recoger el archivo de otra
+    output_dir = tempfile.mkdtemp(prefix="f5_cli_")
+    
+    try:
         cmd = [
             "f5-tts_infer-cli",
             "-m", "F5-TTS",
@@ -318,9 +956,17 @@ def synthesize_with_cli(text, ref_audio, speed=1.0):
             "--speed", str(speed)
         ]
         
+        # Los valores por defecto del CLI son los del nivel por defecto; el método ODE no es configurable
+        if tier is not None and tier.name != DEFAULT_QUALITY:
+            cmd.extend([
+                "--nfe_step", str(tier.nfe_step),
+                "--cfg_strength", str(tier.cfg_strength),
+                "--sway_sampling_coef", str(tier.sway_sampling_coef)
+            ])
+        
         # Si encontramos el modelo español, forzar su uso
-        if spanish_models:
-            spanish_model_path = spanish_models[0]
+        spanish_model_path = find_spanish_checkpoint()
+        if spanish_model_path:
             cmd.extend(["-p", spanish_model_path])
             logger.info(f"🇪🇸 Forzando uso del modelo español: {os.path.basename(spanish_model_path)}")
         else:
@@ -339,191 +985,669 @@ def synthesize_with_cli(text, ref_audio, speed=1.0):
             raise Exception(f"CLI retornó código {result.returncode}: {result.stderr}")
         
         # Spanish-F5 CLI genera archivos en el directorio de salida
-        # Buscar archivos generados en el directorio de salida
-        import glob
-        
         generated_files = glob.glob(os.path.join(output_dir, "*.wav"))
         
-        if generated_files:
-            # Usar el archivo más reciente
-            latest_file = max(generated_files, key=os.path.getctime)
-            wav_data, sample_rate = sf.read(latest_file)
-            os.unlink(latest_file)  # Limpiar archivo
-            
-            logger.info(f"✅ Audio generado con Spanish-F5 CLI: {len(wav_data)} samples, {sample_rate}Hz")
-            logger.info(f"📁 Archivo generado: {os.path.basename(latest_file)}")
-            return wav_data, sample_rate
-        else:
-            # Buscar en directorio actual también
-            current_dir_files = glob.glob("*.wav")
-            if current_dir_files:
-                latest_file = max(current_dir_files, key=os.path.getctime)
-                wav_data, sample_rate = sf.read(latest_file)
-                os.unlink(latest_file)  # Limpiar
-                logger.info(f"✅ Audio encontrado en directorio actual: {latest_file}")
-                return wav_data, sample_rate
-            
+        if not generated_files:
             logger.error(f"📂 Archivos en {output_dir}: {os.listdir(output_dir)}")
             raise Exception("No se encontró archivo de salida generado por Spanish-F5 CLI")
-            
-    except Exception as e:
-        logger.error(f"❌ Error en Spanish-F5 CLI: {e}")
-        raise e
-
-def save_debug_audio(wav_data, sample_rate, prefix="spanish_f5"):
-    """Guardar audio de debug"""
-    try:
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S_%f")[:-3]
-        filename = f"{prefix}_{timestamp}.wav"
-        filepath = os.path.join(debug_dir, filename)
         
-        # Guardar archivo
-        sf.write(filepath, wav_data, sample_rate)
+        latest_file = max(generated_files, key=os.path.getctime)
+        wav_data, sample_rate = sf.read(latest_file, dtype='float32')
         
-        logger.info(f"🐛 Debug guardado: {filename}")
-        return filename
+        logger.info(f"✅ Audio generado con Spanish-F5 CLI: {len(wav_data)} samples, {sample_rate}Hz")
+        logger.info(f"📁 Archivo generado: {os.path.basename(latest_file)}")
+        return wav_data, sample_rate
+        
+    finally:
+        shutil.rmtree(output_dir, ignore_errors=True)
+
+@metrics.stage('debug_save')
+def save_debug_audio(wav_data, sample_rate, prefix="spanish_f5", text=None, voice=None, latency=None):
+    """Encolar el audio de debug (se escribe en segundo plano, si toca por muestreo)"""
+    try:
+        return debug_capture.capture(wav_data, sample_rate, text, voice, latency, prefix)
         
     except Exception as e:
         logger.error(f"❌ Error guardando debug: {e}")
         return None
 
-@app.route('/health', methods=['GET'])
-def health():
-    """Endpoint de salud"""
-    return jsonify({
+def split_sentences(text, max_chars=STREAM_MAX_SENTENCE_CHARS):
+    """Partir el texto en frases, y las frases largas en cláusulas
+    
+    Se normaliza antes de partir: así "Sr." o "3.5" no cortan la frase.
+    """
+    return spanish_text.split(spanish_text.normalize(text), max_chars)
+
+def health_payload():
+    """Estado del servicio (compartido por los front-ends Flask y ASGI)"""
+    return {
         'status': 'ok',
         'model': 'spanish-f5',
         'device': device,
-        'f5_available': f5_model is not None
-    })
+        'f5_available': f5_model is not None,
+        'ready': readiness.ready,
+        'workers': cli_pool.stats() if cli_pool is not None else None,
+        'quality': quality_selector.stats(),
+        'coalescing': in_flight_syntheses.stats(),
+        'phrase_store': phrase_store.stats(),
+        'memory': memory_governor.stats(),
+        'cost_model': cost_model.stats()
+    }
+
+def ready_payload():
+    """Preparación para recibir tráfico: (respuesta, código HTTP)"""
+    payload = readiness.stats()
+    payload['f5_available'] = f5_model is not None
+    return payload, 200 if readiness.ready else 503
+
+def voices_payload(language):
+    """Voces disponibles para un idioma: (respuesta, código HTTP)"""
+    if language == 'es':
+        voices = voice_registry.list()
+        aliases = voice_registry.aliases()
+        genders = {voice.id: voice.gender for voice in voices}
+        by_gender = {'female': [], 'male': []}
+        for voice_id in list(genders) + list(aliases):
+            gender = genders.get(aliases.get(voice_id, voice_id))
+            if gender in by_gender:
+                by_gender[gender].append(voice_id)
+        default = voice_registry.default
+        return {
+            'default': default,
+            'language': DEFAULT_LANGUAGE,
+            'model': 'spanish-f5',
+            'voices': {'default': default, **by_gender},
+            'details': [voice.to_dict() for voice in voices],
+            'aliases': aliases
+        }, 200
+    return {
+        'error': 'Only Spanish (es) is supported',
+        'supported_languages': ['es']
+    }, 400
+
+def parse_synthesis_params(data):
+    """Extraer y validar los parámetros de síntesis: (params, error)
+    
+    error es None o una tupla (respuesta, código HTTP).
+    """
+    text = data.get('text', '')
+    language = data.get('language', 'es')
+    voice = data.get('voice', 'es_female')
+    
+    try:
+        speed = float(data.get('speed', 0.9))  # Velocidad óptima confirmada
+    except (TypeError, ValueError):
+        return None, ({'error': 'Speed must be a number'}, 400)
+    
+    # Solo espacios, o nada que pronunciar tras normalizar: no hay audio que generar
+    if not isinstance(text, str) or not text.strip() or not spanish_text.normalize(text).strip():
+        return None, ({'error': 'Text is required'}, 400)
+    
+    if language != 'es':
+        return None, ({'error': 'Only Spanish (es) is supported'}, 400)
+    
+    priority = data.get('priority', 'normal')
+    if priority not in PRIORITIES:
+        return None, ({'error': 'Unsupported priority', 'supported_priorities': list(PRIORITIES)}, 400)
+    
+    quality = data.get('quality') or QUALITY_TIER
+    if quality != AUTO_QUALITY and quality not in QUALITY_TIERS:
+        return None, ({'error': 'Unsupported quality', 'supported_qualities': [AUTO_QUALITY] + list(QUALITY_TIERS)}, 400)
+    
+    # Plazo relativo en milisegundos desde la llegada de la petición
+    deadline = None
+    if data.get('deadline_ms') not in (None, ''):
+        try:
+            deadline_ms = float(data.get('deadline_ms'))
+        except (TypeError, ValueError):
+            return None, ({'error': 'deadline_ms must be a number'}, 400)
+        if deadline_ms <= 0:
+            return None, ({'error': 'deadline_ms must be positive'}, 400)
+        deadline = time.time() + deadline_ms / 1000
+    
+    return {
+        'text': text,
+        'language': language,
+        'voice': voice,
+        'speed': speed,
+        'priority': priority,
+        'deadline': deadline,
+        'quality': quality
+    }, None
+
+def synthesis_error(e, endpoint):
+    """Traducir un error de síntesis a (respuesta, código HTTP, cabeceras) y contarlo"""
+    if isinstance(e, QueueFullError):
+        error = {'error': str(e), 'retry_after': e.retry_after}, 429, {'Retry-After': str(e.retry_after)}
+    elif isinstance(e, MemoryBudgetError):
+        error = {'error': str(e)}, 413, {}
+    elif isinstance(e, ModelUnavailableError):
+        error = {'error': str(e)}, 503, {'Retry-After': '30'}
+    elif isinstance(e, DeadlineExceededError):
+        error = {'error': str(e)}, 504, {}
+    elif isinstance(e, (JobCancelledError, CancelledError)):
+        # Cliente desconectado: nadie leerá la respuesta (código de nginx)
+        error = {'error': 'Synthesis cancelled'}, 499, {}
+    else:
+        error = {'error': str(e)}, 500, {}
+    
+    metrics.ERRORS.labels(endpoint, str(error[1])).inc()
+    return error
+
+def parse_output_format(data, accept, default='wav'):
+    """Formato y bitrate de salida (parámetros o cabecera Accept): (formato, bitrate, error)"""
+    try:
+        audio_format = encoding.negotiate(data.get('format'), accept, default)
+        bitrate = encoding.parse_bitrate(audio_format, data.get('bitrate'))
+    except encoding.UnsupportedFormatError as e:
+        status = 400 if data.get('format') or data.get('bitrate') else 406
+        return None, None, ({'error': str(e), 'supported_formats': list(encoding.FORMATS)}, status)
+    
+    if not encoding.available(audio_format):
+        return None, None, ({'error': f'No encoder available for {audio_format}'}, 501)
+    return audio_format, bitrate, None
+
+def encoded_audio(wav_data, sample_rate, audio_format, bitrate=None):
+    """Iterador de bytes codificados, con el tiempo de codificación en las métricas"""
+    return metrics.timed_iter(
+        f'{audio_format}_encode', encoding.encode(wav_data, sample_rate, audio_format, bitrate)
+    )
+
+def audio_download_name(audio_format):
+    return f'spanish_synthesis.{encoding.EXTENSIONS[audio_format]}'
+
+def audio_headers(wav_data, audio_format, headers=None):
+    """Cabeceras de una respuesta de audio, con Content-Length si se conoce el tamaño"""
+    headers = dict(headers or {})
+    length = encoding.content_length(wav_data, audio_format)
+    if length is not None:
+        headers['Content-Length'] = str(length)
+    return headers
+
+@metrics.stage('wav_encode')
+def encode_wav(wav_data, sample_rate):
+    """Codificar el audio como WAV en memoria"""
+    return b"".join(encoding.encode(wav_data, sample_rate, 'wav'))
+
+def lookup_cached_audio(key):
+    """Audio de la caché por su clave: ((audio, sample_rate), error)"""
+    if not re.fullmatch(r'[0-9a-f]{64}', key):
+        return None, ({'error': 'Invalid audio key'}, 400)
+    cached = phrase_store.get(key) or audio_cache.get(key)
+    if cached is None:
+        return None, ({'error': 'Audio not found'}, 404)
+    return cached, None
+
+def estimate_payload(params):
+    """Previsión de una síntesis sin ejecutarla, para /estimate
+    
+    Resuelve voz, texto y nivel como submit_synthesis (sin contar la bajada
+    de nivel) y dice de dónde saldría el audio: catálogo, caché o síntesis.
+    Solo la síntesis cuesta cómputo y espera en cola; un texto largo suma
+    sus segmentos, cada uno con su referencia.
+    """
+    if f5_model is None:
+        raise ModelUnavailableError("Modelo Spanish-F5 no inicializado")
+    resolved = voice_registry.get(params['voice'])
+    if resolved is None:
+        raise Exception("No hay archivos de referencia disponibles")
+    
+    text = spanish_text.normalize(params['text'])
+    speed, quality, priority = params['speed'], params['quality'], params['priority']
+    tier = select_quality(quality, text, speed, params['deadline'], resolved.file, priority, record=False)
+    
+    segments = [text]
+    if len(text.encode('utf-8')) > LONG_FORM_MIN_CHARS:
+        segments = spanish_text.segment(
+            text, STREAM_MAX_SENTENCE_CHARS, spanish_text.target_chars(ESTIMATED_CHARS_PER_SECOND, speed)
+        ) or [text]
+    estimates = [estimate_cost(segment, resolved.file, speed, tier) for segment in segments]
+    audio_seconds = sum(e.audio_seconds for e in estimates) - (len(estimates) - 1) * CROSS_FADE_SECONDS
+    
+    source = 'synthesis'
+    if (PHRASE_CATALOG and served_from_catalog(quality)
+            and phrase_store.contains(synthesis_cache_key(text, params['voice'], speed, True, catalog_quality()))):
+        source = 'phrase_store'
+    elif audio_cache.contains(synthesis_cache_key(text, params['voice'], speed, True, tier.name)):
+        source = 'cache'
+    
+    compute_seconds = wait_seconds = 0.0
+    if source == 'synthesis':
+        compute_seconds = sum(e.compute_seconds for e in estimates)
+        wait_seconds = batch_scheduler.estimate_wait(priority, max(e.compute_seconds for e in estimates))
+    memory = memory_governor.estimate(text, speed, reference_seconds(resolved.file))
+    
+    payload = {
+        'voice': resolved.id,
+        'speed': speed,
+        'quality': tier.name,
+        'source': source,
+        'chars': sum(e.chars for e in estimates),
+        'segments': len(segments),
+        'chunks': sum(e.chunks for e in estimates),
+        'audio_seconds': round(max(0.0, audio_seconds), 3),
+        'compute_seconds': round(compute_seconds, 3),
+        'queue_wait_seconds': round(wait_seconds, 3),
+        'total_seconds': round(wait_seconds + compute_seconds, 3),
+        'memory_bytes': memory.total(1),
+        'fits_memory': memory_governor.budget is None or memory.total(1) <= memory_governor.budget,
+        'queue_full': source == 'synthesis' and batch_scheduler.pending() >= batch_scheduler.max_queue_depth
+    }
+    if payload['queue_full']:
+        payload['retry_after'] = batch_scheduler.retry_after()
+    if params['deadline'] is not None:
+        payload['meets_deadline'] = time.time() + wait_seconds + compute_seconds <= params['deadline']
+    return payload
+
+def synthesis_json_payload(params, wav_data, sample_rate, debug_file, key=None, quality=None):
+    """Metadatos de una síntesis terminada para /synthesize_json
+    
+    `audio_url` apunta al mismo buffer de la caché: el audio no se vuelve a
+    codificar ni a copiar para incluirlo en la respuesta. `quality` es el
+    nivel que se ejecutó (el que eligió 'auto', o 'balanced' por 'quality'
+    si el backend no permite cambiar el método ODE).
+    """
+    handle = key if key and audio_cache.enabled else None
+    return {
+        'success': True,
+        'text': params['text'],
+        'language': params['language'],
+        'voice': params['voice'],
+        'speed': params['speed'],
+        'quality': quality or params['quality'],
+        'model': 'spanish-f5',
+        'sample_rate': sample_rate,
+        'audio_duration': len(wav_data) / sample_rate,
+        'f5_available': True,
+        'audio_key': handle,
+        'audio_url': f'/audio/{handle}' if handle else None,
+        'debug_audio_file': debug_file,
+        'debug_audio_url': f'/debug/audio/{debug_file}' if debug_file else None
+    }
+
+@app.route('/health', methods=['GET'])
+def health():
+    """Endpoint de salud"""
+    return jsonify(health_payload())
+
+@app.route('/ready', methods=['GET'])
+def ready():
+    """Listo para tráfico: modelo cargado y calentado (503 mientras tanto)"""
+    payload, status = ready_payload()
+    return jsonify(payload), status
 
 @app.route('/voices', methods=['GET'])
 def get_voices():
     """Obtener voces disponibles"""
-    language = request.args.get('language', 'es')
-    
-    if language == 'es':
-        return jsonify(SPANISH_VOICES)
-    else:
-        return jsonify({
-            'error': 'Only Spanish (es) is supported',
-            'supported_languages': ['es']
-        }), 400
+    payload, status = voices_payload(request.args.get('language', 'es'))
+    return jsonify(payload), status
 
 @app.route('/synthesize', methods=['POST'])
 def synthesize():
     """Endpoint principal de síntesis"""
+    metrics.REQUESTS.labels('synthesize').inc()
+    started = time.time()
     try:
         # Obtener parámetros
-        text = request.form.get('text', '')
-        language = request.form.get('language', 'es')
-        voice = request.form.get('voice', 'es_female')
-        speed = float(request.form.get('speed', 0.9))  # Velocidad óptima confirmada
-        
-        if not text:
-            return jsonify({'error': 'Text is required'}), 400
+        params, error = parse_synthesis_params(request.form)
+        if error:
+            return jsonify(error[0]), error[1]
         
-        if language != 'es':
-            return jsonify({'error': 'Only Spanish (es) is supported'}), 400
+        audio_format, bitrate, error = parse_output_format(request.form, request.headers.get('Accept'))
+        if error:
+            return jsonify(error[0]), error[1]
         
-        logger.info(f"🎯 Síntesis solicitada: '{text[:30]}...' | Voz: {voice}")
+        logger.info(f"🎯 Síntesis solicitada: '{params['text'][:30]}...' | Voz: {params['voice']}")
         
         # Sintetizar
-        wav_data, sample_rate = synthesize_spanish_f5(text, voice, speed)
-        
-        # Crear respuesta de audio
-        audio_buffer = io.BytesIO()
-        sf.write(audio_buffer, wav_data, sample_rate, format='WAV')
-        audio_buffer.seek(0)
+        wav_data, sample_rate = synthesize_spanish_f5(
+            params['text'], params['voice'], params['speed'],
+            priority=params['priority'], deadline=params['deadline'], endpoint='synthesize',
+            quality=params['quality']
+        )
         
         # Guardar debug
-        debug_file = save_debug_audio(wav_data, sample_rate)
+        save_debug_audio(
+            wav_data, sample_rate, text=params['text'], voice=params['voice'], latency=time.time() - started
+        )
         
-        return send_file(
-            audio_buffer,
-            mimetype='audio/wav',
-            as_attachment=True,
-            download_name='spanish_synthesis.wav'
+        # Respuesta codificada por bloques mientras se envía
+        return Response(
+            stream_with_context(encoding.as_bytes(encoded_audio(wav_data, sample_rate, audio_format, bitrate))),
+            mimetype=encoding.media_type(audio_format, sample_rate),
+            headers=audio_headers(
+                wav_data, audio_format,
+                {'Content-Disposition': f'attachment; filename={audio_download_name(audio_format)}'}
+            )
         )
         
     except Exception as e:
         logger.error(f"❌ Error en síntesis: {e}")
-        return jsonify({'error': str(e)}), 500
+        payload, status, headers = synthesis_error(e, 'synthesize')
+        return jsonify(payload), status, headers
 
 @app.route('/synthesize_json', methods=['POST'])
 def synthesize_json():
     """Endpoint de síntesis con respuesta JSON"""
+    metrics.REQUESTS.labels('synthesize_json').inc()
+    started = time.time()
     try:
         # Obtener parámetros JSON
         data = request.get_json()
         if not data:
             return jsonify({'error': 'JSON data required'}), 400
         
-        text = data.get('text', '')
-        language = data.get('language', 'es')
-        voice = data.get('voice', 'es_female')
-        speed = float(data.get('speed', 0.9))  # Velocidad óptima confirmada
-        
-        if not text:
-            return jsonify({'error': 'Text is required'}), 400
-            
-        if language != 'es':
-            return jsonify({'error': 'Only Spanish (es) is supported'}), 400
+        params, error = parse_synthesis_params(data)
+        if error:
+            return jsonify(error[0]), error[1]
         
-        logger.info(f"🎯 Síntesis JSON: '{text[:30]}...' | Voz: {voice}")
+        logger.info(f"🎯 Síntesis JSON: '{params['text'][:30]}...' | Voz: {params['voice']}")
         
         # Sintetizar
-        wav_data, sample_rate = synthesize_spanish_f5(text, voice, speed)
+        future = submit_synthesis(
+            params['text'], params['voice'], params['speed'],
+            priority=params['priority'], deadline=params['deadline'], endpoint='synthesize_json',
+            quality=params['quality']
+        )
+        wav_data, sample_rate = wait_synthesis(future, params['deadline'])
         
         # Guardar debug
-        debug_file = save_debug_audio(wav_data, sample_rate)
-        
-        # Calcular duración
-        duration = len(wav_data) / sample_rate
+        debug_file = save_debug_audio(
+            wav_data, sample_rate, text=params['text'], voice=params['voice'], latency=time.time() - started
+        )
         
-        return jsonify({
-            'success': True,
-            'text': text,
-            'language': language,
-            'voice': voice,
-            'speed': speed,
-            'model': 'spanish-f5',
-            'sample_rate': sample_rate,
-            'audio_duration': duration,
-            'f5_available': True,
-            'debug_audio_file': debug_file,
-            'debug_audio_url': f'/debug/audio/{debug_file}' if debug_file else None
-        })
+        return jsonify(synthesis_json_payload(
+            params, wav_data, sample_rate, debug_file, future.cache_key, future.quality
+        ))
         
     except Exception as e:
         logger.error(f"❌ Error en síntesis JSON: {e}")
-        return jsonify({
-            'success': False,
-            'error': str(e),
-            'f5_available': f5_model is not None
-        }), 500
+        payload, status, headers = synthesis_error(e, 'synthesize_json')
+        payload.update({'success': False, 'f5_available': f5_model is not None})
+        return jsonify(payload), status, headers
+
+@app.route('/synthesize_stream', methods=['POST'])
+def synthesize_stream():
+    """Síntesis por frases con envío progresivo (chunked) del audio"""
+    metrics.REQUESTS.labels('synthesize_stream').inc()
+    try:
+        # Aceptar tanto JSON como formulario
+        data = request.get_json(silent=True) or request.form
+        
+        params, error = parse_synthesis_params(data)
+        if error:
+            return jsonify(error[0]), error[1]
+        
+        text, voice, speed = params['text'], params['voice'], params['speed']
+        audio_format, bitrate, error = parse_output_format(data, request.headers.get('Accept'))
+        if error:
+            return jsonify(error[0]), error[1]
+        
+        sentences = split_sentences(text)
+        # Un solo nivel para todas las frases: sin saltos de calidad a mitad del audio
+        quality = select_quality(params['quality'], text, speed).name
+        logger.info(f"🌊 Síntesis en streaming: {len(sentences)} frases | Voz: {voice} | Calidad: {quality}")
+        
+        # Se resuelve si el codificador corta (cliente desconectado): deja de esperar frases
+        stopped = Future()
+        
+        def stop():
+            if not stopped.done():
+                stopped.set_result(None)
+        
+        def generate():
+            # Cadena de claridad causal: sin costuras entre frases
+            clarity_stream = postprocess.ClarityStream(STREAM_SAMPLE_RATE)
+            
+            # Las siguientes frases se sintetizan mientras se envía la actual
+            pending = []
+            next_index = 0
+            try:
+                while next_index < len(sentences) or pending:
+                    while next_index < len(sentences) and len(pending) <= STREAM_LOOKAHEAD:
+                        pending.append(submit_synthesis(
+                            sentences[next_index], voice, speed, clarity=False,
+                            priority=params['priority'], endpoint='synthesize_stream', quality=quality
+                        ))
+                        next_index += 1
+                    
+                    wait([pending[0], stopped], return_when=FIRST_COMPLETED)
+                    if stopped.done():
+                        return
+                    wav_data, sample_rate = pending.pop(0).result()
+                    if sample_rate != STREAM_SAMPLE_RATE:
+                        logger.warning(f"⚠️  Frecuencia inesperada en streaming: {sample_rate}Hz")
+                    yield to_pcm16(clarity_stream.process(wav_data))
+            except Exception as e:
+                # La respuesta ya empezó: solo queda cortar el flujo
+                logger.error(f"❌ Error en síntesis streaming: {e}")
+                synthesis_error(e, 'synthesize_stream')
+                raise
+            finally:
+                # Cliente desconectado o error: las frases pendientes no se sintetizan
+                for future in pending:
+                    future.cancel()
+        
+        # La cabecera WAV sale antes de sintetizar nada; FLAC/Opus/MP3 se codifican según llegan las frases
+        return Response(
+            stream_with_context(encoding.encode_blocks(
+                encoding.BlockSource(generate(), stop), STREAM_SAMPLE_RATE, audio_format, bitrate
+            )),
+            mimetype=encoding.media_type(audio_format, STREAM_SAMPLE_RATE),
+            headers={'X-Accel-Buffering': 'no', 'Cache-Control': 'no-cache'}
+        )
+        
+    except Exception as e:
+        logger.error(f"❌ Error en síntesis streaming: {e}")
+        payload, status, headers = synthesis_error(e, 'synthesize_stream')
+        return jsonify(payload), status, headers
+
+@app.route('/synthesize_batch', methods=['POST'])
+def synthesize_batch():
+    """Síntesis masiva: array JSON o JSONL de {text, voice, speed}, resultados según terminan"""
+    metrics.REQUESTS.labels('synthesize_batch').inc()
+    try:
+        items, error = bulk.parse_items(request.get_data(as_text=True))
+        if error:
+            return jsonify({'error': error}), 400
+        
+        parsed = []
+        for index, item in enumerate(items):
+            params, error = parse_synthesis_params(item)
+            if error:
+                return jsonify(dict(error[0], index=index)), error[1]
+            parsed.append(params)
+        
+        audio_format = request.args.get('format')
+        if audio_format is None:
+            audio_format = 'zip' if 'application/zip' in request.headers.get('Accept', '') else 'ndjson'
+        if audio_format not in ('ndjson', 'zip'):
+            return jsonify({'error': 'Unsupported format', 'supported_formats': ['ndjson', 'zip']}), 400
+        
+        priority = request.args.get('priority', 'low')
+        if priority not in PRIORITIES:
+            return jsonify({'error': 'Unsupported priority', 'supported_priorities': list(PRIORITIES)}), 400
+        
+        if f5_model is None:
+            raise ModelUnavailableError("Modelo Spanish-F5 no inicializado")
+        
+        # Nivel fijado antes de agrupar: la clave de cada resultado debe ser la de su audio
+        for params in parsed:
+            params['quality'] = select_quality(params['quality'], params['text'], params['speed']).name
+        
+        # Ítems idénticos se sintetizan una sola vez
+        groups = bulk.group_items(
+            parsed, lambda p: synthesis_cache_key(p['text'], p['voice'], p['speed'], quality=p['quality'])
+        )
+        logger.info(f"📚 Síntesis masiva: {len(parsed)} ítems, {len(groups)} únicos")
+        
+        def submit(params):
+            return submit_synthesis(
+                params['text'], params['voice'], params['speed'],
+                priority=priority, endpoint='synthesize_batch', quality=params['quality']
+            )
+        
+        started = time.time()
+        failed = []
+        
+        def results():
+            for key, params, indices, future in bulk.run_groups(groups, submit):
+                try:
+                    wav_data, sample_rate = future.result()
+                    error = None
+                except Exception as e:
+                    logger.error(f"❌ Error en síntesis masiva: {e}")
+                    wav_data, sample_rate = None, None
+                    error, status, _ = synthesis_error(e, 'synthesize_batch')
+                    error['status'] = status
+                    failed.extend(indices)
+                
+                records = []
+                for index in indices:
+                    record = {'index': index, 'id': items[index].get('id'), 'key': key, 'success': error is None}
+                    if error is None:
+                        record.update({
+                            'audio_duration': len(wav_data) / sample_rate,
+                            'sample_rate': sample_rate,
+                            'audio_url': f'/audio/{key}' if audio_cache.enabled else None,
+                            'file': f'{key}.wav'
+                        })
+                    else:
+                        record['error'] = error
+                    records.append(record)
+                yield records, key, wav_data, sample_rate
+        
+        def summary():
+            return {
+                'done': True,
+                'items': len(parsed),
+                'unique': len(groups),
+                'failed': len(failed),
+                'elapsed': time.time() - started
+            }
+        
+        def json_line(record):
+            return json.dumps(record, ensure_ascii=False) + '\n'
+        
+        if audio_format == 'ndjson':
+            def generate():
+                for records, _, _, _ in results():
+                    yield "".join(json_line(record) for record in records)
+                yield json_line(summary())
+            
+            return Response(
+                stream_with_context(generate()),
+                mimetype='application/x-ndjson',
+                headers={'X-Accel-Buffering': 'no', 'Cache-Control': 'no-cache'}
+            )
+        
+        def generate_zip():
+            # Un WAV por ítem único y al final un manifiesto con todos los ítems
+            archive = bulk.ZipStream()
+            manifest = []
+            for records, key, wav_data, sample_rate in results():
+                manifest.extend(records)
+                if wav_data is not None:
+                    yield archive.add(f'{key}.wav', encode_wav(wav_data, sample_rate))
+            
+            manifest.append(summary())
+            yield archive.add('manifest.jsonl', "".join(json_line(record) for record in manifest).encode('utf-8'))
+            yield archive.close()
+        
+        return Response(
+            stream_with_context(generate_zip()),
+            mimetype='application/zip',
+            headers={
+                'Content-Disposition': 'attachment; filename=spanish_synthesis_batch.zip',
+                'X-Accel-Buffering': 'no'
+            }
+        )
+        
+    except Exception as e:
+        logger.error(f"❌ Error en síntesis masiva: {e}")
+        payload, status, headers = synthesis_error(e, 'synthesize_batch')
+        return jsonify(payload), status, headers
+
+@app.route('/estimate', methods=['POST'])
+def estimate():
+    """Duración, cómputo y espera previstos de una síntesis, sin ejecutarla"""
+    try:
+        data = request.get_json(silent=True) or request.form
+        params, error = parse_synthesis_params(data)
+        if error:
+            return jsonify(error[0]), error[1]
+        return jsonify(estimate_payload(params))
+    except Exception as e:
+        logger.error(f"❌ Error estimando síntesis: {e}")
+        payload, status, headers = synthesis_error(e, 'estimate')
+        return jsonify(payload), status, headers
+
+@app.route('/audio/<key>', methods=['GET'])
+def serve_cached_audio(key):
+    """Servir un audio sintetizado por su clave de caché (/synthesize_json y /synthesize_batch)"""
+    cached, error = lookup_cached_audio(key)
+    if error:
+        return jsonify(error[0]), error[1]
+    
+    audio_format, bitrate, error = parse_output_format(request.args, request.headers.get('Accept'))
+    if error:
+        return jsonify(error[0]), error[1]
+    
+    wav_data, sample_rate = cached
+    return Response(
+        stream_with_context(encoding.as_bytes(encoded_audio(wav_data, sample_rate, audio_format, bitrate))),
+        mimetype=encoding.media_type(audio_format, sample_rate),
+        headers=audio_headers(wav_data, audio_format, {'Cache-Control': 'public, max-age=86400'})
+    )
+
+@app.route('/cache/stats', methods=['GET'])
+def cache_stats():
+    """Estadísticas de la caché de audio sintetizado"""
+    return jsonify(audio_cache.stats())
+
+@app.route('/metrics', methods=['GET'])
+def prometheus_metrics():
+    """Métricas en formato de exposición de Prometheus"""
+    body, content_type = metrics.render()
+    return Response(body, content_type=content_type)
+
+@app.route('/debug/audio', methods=['GET'])
+def list_debug_audio():
+    """Listar las capturas de debug indexadas (más recientes primero)"""
+    try:
+        limit = min(int(request.args.get('limit', 50)), 500)
+        offset = int(request.args.get('offset', 0))
+    except ValueError:
+        return jsonify({'error': 'limit and offset must be integers'}), 400
+    
+    items, total = debug_capture.list(limit, offset, request.args.get('voice'), request.args.get('q'))
+    for item in items:
+        item['url'] = f"/debug/audio/{item['filename']}"
+    return jsonify({'items': items, 'total': total, 'limit': limit, 'offset': offset, 'stats': debug_capture.stats()})
 
 @app.route('/debug/audio/<filename>')
 def serve_debug_audio(filename):
     """Servir archivos de audio de debug"""
     try:
-        filepath = os.path.join(debug_dir, filename)
-        if os.path.exists(filepath):
+        # Solo nombres del índice: ni recorridos del directorio ni rutas arbitrarias
+        filepath = debug_capture.path(filename)
+        if filepath and os.path.exists(filepath):
             return send_file(filepath, mimetype='audio/wav')
-        else:
-            return jsonify({'error': 'File not found'}), 404
+        
+        # Aún en la cola del escritor: servir desde memoria
+        pending = debug_capture.pending_audio(filename)
+        if pending is not None:
+            return Response(encode_wav(*pending), mimetype='audio/wav')
+        
+        return jsonify({'error': 'File not found'}), 404
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 if __name__ == '__main__':
     logger.info("🚀 Iniciando servicio Spanish-F5...")
     
-    # Inicializar modelo
-    if initialize_spanish_f5():
-        logger.info("✅ Servicio listo para usar")
-    else:
-        logger.error("❌ Error inicializando modelo")
-        sys.exit(1)
+    # Modelo y calentamiento en segundo plano: /ready responde 200 al terminar
+    start_background_startup()
     
     # Obtener configuración desde variables de entorno
     flask_host = os.getenv('FLASK_HOST', '0.0.0.0')
@@ -0,0 +1,236 @@
+#!/usr/bin/env python3
+"""
+Front-end ASGI del servicio F5-TTS Español
+
+Mantiene los contratos de /health, /ready, /voices, /synthesize, /synthesize_json,
+/estimate y /audio/<key>,
+pero sin bloquear un hilo por petición mientras espera al modelo: la
+síntesis se encola en el planificador (cola acotada con ejecutores fijos) y
+el handler espera su Future de forma asíncrona. Con la cola llena se
+responde 429 con Retry-After de inmediato. El resto de rutas se sirven con
+la aplicación Flask montada debajo.
+
+Mientras espera, el handler comprueba si el cliente sigue conectado y si
+venció el plazo de la petición: en ambos casos cancela la síntesis (en cola
+o entre fragmentos) para no gastar cómputo en una respuesta que nadie leerá.
+
+El audio WAV/PCM se envía como vistas (memoryview) del buffer PCM16 de la
+caché, sin copiarlo: Starlette y uvicorn aceptan memoryview, WSGI no.
+
+Ejecución:
+    python asgi.py
+"""
+
+import os
+import time
+import asyncio
+import logging
+
+from a2wsgi import WSGIMiddleware
+from starlette.applications import Starlette
+from starlette.concurrency import run_in_threadpool
+from starlette.responses import JSONResponse, StreamingResponse
+from starlette.routing import Route, Mount
+
+import app as service
+import metrics
+
+logger = logging.getLogger(__name__)
+
+# Cada cuánto se comprueba si el cliente sigue conectado mientras se sintetiza
+DISCONNECT_POLL_SECONDS = float(os.getenv('DISCONNECT_POLL_MS', 250)) / 1000
+
+
+async def health(request):
+    """Endpoint de salud"""
+    return JSONResponse(service.health_payload())
+
+
+async def ready(request):
+    """Listo para tráfico: modelo cargado y calentado (503 mientras tanto)"""
+    payload, status = service.ready_payload()
+    return JSONResponse(payload, status_code=status)
+
+
+async def get_voices(request):
+    """Obtener voces disponibles"""
+    payload, status = service.voices_payload(request.query_params.get('language', 'es'))
+    return JSONResponse(payload, status_code=status)
+
+
+async def run_synthesis(request, params, endpoint):
+    """Encolar la síntesis y esperar su resultado sin bloquear el bucle
+    
+    Devuelve el Future ya terminado (resultado y `cache_key`). Si el cliente
+    se desconecta o vence el plazo, la síntesis se cancela.
+    """
+    # Caché en disco, referencias, catálogo...: puede leer de disco, fuera del bucle de eventos
+    future = await run_in_threadpool(
+        service.submit_synthesis,
+        params['text'], params['voice'], params['speed'],
+        priority=params['priority'], deadline=params['deadline'], endpoint=endpoint,
+        quality=params['quality']
+    )
+    waiter = asyncio.wrap_future(future)
+    try:
+        while True:
+            timeout = DISCONNECT_POLL_SECONDS
+            if params['deadline'] is not None:
+                timeout = min(timeout, max(0.0, params['deadline'] - time.time()))
+            
+            done, _ = await asyncio.wait({waiter}, timeout=timeout)
+            if done:
+                waiter.result()
+                return future
+            
+            if params['deadline'] is not None and time.time() >= params['deadline']:
+                raise service.DeadlineExceededError("El plazo de la petición venció durante la síntesis")
+            if await request.is_disconnected():
+                logger.info("🔌 Cliente desconectado: cancelando síntesis")
+                raise service.JobCancelledError("Cliente desconectado")
+    finally:
+        if not future.done():
+            future.cancel()
+
+
+async def synthesize(request):
+    """Endpoint principal de síntesis"""
+    metrics.REQUESTS.labels('synthesize').inc()
+    started = time.time()
+    try:
+        form = await request.form()
+        params, error = service.parse_synthesis_params(form)
+        if error:
+            return JSONResponse(error[0], status_code=error[1])
+
+        audio_format, bitrate, error = service.parse_output_format(form, request.headers.get('accept'))
+        if error:
+            return JSONResponse(error[0], status_code=error[1])
+
+        logger.info(f"🎯 Síntesis solicitada: '{params['text'][:30]}...' | Voz: {params['voice']}")
+
+        wav_data, sample_rate = (await run_synthesis(request, params, 'synthesize')).result()
+
+        # El debug solo se encola: lo escribe el hilo de captura
+        service.save_debug_audio(
+            wav_data, sample_rate, text=params['text'], voice=params['voice'], latency=time.time() - started
+        )
+
+        # Codificación por bloques en el pool de hilos, fuera del bucle de eventos
+        return StreamingResponse(
+            service.encoded_audio(wav_data, sample_rate, audio_format, bitrate),
+            media_type=service.encoding.media_type(audio_format, sample_rate),
+            headers=service.audio_headers(
+                wav_data, audio_format,
+                {'Content-Disposition': f'attachment; filename={service.audio_download_name(audio_format)}'}
+            )
+        )
+
+    except Exception as e:
+        logger.error(f"❌ Error en síntesis: {e}")
+        payload, status, headers = service.synthesis_error(e, 'synthesize')
+        return JSONResponse(payload, status_code=status, headers=headers)
+
+
+async def synthesize_json(request):
+    """Endpoint de síntesis con respuesta JSON"""
+    metrics.REQUESTS.labels('synthesize_json').inc()
+    started = time.time()
+    try:
+        try:
+            data = await request.json()
+        except Exception:
+            data = None
+        if not data:
+            return JSONResponse({'error': 'JSON data required'}, status_code=400)
+
+        params, error = service.parse_synthesis_params(data)
+        if error:
+            return JSONResponse(error[0], status_code=error[1])
+
+        logger.info(f"🎯 Síntesis JSON: '{params['text'][:30]}...' | Voz: {params['voice']}")
+
+        future = await run_synthesis(request, params, 'synthesize_json')
+        wav_data, sample_rate = future.result()
+
+        debug_file = service.save_debug_audio(
+            wav_data, sample_rate, text=params['text'], voice=params['voice'], latency=time.time() - started
+        )
+
+        return JSONResponse(
+            service.synthesis_json_payload(params, wav_data, sample_rate, debug_file, future.cache_key, future.quality)
+        )
+
+    except Exception as e:
+        logger.error(f"❌ Error en síntesis JSON: {e}")
+        payload, status, headers = service.synthesis_error(e, 'synthesize_json')
+        payload.update({'success': False, 'f5_available': service.f5_model is not None})
+        return JSONResponse(payload, status_code=status, headers=headers)
+
+
+async def estimate(request):
+    """Duración, cómputo y espera previstos de una síntesis, sin ejecutarla"""
+    try:
+        try:
+            data = await request.json()
+        except Exception:
+            data = await request.form()
+        params, error = service.parse_synthesis_params(data)
+        if error:
+            return JSONResponse(error[0], status_code=error[1])
+        # Lee la referencia y mira la caché en disco: fuera del bucle de eventos
+        return JSONResponse(await run_in_threadpool(service.estimate_payload, params))
+    except Exception as e:
+        logger.error(f"❌ Error estimando síntesis: {e}")
+        payload, status, headers = service.synthesis_error(e, 'estimate')
+        return JSONResponse(payload, status_code=status, headers=headers)
+
+
+async def serve_cached_audio(request):
+    """Servir un audio de la caché por su clave (handle de /synthesize_json y /synthesize_batch)"""
+    # Puede leer de disco: fuera del bucle de eventos
+    cached, error = await run_in_threadpool(service.lookup_cached_audio, request.path_params['key'])
+    if error:
+        return JSONResponse(error[0], status_code=error[1])
+
+    audio_format, bitrate, error = service.parse_output_format(request.query_params, request.headers.get('accept'))
+    if error:
+        return JSONResponse(error[0], status_code=error[1])
+
+    wav_data, sample_rate = cached
+    return StreamingResponse(
+        service.encoded_audio(wav_data, sample_rate, audio_format, bitrate),
+        media_type=service.encoding.media_type(audio_format, sample_rate),
+        headers=service.audio_headers(wav_data, audio_format, {'Cache-Control': 'public, max-age=86400'})
+    )
+
+
+app = Starlette(routes=[
+    Route('/health', health, methods=['GET']),
+    Route('/ready', ready, methods=['GET']),
+    Route('/voices', get_voices, methods=['GET']),
+    Route('/synthesize', synthesize, methods=['POST']),
+    Route('/synthesize_json', synthesize_json, methods=['POST']),
+    Route('/estimate', estimate, methods=['POST']),
+    Route('/audio/{key}', serve_cached_audio, methods=['GET']),
+    # Resto de endpoints (streaming, caché, debug...) desde la app Flask
+    Mount('/', app=WSGIMiddleware(service.app)),
+])
+
+
+if __name__ == '__main__':
+    import uvicorn
+
+    logger.info("🚀 Iniciando servicio Spanish-F5 (ASGI)...")
+
+    # Modelo y calentamiento en segundo plano: /ready responde 200 al terminar
+    service.start_background_startup()
+
+    # Obtener configuración desde variables de entorno
+    flask_host = os.getenv('FLASK_HOST', '0.0.0.0')
+    flask_port = int(os.getenv('FLASK_PORT', 5005))
+
+    logger.info(f"🌐 Iniciando servidor ASGI en {flask_host}:{flask_port}")
+
+    # Un solo proceso: el modelo vive en memoria de este proceso
+    uvicorn.run(app, host=flask_host, port=flask_port, workers=1, log_level="info")
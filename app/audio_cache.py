@@ -0,0 +1,200 @@
+#!/usr/bin/env python3
+"""
+Caché de audio sintetizado direccionada por contenido
+
+La clave es un hash de (texto, voz, velocidad, checkpoint, versión de
+post-procesado, nivel de calidad). Hay dos niveles: un LRU en memoria
+acotado por bytes y un directorio en disco (volumen montado) que pueden
+compartir varias réplicas.
+El audio terminado se guarda como PCM16 (el formato en que se sirve) y el
+audio sin post-procesar como float32; en disco se conserva el mismo tipo.
+"""
+
+import os
+import json
+import uuid
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import soundfile as sf
+
+logger = logging.getLogger(__name__)
+
+AUDIO_CACHE_ENABLED = os.getenv('AUDIO_CACHE_ENABLED', 'true').lower() == 'true'
+AUDIO_CACHE_DIR = os.getenv('AUDIO_CACHE_DIR', '/app/audio_cache')
+AUDIO_CACHE_MEMORY_MB = int(os.getenv('AUDIO_CACHE_MEMORY_MB', 128))
+AUDIO_CACHE_DISK_MB = int(os.getenv('AUDIO_CACHE_DISK_MB', 2048))
+
+
+def cache_key(text, voice, speed, checkpoint, postprocess_version, quality):
+    """Hash estable de todo lo que determina el audio resultante"""
+    payload = json.dumps({
+        'text': " ".join(text.split()),
+        'voice': voice,
+        'speed': round(float(speed), 3),
+        'checkpoint': checkpoint,
+        'postprocess': postprocess_version,
+        'quality': quality
+    }, ensure_ascii=False, sort_keys=True)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+class AudioCache:
+    """Caché de resultados en dos niveles: memoria y disco"""
+
+    def __init__(self, cache_dir=AUDIO_CACHE_DIR, memory_bytes=AUDIO_CACHE_MEMORY_MB * 1024 * 1024,
+                 disk_bytes=AUDIO_CACHE_DISK_MB * 1024 * 1024, enabled=AUDIO_CACHE_ENABLED):
+        self.cache_dir = cache_dir
+        self.memory_bytes = memory_bytes
+        self.disk_bytes = disk_bytes
+        self.enabled = enabled
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()  # clave -> (audio float32, sample_rate)
+        self._total_bytes = 0
+        self._disk_usage = None
+        self._lock = threading.Lock()
+        self._writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="f5-audio-cache")
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, key[:2], f"{key}.wav")
+
+    def get(self, key):
+        """Buscar un audio en memoria y, si no está, en disco"""
+        if not self.enabled:
+            return None
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.memory_hits += 1
+                return entry
+
+        path = self._path(key)
+        try:
+            dtype = 'int16' if sf.info(path).subtype == 'PCM_16' else 'float32'
+            wav_data, sample_rate = sf.read(path, dtype=dtype)
+        except Exception:
+            with self._lock:
+                self.misses += 1
+            return None
+
+        try:
+            os.utime(path)  # Marca de uso para la expulsión en disco
+        except OSError:
+            pass
+
+        entry = self._remember(key, wav_data, sample_rate)
+        with self._lock:
+            self.disk_hits += 1
+        return entry
+
+    def contains(self, key):
+        """¿Está el audio en memoria o en disco? (sin leerlo ni contarlo)"""
+        if not self.enabled:
+            return False
+        with self._lock:
+            if key in self._entries:
+                return True
+        return os.path.exists(self._path(key))
+
+    def put(self, key, wav_data, sample_rate):
+        """Guardar un audio en memoria y, en segundo plano, en disco"""
+        if not self.enabled:
+            return wav_data, sample_rate
+
+        entry = self._remember(key, wav_data, sample_rate)
+        self._writer.submit(self._write_disk, key, entry[0], sample_rate)
+        return entry
+
+    def _remember(self, key, wav_data, sample_rate):
+        dtype = np.int16 if getattr(wav_data, 'dtype', None) == np.int16 else np.float32
+        wav_data = np.ascontiguousarray(wav_data, dtype=dtype)
+        wav_data.setflags(write=False)
+        entry = (wav_data, sample_rate)
+
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._total_bytes -= previous[0].nbytes
+            self._entries[key] = entry
+            self._total_bytes += wav_data.nbytes
+            while self._total_bytes > self.memory_bytes and len(self._entries) > 1:
+                _, (old_wav, _) = self._entries.popitem(last=False)
+                self._total_bytes -= old_wav.nbytes
+        return entry
+
+    def _write_disk(self, key, wav_data, sample_rate):
+        """Escritura atómica en disco (otras réplicas pueden estar leyendo)"""
+        path = self._path(key)
+        if os.path.exists(path):
+            return
+        # Único entre réplicas: en contenedores todas suelen tener el mismo PID
+        tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            subtype = 'PCM_16' if wav_data.dtype == np.int16 else 'FLOAT'
+            sf.write(tmp_path, wav_data, sample_rate, format='WAV', subtype=subtype)
+            os.replace(tmp_path, path)
+            self._account_disk(os.path.getsize(path))
+        except Exception as e:
+            logger.warning(f"⚠️  No se pudo guardar audio en caché de disco: {e}")
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+
+    def _account_disk(self, added_bytes):
+        """Mantener el uso de disco bajo el límite expulsando lo menos usado"""
+        if self._disk_usage is None:
+            self._disk_usage = sum(size for _, _, size in self._disk_files())
+        else:
+            self._disk_usage += added_bytes
+
+        if self._disk_usage <= self.disk_bytes:
+            return
+
+        files = sorted(self._disk_files())  # Más antiguos primero
+        for _, path, size in files:
+            if self._disk_usage <= self.disk_bytes * 0.9:
+                break
+            try:
+                os.unlink(path)
+                self._disk_usage -= size
+            except OSError:
+                pass
+        logger.info(f"🧹 Caché de audio en disco recortada a {self._disk_usage / 1e6:.1f} MB")
+
+    def _disk_files(self):
+        for root, _, names in os.walk(self.cache_dir):
+            for name in names:
+                if not name.endswith('.wav'):
+                    continue
+                path = os.path.join(root, name)
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+                yield st.st_mtime, path, st.st_size
+
+    def stats(self):
+        with self._lock:
+            lookups = self.memory_hits + self.disk_hits + self.misses
+            return {
+                'enabled': self.enabled,
+                'memory_entries': len(self._entries),
+                'memory_bytes': self._total_bytes,
+                'memory_max_bytes': self.memory_bytes,
+                'memory_hits': self.memory_hits,
+                'disk_hits': self.disk_hits,
+                'misses': self.misses,
+                'hit_rate': (self.memory_hits + self.disk_hits) / lookups if lookups else 0.0,
+                'disk_dir': self.cache_dir,
+                'disk_bytes': self._disk_usage
+            }
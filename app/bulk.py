@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+"""
+Síntesis masiva para /synthesize_batch
+
+Recibe muchas líneas de golpe (catálogos de prompts IVR), elimina las
+repetidas y las va entregando al planificador con una ventana de trabajos en
+curso. Así los micro-lotes se llenan solos sin desbordar la cola acotada, y
+los resultados se devuelven en cuanto terminan, no en el orden de entrada.
+"""
+
+import io
+import os
+import json
+import time
+import zipfile
+from collections import OrderedDict, deque
+from concurrent.futures import Future, wait, FIRST_COMPLETED
+
+from scheduler import QueueFullError
+
+BULK_MAX_ITEMS = int(os.getenv('BULK_MAX_ITEMS', 1000))
+BULK_MAX_IN_FLIGHT = int(os.getenv('BULK_MAX_IN_FLIGHT', 16))
+# Segundos reintentando con la cola llena y nada propio en curso antes de dar el resto por fallido
+BULK_QUEUE_TIMEOUT = float(os.getenv('BULK_QUEUE_TIMEOUT', 60))
+
+
+def parse_items(body):
+    """Leer un array JSON o JSONL (un objeto por línea); devuelve (items, error)"""
+    body = body.strip()
+    if not body:
+        return None, "Request body is empty"
+
+    try:
+        if body.startswith('['):
+            items = json.loads(body)
+        else:
+            items = [json.loads(line) for line in body.splitlines() if line.strip()]
+    except ValueError as e:
+        return None, f"Invalid JSON/JSONL body: {e}"
+
+    if not isinstance(items, list) or not all(isinstance(item, dict) for item in items):
+        return None, "Body must be a JSON array or JSONL of objects"
+    if not items:
+        return None, "No items to synthesize"
+    if len(items) > BULK_MAX_ITEMS:
+        return None, f"Too many items ({len(items)} > {BULK_MAX_ITEMS})"
+    return items, None
+
+
+def group_items(items, key_fn):
+    """Agrupar ítems idénticos: clave -> (parámetros, índices de entrada)"""
+    groups = OrderedDict()
+    for index, params in enumerate(items):
+        groups.setdefault(key_fn(params), (params, []))[1].append(index)
+    return groups
+
+
+def run_groups(groups, submit, max_in_flight=BULK_MAX_IN_FLIGHT, queue_timeout=BULK_QUEUE_TIMEOUT):
+    """Sintetizar cada grupo y generar (clave, parámetros, índices, future) según terminan
+
+    `submit(params)` devuelve un Future. Con la cola llena se espera a que
+    termine algo propio antes de reintentar; sin nada propio en curso se
+    reintenta hasta `queue_timeout` segundos y después los grupos pendientes
+    terminan con el QueueFullError (429). Al cerrar el generador (cliente
+    desconectado) se cancela lo que siga en curso.
+    """
+    queued = deque(groups.items())
+    in_flight = {}
+    blocked_since = None
+    try:
+        while queued or in_flight:
+            while queued and len(in_flight) < max_in_flight:
+                key, (params, indices) = queued[0]
+                try:
+                    future = submit(params)
+                    blocked_since = None
+                except QueueFullError as e:
+                    if in_flight:
+                        break
+                    blocked_since = blocked_since or time.time()
+                    if time.time() - blocked_since < queue_timeout:
+                        time.sleep(min(e.retry_after, 1))
+                        continue
+                    # Otros clientes ocupan la cola todo el rato: no esperar indefinidamente
+                    future = Future()
+                    future.set_exception(e)
+                except Exception as e:
+                    future = Future()
+                    future.set_exception(e)
+                queued.popleft()
+                in_flight[future] = (key, params, indices)
+
+            done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in done:
+                key, params, indices = in_flight.pop(future)
+                yield key, params, indices, future
+    finally:
+        for future in in_flight:
+            future.cancel()
+
+
+class ZipStream:
+    """Archivo ZIP escrito de forma incremental para una respuesta streaming"""
+
+    def __init__(self):
+        self._buffer = io.BytesIO()
+        self._zip = zipfile.ZipFile(self, 'w', compression=zipfile.ZIP_STORED)
+
+    # Interfaz mínima de archivo no posicionable que usa zipfile
+    def write(self, data):
+        return self._buffer.write(data)
+
+    def flush(self):
+        pass
+
+    def _drain(self):
+        data = self._buffer.getvalue()
+        self._buffer.seek(0)
+        self._buffer.truncate()
+        return data
+
+    def add(self, name, data):
+        """Añadir un archivo y devolver los bytes listos para enviar"""
+        with self._zip.open(name, 'w') as entry:
+            entry.write(data)
+        return self._drain()
+
+    def close(self):
+        """Cerrar el archivo (directorio central) y devolver los últimos bytes"""
+        self._zip.close()
+        return self._drain()
@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+"""
+Modelo de coste de una síntesis: duración del audio y segundos de cómputo
+
+La duración sale de la misma regla con la que F5-TTS fija la longitud de
+salida: bytes de texto al ritmo de habla de la referencia (bytes de su
+transcripción por segundo de audio), divididos por la velocidad. Una
+corrección por voz, aprendida de los audios generados, absorbe el recorte de
+la referencia y los fundidos entre fragmentos.
+
+El cómputo es lineal en el trabajo del modelo: cada fragmento procesa la
+referencia más su trozo de texto, y cada nivel de calidad cuesta sus
+evaluaciones por paso (QualityTier.cost). Tras cada lote se ajusta por
+mínimos cuadrados con olvido exponencial
+
+    segundos = fijo + unidad * coste del nivel * (fragmentos * referencia + generado)
+
+con los tiempos reales del lote. Hasta la primera observación se usa
+COST_MODEL_PRIOR_RTF. Lo usan /estimate, la planificación por trabajo más
+corto primero y las estimaciones de espera (Retry-After).
+"""
+
+import os
+import math
+import logging
+import threading
+
+from quality import TIERS, DEFAULT_TIER, ESTIMATED_CHARS_PER_SECOND
+from spanish_text import SEGMENT_TARGET_SECONDS
+from memory_governor import MAX_CHUNK_SECONDS
+
+logger = logging.getLogger(__name__)
+
+# Segundos de cómputo por segundo de audio procesado (referencia + generado) con el nivel por defecto
+COST_MODEL_PRIOR_RTF = float(os.getenv('COST_MODEL_PRIOR_RTF', 0.5))
+# Peso que conserva lo aprendido en cada observación nueva (olvido exponencial)
+COST_MODEL_DECAY = float(os.getenv('COST_MODEL_DECAY', 0.95))
+
+# Velocidades que aplica la síntesis (Spanish-F5 recomienda 0.8-1.2)
+MIN_SPEED, MAX_SPEED = 0.8, 1.2
+CROSS_FADE_SECONDS = 0.15
+
+
+class CostEstimate:
+    """Previsión de una síntesis: texto, fragmentos, audio y cómputo"""
+
+    def __init__(self, chars, chunks, audio_seconds, work, compute_seconds, tier):
+        self.chars = chars                      # Bytes de texto normalizado
+        self.chunks = chunks                    # Fragmentos en que se parte para el modelo
+        self.audio_seconds = audio_seconds      # Duración prevista del audio
+        self.work = work                        # Unidades de trabajo del modelo
+        self.compute_seconds = compute_seconds  # Cómputo previsto en el modelo
+        self.tier = tier
+
+    def to_dict(self):
+        return {
+            'chars': self.chars,
+            'chunks': self.chunks,
+            'audio_seconds': round(self.audio_seconds, 3),
+            'compute_seconds': round(self.compute_seconds, 3),
+            'quality': self.tier
+        }
+
+
+class CostModel:
+    """Predice duración y cómputo de cada síntesis y se calibra con los lotes ejecutados"""
+
+    def __init__(self, prior_rtf=COST_MODEL_PRIOR_RTF, decay=COST_MODEL_DECAY):
+        self.prior_rtf = prior_rtf
+        self.decay = min(max(decay, 0.0), 1.0)
+        self.observations = 0
+        self.last_ratio = None              # Cómputo real / previsto del último lote
+        self._sums = [0.0] * 5              # Pesos, x, y, x², xy de la regresión
+        self._duration = {}                 # referencia -> audio real / previsto
+        self._lock = threading.Lock()
+
+    def estimate(self, text, speed, tier, ref_seconds, ref_chars, voice=None):
+        """Previsión de sintetizar `text` (ya normalizado) con una referencia
+
+        `ref_seconds` y `ref_chars` son la duración de la referencia y los
+        bytes de su transcripción; `voice` identifica la referencia para la
+        corrección de duración aprendida.
+        """
+        tier = TIERS[tier] if isinstance(tier, str) else tier
+        chars = len(text.encode('utf-8'))
+        speed = max(MIN_SPEED, min(MAX_SPEED, speed))
+        chars_per_second = ref_chars / ref_seconds if ref_chars > 0 and ref_seconds > 0 else ESTIMATED_CHARS_PER_SECOND
+
+        gen_seconds = chars / chars_per_second / speed
+        chunk_seconds = max(1.0, min(SEGMENT_TARGET_SECONDS, MAX_CHUNK_SECONDS - ref_seconds))
+        chunks = max(1, math.ceil(gen_seconds / chunk_seconds))
+        # El modelo vuelve a procesar la referencia en cada fragmento
+        work = tier.cost * (chunks * ref_seconds + gen_seconds)
+
+        with self._lock:
+            correction = self._duration.get(voice, 1.0)
+            compute_seconds = self._predict(work)
+        audio_seconds = max(0.0, gen_seconds - (chunks - 1) * CROSS_FADE_SECONDS) * correction
+        return CostEstimate(chars, chunks, audio_seconds, work, compute_seconds, tier.name)
+
+    def _predict(self, work):
+        fixed, unit = self._coefficients()
+        return fixed + unit * work
+
+    def _coefficients(self):
+        """(segundos fijos por lote, segundos por unidad de trabajo)"""
+        n, sx, sy, sxx, sxy = self._sums
+        if n <= 0 or sx <= 0:
+            return 0.0, self.prior_rtf / TIERS[DEFAULT_TIER].cost
+        denominator = n * sxx - sx * sx
+        if denominator > 1e-9 * n * sxx:
+            unit = (n * sxy - sx * sy) / denominator
+            fixed = (sy - unit * sx) / n
+            if unit > 0 and fixed >= 0:
+                return fixed, unit
+        # Lotes aún demasiado parecidos para separar el coste fijo: proporcional
+        return 0.0, sy / sx
+
+    def observe(self, estimates, seconds, audio_seconds=None, voice=None):
+        """Registrar un lote: previsiones de sus trabajos, segundos que tardó y audio real
+
+        `audio_seconds` (opcional) es la duración real de cada trabajo, en el
+        mismo orden; corrige la previsión de duración de la referencia `voice`.
+        """
+        work = sum(estimate.work for estimate in estimates)
+        if work <= 0 or seconds <= 0:
+            return
+        with self._lock:
+            predicted = self._predict(work)
+            self.last_ratio = seconds / predicted if predicted > 0 else None
+            self._sums = [value * self.decay for value in self._sums]
+            for i, value in enumerate((1.0, work, seconds, work * work, work * seconds)):
+                self._sums[i] += value
+            self.observations += 1
+
+            if audio_seconds:
+                expected = sum(estimate.audio_seconds for estimate in estimates)
+                actual = sum(audio_seconds)
+                if expected > 0 and actual > 0:
+                    previous = self._duration.get(voice, 1.0)
+                    # Sobre la corrección vigente, acotada frente a salidas anómalas
+                    ratio = min(4.0, max(0.25, previous * actual / expected))
+                    self._duration[voice] = ratio if voice not in self._duration else 0.8 * previous + 0.2 * ratio
+        return self.last_ratio
+
+    def stats(self):
+        with self._lock:
+            fixed, unit = self._coefficients()
+            return {
+                'observations': self.observations,
+                'fixed_seconds': round(fixed, 4),
+                'seconds_per_unit': round(unit, 6),
+                'rtf': {name: round(unit * tier.cost, 4) for name, tier in TIERS.items()},
+                'last_ratio': round(self.last_ratio, 3) if self.last_ratio is not None else None,
+                'voices_calibrated': len(self._duration)
+            }
@@ -0,0 +1,234 @@
+#!/usr/bin/env python3
+"""
+Captura asíncrona del audio de debug
+
+Las síntesis no escriben en disco: capture() solo decide si la petición se
+muestrea (1 de cada N) y deja el audio en una cola acotada. Un hilo escritor
+lo guarda, lo registra en un índice SQLite (texto, voz, latencia, fecha) y
+aplica las cuotas de tamaño y antigüedad expulsando lo más antiguo. Si la
+cola está llena la captura se descarta en lugar de frenar la petición.
+"""
+
+import os
+import time
+import queue
+import sqlite3
+import logging
+import threading
+import itertools
+from datetime import datetime
+
+import encoding
+
+logger = logging.getLogger(__name__)
+
+DEBUG_AUDIO = os.getenv('DEBUG_AUDIO', 'true').lower() == 'true'
+DEBUG_AUDIO_DIR = os.getenv('DEBUG_AUDIO_DIR', '/app/debug_audio')
+DEBUG_AUDIO_SAMPLE_EVERY = int(os.getenv('DEBUG_AUDIO_SAMPLE_EVERY', 1))
+DEBUG_AUDIO_MAX_MB = int(os.getenv('DEBUG_AUDIO_MAX_MB', 512))
+DEBUG_AUDIO_MAX_AGE_HOURS = float(os.getenv('DEBUG_AUDIO_MAX_AGE_HOURS', 72))
+DEBUG_AUDIO_QUEUE = int(os.getenv('DEBUG_AUDIO_QUEUE', 64))
+
+INDEX_FILE = 'index.sqlite3'
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS captures (
+    filename TEXT PRIMARY KEY,
+    created_at REAL NOT NULL,
+    text TEXT,
+    voice TEXT,
+    latency REAL,
+    duration REAL,
+    sample_rate INTEGER,
+    bytes INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS captures_created_at ON captures (created_at);
+"""
+
+
+class DebugCapture:
+    """Escritor en segundo plano del audio de debug, con cuotas e índice"""
+
+    def __init__(self, debug_dir=DEBUG_AUDIO_DIR, enabled=DEBUG_AUDIO, sample_every=DEBUG_AUDIO_SAMPLE_EVERY,
+                 max_bytes=DEBUG_AUDIO_MAX_MB * 1024 * 1024, max_age=DEBUG_AUDIO_MAX_AGE_HOURS * 3600,
+                 queue_size=DEBUG_AUDIO_QUEUE):
+        self.debug_dir = debug_dir
+        self.enabled = enabled
+        self.sample_every = max(1, sample_every)
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.captured = 0
+        self.dropped = 0
+        self.evicted = 0
+        self._counter = itertools.count()
+        self._queue = queue.Queue(maxsize=max(1, queue_size))
+        self._pending = {}  # nombre -> (audio, sample_rate) aún sin escribir
+        self._lock = threading.Lock()
+        self._db = None
+        self._total_bytes = 0
+        self._thread = None
+
+    def start(self):
+        """Abrir el índice y arrancar el escritor (idempotente)"""
+        with self._lock:
+            if self._thread is not None or not self.enabled:
+                return
+            os.makedirs(self.debug_dir, exist_ok=True)
+            self._db = sqlite3.connect(os.path.join(self.debug_dir, INDEX_FILE), check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.executescript(SCHEMA)
+            self._index_existing_files()
+            self._total_bytes = self._db.execute("SELECT COALESCE(SUM(bytes), 0) FROM captures").fetchone()[0]
+            self._thread = threading.Thread(target=self._loop, name="f5-debug-writer", daemon=True)
+            self._thread.start()
+
+    def _index_existing_files(self):
+        """Registrar los WAV de antes del índice para que también caigan en las cuotas"""
+        if self._db.execute("SELECT 1 FROM captures LIMIT 1").fetchone():
+            return
+        rows = []
+        for entry in os.scandir(self.debug_dir):
+            if entry.name.endswith('.wav') and entry.is_file():
+                st = entry.stat()
+                rows.append((entry.name, st.st_mtime, None, None, None, None, None, st.st_size))
+        if rows:
+            self._db.executemany("INSERT OR IGNORE INTO captures VALUES (?, ?, ?, ?, ?, ?, ?, ?)", rows)
+            self._db.commit()
+            logger.info(f"🐛 Índice de debug creado con {len(rows)} archivos existentes")
+
+    def capture(self, wav_data, sample_rate, text=None, voice=None, latency=None, prefix="spanish_f5"):
+        """Encolar una captura si toca por muestreo; devuelve el nombre o None"""
+        if not self.enabled:
+            return None
+        sequence = next(self._counter)
+        if sequence % self.sample_every:
+            return None
+        self.start()
+
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S_%f")[:-3]
+        filename = f"{prefix}_{timestamp}_{sequence}.wav"
+        item = (filename, wav_data, sample_rate, text, voice, latency, time.time())
+        with self._lock:
+            try:
+                self._queue.put_nowait(item)
+            except queue.Full:
+                self.dropped += 1
+                return None
+            self._pending[filename] = (wav_data, sample_rate)
+        return filename
+
+    def _loop(self):
+        while True:
+            filename, wav_data, sample_rate, text, voice, latency, created_at = self._queue.get()
+            try:
+                self._write(filename, wav_data, sample_rate, text, voice, latency, created_at)
+            except Exception as e:
+                logger.error(f"❌ Error guardando debug: {e}")
+            finally:
+                with self._lock:
+                    self._pending.pop(filename, None)
+
+    def _write(self, filename, wav_data, sample_rate, text, voice, latency, created_at):
+        path = os.path.join(self.debug_dir, filename)
+        tmp_path = f"{path}.tmp"
+        # Cabecera y muestras PCM16 directamente desde el buffer del audio servido
+        with open(tmp_path, 'wb') as f:
+            for chunk in encoding.encode(wav_data, sample_rate, 'wav'):
+                f.write(chunk)
+        os.replace(tmp_path, path)
+        size = os.path.getsize(path)
+
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO captures VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (filename, created_at, text, voice, latency, len(wav_data) / sample_rate, sample_rate, size)
+            )
+            self._db.commit()
+            self._total_bytes += size
+            self.captured += 1
+        logger.info(f"🐛 Debug guardado: {filename}")
+        self._enforce_quotas()
+
+    def _enforce_quotas(self):
+        """Expulsar capturas por antigüedad y, si hace falta, por tamaño total"""
+        cutoff = time.time() - self.max_age
+        with self._lock:
+            expired = self._db.execute(
+                "SELECT filename, bytes FROM captures WHERE created_at < ?", (cutoff,)
+            ).fetchall()
+            victims = list(expired)
+            excess = self._total_bytes - sum(size for _, size in victims) - self.max_bytes
+            if excess > 0:
+                oldest = self._db.execute(
+                    "SELECT filename, bytes FROM captures WHERE created_at >= ? ORDER BY created_at", (cutoff,)
+                )
+                for filename, size in oldest:
+                    if excess <= 0:
+                        break
+                    victims.append((filename, size))
+                    excess -= size
+            if not victims:
+                return
+
+            self._db.executemany("DELETE FROM captures WHERE filename = ?", [(f,) for f, _ in victims])
+            self._db.commit()
+            self._total_bytes -= sum(size for _, size in victims)
+            self.evicted += len(victims)
+
+        for filename, _ in victims:
+            try:
+                os.unlink(os.path.join(self.debug_dir, filename))
+            except OSError:
+                pass
+
+    def pending_audio(self, filename):
+        """Audio todavía en cola (aún sin archivo), o None"""
+        with self._lock:
+            return self._pending.get(filename)
+
+    def path(self, filename):
+        """Ruta de una captura indexada, o None si no existe"""
+        if not self.enabled or self._db is None:
+            return None
+        with self._lock:
+            row = self._db.execute("SELECT 1 FROM captures WHERE filename = ?", (filename,)).fetchone()
+        return os.path.join(self.debug_dir, filename) if row else None
+
+    def list(self, limit=50, offset=0, voice=None, text=None):
+        """Capturas más recientes primero, filtrables por voz y texto"""
+        if not self.enabled or self._db is None:
+            return [], 0
+
+        where, args = [], []
+        if voice:
+            where.append("voice = ?")
+            args.append(voice)
+        if text:
+            where.append("text LIKE ?")
+            args.append(f"%{text}%")
+        clause = f"WHERE {' AND '.join(where)}" if where else ""
+
+        with self._lock:
+            total = self._db.execute(f"SELECT COUNT(*) FROM captures {clause}", args).fetchone()[0]
+            rows = self._db.execute(
+                f"SELECT filename, created_at, text, voice, latency, duration, sample_rate, bytes "
+                f"FROM captures {clause} ORDER BY created_at DESC LIMIT ? OFFSET ?",
+                args + [limit, offset]
+            ).fetchall()
+
+        columns = ('filename', 'created_at', 'text', 'voice', 'latency', 'duration', 'sample_rate', 'bytes')
+        return [dict(zip(columns, row)) for row in rows], total
+
+    def stats(self):
+        with self._lock:
+            return {
+                'enabled': self.enabled,
+                'sample_every': self.sample_every,
+                'queued': self._queue.qsize(),
+                'captured': self.captured,
+                'dropped': self.dropped,
+                'evicted': self.evicted,
+                'bytes': self._total_bytes,
+                'max_bytes': self.max_bytes,
+                'max_age_hours': self.max_age / 3600
+            }
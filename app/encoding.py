@@ -0,0 +1,364 @@
+#!/usr/bin/env python3
+"""
+Codificación de la salida de audio: WAV, PCM16, FLAC, Ogg/Opus y MP3
+
+El audio terminado se guarda como un array PCM 16-bit contiguo (la mitad que
+float32), convertido una sola vez y por bloques. WAV y PCM se sirven desde
+ese mismo array: la cabecera y después vistas (memoryview) de sus muestras,
+sin copiarlas. El audio flotante se convierte por bloques en float32, sin
+copias intermedias en float64. Todo se entrega como un iterador, listo para
+una respuesta en streaming. FLAC, Opus y MP3 pasan por un proceso ffmpeg
+alimentado por un pipe, de modo que los primeros bytes salen antes de
+terminar de codificar. Sin ffmpeg se recurre a libsndfile, que codifica el
+audio completo de una vez.
+"""
+
+import io
+import os
+import struct
+import shutil
+import logging
+import threading
+import subprocess
+
+import numpy as np
+import soundfile as sf
+
+logger = logging.getLogger(__name__)
+
+FFMPEG_BINARY = os.getenv('FFMPEG_BINARY') or shutil.which('ffmpeg')
+
+# Muestras por bloque al convertir a PCM16 (128 KiB de salida)
+BLOCK_SAMPLES = 65536
+READ_SIZE = 65536
+# Segundos que se espera al hilo que alimenta ffmpeg tras cortar la codificación
+FEEDER_JOIN_TIMEOUT = 5
+
+FORMATS = ('wav', 'pcm', 'flac', 'opus', 'mp3')
+COMPRESSED_FORMATS = ('flac', 'opus', 'mp3')
+
+EXTENSIONS = {'wav': 'wav', 'pcm': 'pcm', 'flac': 'flac', 'opus': 'ogg', 'mp3': 'mp3'}
+
+# Tipos MIME aceptados en la cabecera Accept -> formato
+ACCEPT_TYPES = {
+    'audio/wav': 'wav', 'audio/x-wav': 'wav', 'audio/wave': 'wav', 'audio/vnd.wave': 'wav',
+    'audio/l16': 'pcm', 'audio/pcm': 'pcm',
+    'audio/flac': 'flac', 'audio/x-flac': 'flac',
+    'audio/ogg': 'opus', 'audio/opus': 'opus',
+    'audio/mpeg': 'mp3', 'audio/mp3': 'mp3',
+}
+
+# Bitrates en kbps: por defecto (voz) y rango admitido por el códec
+DEFAULT_BITRATES = {'opus': 32, 'mp3': 64}
+BITRATE_RANGES = {'opus': (6, 256), 'mp3': (8, 320)}
+
+FFMPEG_CODECS = {
+    'flac': (['-c:a', 'flac'], 'flac'),
+    'opus': (['-c:a', 'libopus', '-application', 'voip'], 'ogg'),
+    'mp3': (['-c:a', 'libmp3lame'], 'mp3'),
+}
+
+SOUNDFILE_FORMATS = {
+    'flac': ('FLAC', 'PCM_16'),
+    'opus': ('OGG', 'OPUS'),
+    'mp3': ('MP3', 'MPEG_LAYER_III'),
+}
+
+
+class UnsupportedFormatError(ValueError):
+    """Formato de salida desconocido, no negociable o sin codificador disponible"""
+
+
+def media_type(audio_format, sample_rate):
+    if audio_format == 'pcm':
+        return f'audio/L16;rate={sample_rate};channels=1'
+    return {
+        'wav': 'audio/wav',
+        'flac': 'audio/flac',
+        'opus': 'audio/ogg; codecs=opus',
+        'mp3': 'audio/mpeg',
+    }[audio_format]
+
+
+def negotiate(requested=None, accept=None, default='wav', allowed=FORMATS):
+    """Elegir formato: el parámetro `format` manda; si no, la cabecera Accept"""
+    if requested:
+        requested = requested.lower()
+        if requested not in allowed:
+            raise UnsupportedFormatError(f"Unsupported format '{requested}'")
+        return requested
+
+    if not accept:
+        return default
+
+    candidates = []
+    for position, part in enumerate(accept.split(',')):
+        media, *params = [p.strip() for p in part.split(';')]
+        media = media.lower()
+        quality = 1.0
+        for param in params:
+            if param.startswith('q='):
+                try:
+                    quality = float(param[2:])
+                except ValueError:
+                    quality = 0.0
+        if quality <= 0:
+            continue
+        if media in ('*/*', 'audio/*'):
+            candidates.append((quality, -position, default))
+        elif ACCEPT_TYPES.get(media) in allowed:
+            candidates.append((quality, -position, ACCEPT_TYPES[media]))
+
+    if candidates:
+        return max(candidates)[2]
+    # Clientes que piden application/json u otros tipos: se mantiene el formato por defecto
+    if not any(part.strip().lower().startswith('audio/') for part in accept.split(',')):
+        return default
+    raise UnsupportedFormatError(f"None of the accepted types can be produced: {accept}")
+
+
+def parse_bitrate(audio_format, value):
+    """Bitrate en kbps ('32k', '32', 32000) validado para el formato, o None"""
+    if audio_format not in BITRATE_RANGES:
+        return None
+    if value in (None, ''):
+        return DEFAULT_BITRATES[audio_format]
+
+    text = str(value).strip().lower()
+    try:
+        kbps = float(text[:-1]) if text.endswith('k') else float(text)
+    except ValueError:
+        raise UnsupportedFormatError(f"Invalid bitrate '{value}'")
+    if kbps >= 1000:  # Dado en bps
+        kbps /= 1000
+
+    low, high = BITRATE_RANGES[audio_format]
+    if not low <= kbps <= high:
+        raise UnsupportedFormatError(f"Bitrate for {audio_format} must be between {low}k and {high}k")
+    return int(kbps)
+
+
+def available(audio_format):
+    """Indica si hay codificador para el formato en este entorno"""
+    if audio_format not in COMPRESSED_FORMATS:
+        return audio_format in FORMATS
+    if FFMPEG_BINARY:
+        return True
+    major, subtype = SOUNDFILE_FORMATS[audio_format]
+    return major in sf.available_formats() and subtype in sf.available_subtypes(major)
+
+
+def is_pcm16(wav_data):
+    return getattr(wav_data, 'dtype', None) == np.int16
+
+
+def to_pcm16(wav_data):
+    """Convertir audio flotante a bytes PCM 16-bit little-endian"""
+    if is_pcm16(wav_data):
+        return np.ascontiguousarray(wav_data, dtype='<i2').tobytes()
+    wav_data = np.asarray(wav_data, dtype=np.float32)
+    scaled = np.multiply(wav_data, np.float32(32767))
+    np.clip(scaled, -32767, 32767, out=scaled)
+    return scaled.astype('<i2').tobytes()
+
+
+def pcm16_array(wav_data, block_samples=BLOCK_SAMPLES):
+    """Audio como array PCM16 contiguo y de solo lectura
+
+    El flotante se convierte por bloques: el único temporal es un bloque,
+    no una copia float del audio entero.
+    """
+    if is_pcm16(wav_data):
+        pcm = np.ascontiguousarray(wav_data, dtype='<i2').reshape(-1)
+    else:
+        wav_data = np.asarray(wav_data, dtype=np.float32).reshape(-1)
+        pcm = np.empty(len(wav_data), dtype='<i2')
+        for start in range(0, len(wav_data), block_samples):
+            block = np.multiply(wav_data[start:start + block_samples], np.float32(32767))
+            np.clip(block, -32767, 32767, out=block)
+            pcm[start:start + block_samples] = block
+    pcm.setflags(write=False)
+    return pcm
+
+
+def to_float32(wav_data):
+    """Audio en float32 [-1, 1] (para la cadena de claridad), sea cual sea su formato"""
+    if is_pcm16(wav_data):
+        return np.multiply(wav_data, np.float32(1 / 32767), dtype=np.float32)
+    return np.asarray(wav_data, dtype=np.float32)
+
+
+def pcm16_blocks(wav_data, block_samples=BLOCK_SAMPLES):
+    """PCM16 por bloques, sin convertir todo el audio de golpe
+
+    Si el audio ya es PCM16 los bloques son vistas de su memoria (sin copias).
+    """
+    if is_pcm16(wav_data):
+        view = memoryview(np.ascontiguousarray(wav_data, dtype='<i2').reshape(-1)).cast('B')
+        block_bytes = block_samples * 2
+        for start in range(0, len(view), block_bytes):
+            yield view[start:start + block_bytes]
+        return
+    wav_data = np.asarray(wav_data, dtype=np.float32).reshape(-1)
+    for start in range(0, len(wav_data), block_samples):
+        yield to_pcm16(wav_data[start:start + block_samples])
+
+
+def as_bytes(chunks):
+    """Bloques como bytes: los servidores WSGI no aceptan memoryview (PEP 3333)"""
+    for chunk in chunks:
+        yield bytes(chunk) if isinstance(chunk, memoryview) else chunk
+
+
+def wav_header(sample_rate, data_bytes=None, channels=1, bits_per_sample=16):
+    """Cabecera WAV PCM; sin data_bytes, para un flujo de longitud desconocida"""
+    byte_rate = sample_rate * channels * bits_per_sample // 8
+    block_align = channels * bits_per_sample // 8
+    riff_size = 0xFFFFFFFF if data_bytes is None else 36 + data_bytes
+    data_size = 0xFFFFFFFF if data_bytes is None else data_bytes
+    return (
+        b'RIFF' + struct.pack('<I', riff_size) + b'WAVE'
+        + b'fmt ' + struct.pack('<IHHIIHH', 16, 1, channels, sample_rate, byte_rate, block_align, bits_per_sample)
+        + b'data' + struct.pack('<I', data_size)
+    )
+
+
+def wav_stream_header(sample_rate, channels=1, bits_per_sample=16):
+    """Cabecera WAV para un flujo de longitud desconocida"""
+    return wav_header(sample_rate, None, channels, bits_per_sample)
+
+
+def content_length(wav_data, audio_format):
+    """Tamaño exacto de la respuesta si se conoce de antemano (WAV y PCM), o None"""
+    if audio_format == 'pcm':
+        return len(wav_data) * 2
+    if audio_format == 'wav':
+        return len(wav_header(1)) + len(wav_data) * 2
+    return None
+
+
+def encode(wav_data, sample_rate, audio_format='wav', bitrate=None):
+    """Codificar un audio completo como iterador de bloques (bytes o memoryview)
+
+    Con audio PCM16, WAV y PCM salen directamente de su memoria.
+    """
+    if not is_pcm16(wav_data):
+        wav_data = np.asarray(wav_data, dtype=np.float32).reshape(-1)
+    if audio_format == 'wav':
+        return _prepend(wav_header(sample_rate, len(wav_data) * 2), pcm16_blocks(wav_data))
+    return encode_blocks(pcm16_blocks(wav_data), sample_rate, audio_format, bitrate)
+
+
+class BlockSource:
+    """Flujo de bloques cuyo productor puede dejar de esperar (cliente desconectado)
+
+    `cancel()` se llama desde otro hilo: el generador puede estar bloqueado
+    esperando la siguiente frase y no admite close() mientras tanto.
+    """
+
+    def __init__(self, blocks, cancel):
+        self.blocks = blocks
+        self._cancel = cancel
+
+    def __iter__(self):
+        return iter(self.blocks)
+
+    def close(self):
+        if hasattr(self.blocks, 'close'):
+            self.blocks.close()
+
+    def cancel(self):
+        self._cancel()
+
+
+def encode_blocks(blocks, sample_rate, audio_format, bitrate=None):
+    """Codificar un flujo de bloques PCM16 (p. ej. frases en streaming)
+
+    Si `blocks` tiene cancel() (BlockSource), se llama al cortar la
+    codificación a medias, antes de esperar al hilo que lo consume.
+    """
+    if audio_format == 'wav':
+        return _prepend(wav_stream_header(sample_rate), blocks)
+    if audio_format == 'pcm':
+        return iter(blocks)
+    if audio_format not in COMPRESSED_FORMATS:
+        raise UnsupportedFormatError(f"Unsupported format '{audio_format}'")
+    if FFMPEG_BINARY:
+        return _ffmpeg_stream(blocks, sample_rate, audio_format, bitrate)
+    return _soundfile_encode(blocks, sample_rate, audio_format, bitrate)
+
+
+def _prepend(first, rest):
+    yield first
+    yield from rest
+
+
+def _ffmpeg_stream(blocks, sample_rate, audio_format, bitrate):
+    """Codificar con ffmpeg: PCM por stdin desde un hilo, salida leída según llega"""
+    codec_args, container = FFMPEG_CODECS[audio_format]
+    if bitrate:
+        codec_args = codec_args + ['-b:a', f'{bitrate}k']
+    command = [
+        FFMPEG_BINARY, '-hide_banner', '-loglevel', 'error',
+        '-f', 's16le', '-ar', str(sample_rate), '-ac', '1', '-i', 'pipe:0',
+        *codec_args, '-f', container, 'pipe:1'
+    ]
+    process = subprocess.Popen(command, stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+
+    def feed():
+        try:
+            for block in blocks:
+                process.stdin.write(block)
+        except (BrokenPipeError, ValueError, OSError):
+            pass  # ffmpeg terminado (error o cliente desconectado)
+        finally:
+            if hasattr(blocks, 'close'):
+                blocks.close()
+            try:
+                process.stdin.close()
+            except OSError:
+                pass
+
+    feeder = threading.Thread(target=feed, name="f5-encoder-feed", daemon=True)
+    feeder.start()
+
+    finished = False
+    try:
+        while True:
+            chunk = process.stdout.read1(READ_SIZE)
+            if not chunk:
+                break
+            yield chunk
+        finished = True
+    finally:
+        if not finished:
+            process.kill()
+            # El hilo puede estar esperando al productor (la siguiente frase): que deje de esperar
+            if hasattr(blocks, 'cancel'):
+                blocks.cancel()
+        feeder.join(FEEDER_JOIN_TIMEOUT)
+        if feeder.is_alive():
+            logger.warning(f"⚠️  El hilo que alimenta ffmpeg sigue bloqueado tras {FEEDER_JOIN_TIMEOUT}s")
+        process.wait()
+        stderr = process.stderr.read().decode('utf-8', 'replace').strip()
+        process.stdout.close()
+        process.stderr.close()
+
+    if process.returncode != 0:
+        raise RuntimeError(f"ffmpeg falló codificando {audio_format}: {stderr}")
+
+
+def _soundfile_encode(blocks, sample_rate, audio_format, bitrate):
+    """Alternativa sin ffmpeg: libsndfile sobre el audio completo (bitrate aproximado)"""
+    major, subtype = SOUNDFILE_FORMATS[audio_format]
+    pcm = np.frombuffer(b"".join(blocks), dtype='<i2')
+
+    compression_level = None
+    if bitrate and audio_format in BITRATE_RANGES:
+        # libsndfile solo expone un nivel de compresión 0..1 (0 = máxima calidad)
+        low, high = BITRATE_RANGES[audio_format]
+        compression_level = 1 - (bitrate - low) / (high - low)
+
+    buffer = io.BytesIO()
+    sf.write(buffer, pcm, sample_rate, format=major, subtype=subtype, compression_level=compression_level)
+    yield buffer.getvalue()
@@ -0,0 +1,205 @@
+#!/usr/bin/env python3
+"""
+Inferencia Spanish-F5 a partir de un condicionamiento de referencia ya preparado
+
+Reproduce lo que hacen F5TTS.infer / infer_process, pero sin volver a leer,
+remuestrear ni tokenizar la referencia en cada llamada.
+"""
+
+import copy
+import logging
+import numpy as np
+
+import spanish_text
+
+logger = logging.getLogger(__name__)
+
+
+def supports_conditioning(model):
+    """Indica si el modelo expone lo necesario para inferir sin ref_file"""
+    return hasattr(model, 'ema_model') and hasattr(model, 'vocoder')
+
+
+def cross_fade(waves, sample_rate, cross_fade_duration=0.15):
+    """Unir fragmentos con un fundido lineal, como infer_batch_process
+
+    Overlap-add: primero se calculan las posiciones de cada fragmento y luego
+    se escriben todos en un único array. Coste lineal en la duración total, sin
+    volver a concatenar el audio acumulado en cada costura.
+    """
+    if not waves:
+        return np.zeros(0, dtype=np.float32)
+    if len(waves) == 1:
+        return waves[0]
+
+    fade = int(cross_fade_duration * sample_rate)
+    offsets, overlaps, length = [], [], 0
+    for wave in waves:
+        # Como el original: el fundido no puede ser más largo que lo ya unido ni que el fragmento
+        overlap = max(0, min(fade, length, len(wave)))
+        offsets.append(length - overlap)
+        overlaps.append(overlap)
+        length += len(wave) - overlap
+
+    # Rampas en el tipo del audio: sin promocionar todo el resultado a float64
+    final_wave = np.empty(length, dtype=np.result_type(*waves))
+    ramps = {}
+    for wave, offset, overlap in zip(waves, offsets, overlaps):
+        if overlap:
+            fade_in = ramps.get(overlap)
+            if fade_in is None:
+                fade_in = ramps[overlap] = np.linspace(0, 1, overlap, dtype=final_wave.dtype)
+            seam = final_wave[offset:offset + overlap]
+            seam *= fade_in[::-1]
+            seam += wave[:overlap] * fade_in
+        final_wave[offset + overlap:offset + len(wave)] = wave[overlap:]
+
+    return final_wave
+
+
+_solver_views = {}
+
+
+def _with_solver(cfm, ode_method):
+    """El CFM con otro método ODE, sin tocar el objeto que comparten los ejecutores
+
+    La copia es superficial: comparte parámetros y buffers con el original.
+    """
+    odeint_kwargs = getattr(cfm, 'odeint_kwargs', None)
+    if not ode_method or odeint_kwargs is None or odeint_kwargs.get('method') == ode_method:
+        return cfm
+    key = (id(cfm), ode_method)
+    view = _solver_views.get(key)
+    if view is None:
+        view = copy.copy(cfm)
+        view.odeint_kwargs = dict(odeint_kwargs, method=ode_method)
+        _solver_views[key] = view
+    return view
+
+
+def _sample_batch(model, conditioning, gen_texts, speeds, nfe_step, cfg_strength, sway_sampling_coef,
+                  ode_method=None):
+    """Generar varios fragmentos de texto como un único lote relleno"""
+    import torch
+    from f5_tts.infer.utils_infer import convert_char_to_pinyin, target_rms, hop_length
+
+    ref_audio_len = conditioning.ref_audio_len
+    ref_text_len = len(conditioning.ref_text.encode('utf-8'))
+
+    text = [conditioning.ref_tokens + tokens for tokens in convert_char_to_pinyin(list(gen_texts))]
+
+    # Duración total de cada elemento (referencia + generado), como la ajusta CFM.sample
+    durations = [
+        max(ref_audio_len + int(ref_audio_len / ref_text_len * len(gen_text.encode('utf-8')) / speed),
+            max(len(tokens), ref_audio_len) + 1)
+        for gen_text, speed, tokens in zip(gen_texts, speeds, text)
+    ]
+
+    batch_size = len(gen_texts)
+    cond = conditioning.audio.expand(batch_size, -1)
+
+    with torch.inference_mode():
+        generated, _ = _with_solver(model.ema_model, ode_method).sample(
+            cond=cond,
+            text=text,
+            duration=torch.tensor(durations, dtype=torch.long, device=cond.device),
+            steps=nfe_step,
+            cfg_strength=cfg_strength,
+            sway_sampling_coef=sway_sampling_coef,
+        )
+
+        generated = generated.to(torch.float32)[:, ref_audio_len:, :]
+
+        # El relleno de cada elemento se iguala al silencio para que no afecte al vocoder
+        frames = [duration - ref_audio_len for duration in durations]
+        for i, n in enumerate(frames):
+            if n < generated.shape[1]:
+                generated[i, n:, :] = generated[i, :n, :].amin()
+
+        generated_mel_spec = generated.permute(0, 2, 1)
+        if getattr(model, 'mel_spec_type', 'vocos') == 'bigvgan':
+            generated_wave = model.vocoder(generated_mel_spec)
+        else:
+            generated_wave = model.vocoder.decode(generated_mel_spec)
+
+        if conditioning.rms < target_rms:
+            generated_wave = generated_wave * conditioning.rms / target_rms
+
+        generated_wave = generated_wave.cpu().numpy()
+        return [generated_wave[i, :n * hop_length] for i, n in enumerate(frames)]
+
+
+def infer_batch(model, conditioning, gen_texts, speeds, max_batch_size=8, nfe_step=32,
+                cfg_strength=2.0, sway_sampling_coef=-1.0, cross_fade_duration=0.15, is_cancelled=None,
+                ode_method=None):
+    """Sintetizar varios textos con la misma referencia en lotes rellenos
+
+    `is_cancelled(index)` se consulta entre lotes de fragmentos: los textos
+    cancelados dejan de generarse y su resultado es None. `ode_method`
+    sustituye al método con el que se construyó el modelo (None = el suyo).
+    """
+    # Cada texto se parte en frases/cláusulas de longitud equilibrada (hacia
+    # SEGMENT_TARGET_SECONDS de audio, nunca más que max_chars); todas van al mismo lote
+    chunks = []
+    for index, (gen_text, speed) in enumerate(zip(gen_texts, speeds)):
+        target = spanish_text.target_chars(conditioning.chars_per_second, speed)
+        for position, chunk in enumerate(spanish_text.segment(gen_text, conditioning.max_chars, target)):
+            chunks.append((index, position, chunk, speed))
+
+    # Ordenar por longitud reduce el relleno dentro de cada lote
+    chunks.sort(key=lambda c: len(c[2].encode('utf-8')) / c[3])
+
+    cancelled = set()
+    waves_by_text = [[] for _ in gen_texts]
+    while chunks:
+        if is_cancelled is not None:
+            cancelled.update(i for i in range(len(gen_texts)) if i not in cancelled and is_cancelled(i))
+            chunks = [c for c in chunks if c[0] not in cancelled]
+            if not chunks:
+                break
+
+        group, chunks = chunks[:max_batch_size], chunks[max_batch_size:]
+        waves = _sample_batch(
+            model,
+            conditioning,
+            [c[2] for c in group],
+            [c[3] for c in group],
+            nfe_step,
+            cfg_strength,
+            sway_sampling_coef,
+            ode_method
+        )
+        for (index, position, _, _), wave in zip(group, waves):
+            waves_by_text[index].append((position, wave))
+
+    # Recomponer cada texto en su orden original de fragmentos
+    results = []
+    for index, waves in enumerate(waves_by_text):
+        if index in cancelled:
+            results.append(None)
+            continue
+        if not waves:
+            # Texto sin nada que pronunciar (vacío tras normalizar): audio vacío
+            results.append(np.zeros(0, dtype=np.float32))
+            continue
+        ordered = [wave for _, wave in sorted(waves, key=lambda pw: pw[0])]
+        results.append(cross_fade(ordered, conditioning.sample_rate, cross_fade_duration))
+
+    return results
+
+
+def infer_with_conditioning(model, conditioning, gen_text, speed=1.0, nfe_step=32,
+                            cfg_strength=2.0, sway_sampling_coef=-1.0, cross_fade_duration=0.15, ode_method=None):
+    """Sintetizar gen_text usando un condicionamiento cacheado"""
+    wav = infer_batch(
+        model,
+        conditioning,
+        [gen_text],
+        [speed],
+        nfe_step=nfe_step,
+        cfg_strength=cfg_strength,
+        sway_sampling_coef=sway_sampling_coef,
+        cross_fade_duration=cross_fade_duration,
+        ode_method=ode_method
+    )[0]
+    return wav, conditioning.sample_rate
@@ -0,0 +1,180 @@
+#!/usr/bin/env python3
+"""
+Síntesis de textos largos (artículos, capítulos) por segmentos concurrentes
+
+El texto se parte en segmentos de frases completas del tamaño de un fragmento
+del modelo. Cada segmento es una síntesis independiente: el planificador los
+agrupa en micro-lotes y los reparte entre ejecutores o procesos, en lugar de
+generar todo el texto en un único trabajo secuencial. Se mantiene una ventana
+de segmentos en curso para no desbordar la cola acotada.
+
+Los segmentos se piden sin cadena de claridad; se unen con un fundido
+(overlap-add) y la claridad, con su normalización de nivel, se aplica una sola
+vez sobre el resultado completo: sin saltos de volumen entre segmentos.
+"""
+
+import os
+import logging
+import threading
+from concurrent.futures import Future
+
+from scheduler import QueueFullError
+
+logger = logging.getLogger(__name__)
+
+# Textos (normalizados) de más bytes que esto se sintetizan por segmentos
+LONG_FORM_MIN_CHARS = int(os.getenv('LONG_FORM_MIN_CHARS', 600))
+LONG_FORM_MAX_IN_FLIGHT = int(os.getenv('LONG_FORM_MAX_IN_FLIGHT', 16))
+
+
+class LongFormRender:
+    """Segmentos de un texto largo en vuelo y su unión cuando terminan todos
+
+    `submit(text, priority, deadline)` encola un segmento y devuelve un
+    Future con (audio, sample_rate); `finish(waves, sample_rate)` une los
+    audios en orden y devuelve el resultado del Future de la síntesis
+    completa. Cancelar ese Future cancela los segmentos pendientes;
+    `future.promote(priority, deadline)` mejora los requisitos de los
+    segmentos en curso y de los que faltan por encolar.
+    """
+
+    def __init__(self, segments, submit, finish, priority='normal', deadline=None,
+                 max_in_flight=LONG_FORM_MAX_IN_FLIGHT):
+        self.segments = segments
+        self.submit = submit
+        self.finish = finish
+        self.priority = priority
+        self.deadline = deadline
+        self.max_in_flight = max(1, max_in_flight)
+        self.future = Future()
+        self._waves = [None] * len(segments)
+        self._sample_rate = None
+        self._remaining = len(segments)
+        self._next = 0
+        self._in_flight = set()
+        self._retry = None
+        self._filling = False    # Un hilo está encolando segmentos
+        self._refill = False     # Terminó algún segmento mientras tanto: otra vuelta
+        self._lock = threading.Lock()
+        self.future.add_done_callback(self._abandon)
+        self.future.promote = self.promote
+
+    def start(self):
+        """Encolar la primera ventana; QueueFullError si no cabe ni un segmento"""
+        self._fill(initial=True)
+        return self.future
+
+    def _fill(self, initial=False):
+        """Encolar segmentos hasta llenar la ventana
+
+        Iterativo: un segmento que ya estaba terminado (caché, catálogo)
+        llama a su callback dentro de add_done_callback, y ese callback
+        vuelve aquí. En lugar de recurrir (un nivel de pila por segmento en
+        caché) se marca otra vuelta para el hilo que ya está encolando.
+        """
+        with self._lock:
+            if self._filling:
+                self._refill = True
+                return
+            self._filling = True
+        try:
+            while True:
+                self._fill_window(initial)
+                initial = False
+                with self._lock:
+                    if not self._refill:
+                        self._filling = False
+                        return
+                    self._refill = False
+        except BaseException:
+            with self._lock:
+                self._filling = self._refill = False
+            raise
+
+    def _fill_window(self, initial=False):
+        submitted, error = [], None
+        with self._lock:
+            self._retry = None
+            while (self._next < len(self.segments) and len(self._in_flight) < self.max_in_flight
+                   and not self.future.done()):
+                index = self._next
+                try:
+                    segment_future = self.submit(self.segments[index], self.priority, self.deadline)
+                except QueueFullError as e:
+                    if initial and index == 0:
+                        raise
+                    # Se reintenta al terminar un segmento propio o, si no hay ninguno, en breve
+                    if not self._in_flight:
+                        self._retry = threading.Timer(min(e.retry_after, 1), self._fill)
+                        self._retry.daemon = True
+                        self._retry.start()
+                    break
+                except Exception as e:
+                    error = e
+                    break
+                self._next += 1
+                self._in_flight.add(segment_future)
+                submitted.append((index, segment_future))
+
+        # Fuera del lock: fallar cancela los demás y los segmentos ya en caché completan en el acto
+        if error is not None:
+            self._fail(error)
+        for index, segment_future in submitted:
+            segment_future.add_done_callback(lambda done, index=index: self._on_segment(index, done))
+
+    def promote(self, priority, deadline):
+        """Nuevos prioridad y plazo (otra petición se adjuntó a este texto)"""
+        with self._lock:
+            self.priority, self.deadline = priority, deadline
+            in_flight = list(self._in_flight)
+        for segment_future in in_flight:
+            promote = getattr(segment_future, 'promote', None)
+            if promote is not None:
+                promote(priority, deadline)
+
+    def _on_segment(self, index, done):
+        with self._lock:
+            self._in_flight.discard(done)
+        if self.future.done():
+            return
+        try:
+            wave, sample_rate = done.result()
+        except Exception as e:
+            self._fail(e)
+            return
+
+        with self._lock:
+            self._waves[index] = wave
+            self._sample_rate = sample_rate
+            self._remaining -= 1
+            complete = self._remaining == 0
+        if not complete:
+            self._fill()
+            return
+
+        try:
+            result = self.finish(self._waves, self._sample_rate)
+            if not self.future.cancelled():
+                self.future.set_result(result)
+        except Exception as e:
+            self._fail(e)
+        finally:
+            self._waves = []
+
+    def _fail(self, error):
+        if not self.future.done():
+            try:
+                self.future.set_exception(error)
+            except Exception:
+                pass
+
+    def _abandon(self, done):
+        """Síntesis completa cancelada o fallida: los segmentos pendientes sobran"""
+        if done.cancelled() or done.exception() is not None:
+            with self._lock:
+                pending = list(self._in_flight)
+                self._next = len(self.segments)
+                if self._retry is not None:
+                    self._retry.cancel()
+            for segment_future in pending:
+                segment_future.cancel()
@@ -0,0 +1,360 @@
+#!/usr/bin/env python3
+"""
+Gobernador de memoria para la inferencia y los buffers de audio
+
+Cada trabajo tiene un pico de memoria estimado a partir del texto y de la
+referencia: activaciones del DiT por fragmento (lineales y cuadráticas en
+frames de mel, por la atención, con CFG doblando el lote) más los buffers
+del audio de salida (fragmentos float32, unión, claridad y PCM16).
+
+- Al encolar, una petición que no cabría nunca en el presupuesto (ni un
+  fragmento, o solo el audio de salida) se rechaza con MemoryBudgetError.
+- Antes de ejecutar un micro-lote se reserva su estimación; si no cabe, el
+  lote se parte en grupos y se reduce cuántos fragmentos van a la vez al
+  modelo. El ejecutor espera a que haya presupuesto libre antes de empezar.
+- Tras los trabajos grandes se devuelve memoria: gc, caché de CUDA y
+  malloc_trim del heap de glibc.
+
+El pico real de cada lote (CUDA: max_memory_allocated; CPU: VmHWM del
+proceso) se compara con la estimación. La relación se publica y, si la
+estimación se queda corta, la corrige al alza.
+
+Con workers (pool o CLI) la inferencia ocurre en otros procesos: ni el
+presupuesto ni el pico medido de este proceso los cubren, así que el
+gobernador se desactiva (configure(enabled=False)).
+"""
+
+import os
+import gc
+import math
+import time
+import ctypes
+import logging
+import threading
+from contextlib import contextmanager
+from functools import lru_cache
+
+import soundfile as sf
+
+import metrics
+from quality import ESTIMATED_CHARS_PER_SECOND
+from spanish_text import SEGMENT_TARGET_SECONDS
+
+logger = logging.getLogger(__name__)
+
+# 0 = automático: una fracción de la memoria libre (GPU o RAM) tras cargar el modelo
+MEMORY_BUDGET_MB = int(os.getenv('MEMORY_BUDGET_MB', 0))
+MEMORY_BUDGET_FRACTION = float(os.getenv('MEMORY_BUDGET_FRACTION', 0.7))
+# Coeficientes del pico por fragmento: bytes por frame y por frame² (atención)
+MEMORY_BYTES_PER_FRAME = int(os.getenv('MEMORY_BYTES_PER_FRAME', 64 * 1024))
+MEMORY_BYTES_PER_FRAME_SQ = int(os.getenv('MEMORY_BYTES_PER_FRAME_SQ', 128))
+# Bytes por muestra de salida: fragmentos float32, unión, claridad y PCM16
+MEMORY_BYTES_PER_SAMPLE = int(os.getenv('MEMORY_BYTES_PER_SAMPLE', 18))
+# Estimación a partir de la que, al terminar, se devuelve memoria al sistema
+MEMORY_RELEASE_MB = int(os.getenv('MEMORY_RELEASE_MB', 256))
+
+SAMPLE_RATE = 24000
+HOP_LENGTH = 256
+# Duración máxima (referencia + generado) de un fragmento de F5-TTS
+MAX_CHUNK_SECONDS = 25
+
+
+class MemoryBudgetError(Exception):
+    """La petición no cabe en el presupuesto de memoria ni partida"""
+
+
+@lru_cache(maxsize=256)
+def _reference_seconds(path, mtime_ns):
+    return sf.info(path).duration
+
+
+def reference_seconds(path):
+    """Duración del audio de referencia (cacheada mientras el archivo no cambie)"""
+    try:
+        return _reference_seconds(path, os.stat(path).st_mtime_ns)
+    except (OSError, RuntimeError):
+        return 10.0
+
+
+class MemoryEstimate:
+    """Pico estimado de un trabajo: activaciones por fragmento y buffers de salida"""
+
+    def __init__(self, chunks, frames, chunk_bytes, output_bytes):
+        self.chunks = chunks              # Fragmentos en que se parte el texto
+        self.frames = frames              # Frames de mel del fragmento más largo
+        self.chunk_bytes = chunk_bytes    # Activaciones de un fragmento en el modelo
+        self.output_bytes = output_bytes  # Buffers del audio de salida
+
+    def total(self, chunk_batch):
+        """Pico con `chunk_batch` fragmentos a la vez en el modelo"""
+        return min(self.chunks, chunk_batch) * self.chunk_bytes + self.output_bytes
+
+
+def _cgroup_memory_limit():
+    for path in ('/sys/fs/cgroup/memory.max', '/sys/fs/cgroup/memory/memory.limit_in_bytes'):
+        try:
+            with open(path) as f:
+                value = f.read().strip()
+            if value != 'max' and int(value) < 1 << 60:
+                return int(value)
+        except (OSError, ValueError):
+            continue
+    return None
+
+
+def _available_ram():
+    """Memoria que este proceso aún puede usar: MemAvailable, acotada por el cgroup"""
+    available = None
+    try:
+        with open('/proc/meminfo') as f:
+            for line in f:
+                if line.startswith('MemAvailable:'):
+                    available = int(line.split()[1]) * 1024
+                    break
+    except (OSError, ValueError):
+        pass
+    limit = _cgroup_memory_limit()
+    if limit is not None:
+        headroom = max(0, limit - metrics.process_rss())
+        available = headroom if available is None else min(available, headroom)
+    return available
+
+
+def _peak_rss():
+    """VmHWM: pico de RSS desde el último reinicio del contador"""
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) * 1024
+    except (OSError, ValueError):
+        pass
+    return None
+
+
+def _reset_peak_rss():
+    """Reiniciar VmHWM al RSS actual (Linux); False si no se puede"""
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+        return True
+    except OSError:
+        return False
+
+
+class MemoryGovernor:
+    """Presupuesto de memoria compartido por los ejecutores del modelo"""
+
+    def __init__(self, budget_bytes=None, bytes_per_frame=MEMORY_BYTES_PER_FRAME,
+                 bytes_per_frame_sq=MEMORY_BYTES_PER_FRAME_SQ, bytes_per_sample=MEMORY_BYTES_PER_SAMPLE,
+                 release_bytes=MEMORY_RELEASE_MB * 1024 * 1024):
+        self.budget = budget_bytes        # None = sin límite (hasta configure)
+        self.bytes_per_frame = bytes_per_frame
+        self.bytes_per_frame_sq = bytes_per_frame_sq
+        self.bytes_per_sample = bytes_per_sample
+        self.release_bytes = release_bytes
+        self.device = 'cpu'
+        self.enabled = True
+        self.reserved = 0
+        self.calibration = 1.0            # Solo corrige al alza: actual / estimado
+        self.ratio = None                 # Media móvil de actual / estimado
+        self.last = None                  # (estimado, actual) del último lote medido
+        self.waits = 0
+        self.splits = 0
+        self.rejected = 0
+        self.releases = 0
+        self._active = 0
+        self._condition = threading.Condition()
+        self._trim = self._load_malloc_trim()
+
+    @staticmethod
+    def _load_malloc_trim():
+        try:
+            return ctypes.CDLL('libc.so.6').malloc_trim
+        except (OSError, AttributeError):
+            return None
+
+    def configure(self, device, enabled=True):
+        """Fijar el presupuesto con el modelo ya cargado (MEMORY_BUDGET_MB o automático)
+
+        Con enabled=False (inferencia en otros procesos) no hay presupuesto,
+        no se reserva ni se mide nada.
+        """
+        self.device = str(device or 'cpu')
+        if not enabled:
+            with self._condition:
+                self.enabled = False
+                self.budget = None
+                self._condition.notify_all()
+            logger.info("🧠 Gobernador de memoria desactivado: la inferencia corre en procesos aparte")
+            return
+        if MEMORY_BUDGET_MB > 0:
+            budget = MEMORY_BUDGET_MB * 1024 * 1024
+        elif self.device.startswith('cuda'):
+            import torch
+            free, _ = torch.cuda.mem_get_info()
+            budget = int(free * MEMORY_BUDGET_FRACTION)
+        else:
+            available = _available_ram()
+            budget = int(available * MEMORY_BUDGET_FRACTION) if available else None
+        with self._condition:
+            self.budget = budget
+            self._condition.notify_all()
+        if budget:
+            logger.info(f"🧠 Presupuesto de memoria para inferencia: {budget / 1e6:.0f} MB ({self.device})")
+
+    def estimate(self, text, speed, ref_seconds):
+        """Pico estimado de sintetizar `text` con una referencia de `ref_seconds`"""
+        gen_seconds = len(text.encode('utf-8')) / ESTIMATED_CHARS_PER_SECOND / max(speed, 0.1)
+        chunk_seconds = max(1.0, min(SEGMENT_TARGET_SECONDS, MAX_CHUNK_SECONDS - ref_seconds))
+        chunks = max(1, math.ceil(gen_seconds / chunk_seconds))
+        frames = int((ref_seconds + min(gen_seconds, chunk_seconds)) * SAMPLE_RATE / HOP_LENGTH)
+        chunk_bytes = (self.bytes_per_frame * frames + self.bytes_per_frame_sq * frames ** 2) * self.calibration
+        output_bytes = gen_seconds * SAMPLE_RATE * self.bytes_per_sample
+        return MemoryEstimate(chunks, frames, int(chunk_bytes), int(output_bytes))
+
+    def check(self, estimate):
+        """Rechazar lo que no cabría nunca: ni un fragmento a la vez ni su audio de salida"""
+        if self.budget is None or estimate.total(1) <= self.budget:
+            return
+        with self._condition:
+            self.rejected += 1
+        metrics.MEMORY_ADMISSION.labels('rejected').inc()
+        raise MemoryBudgetError(
+            f"La petición necesitaría ~{estimate.total(1) / 1e6:.0f} MB "
+            f"(presupuesto {self.budget / 1e6:.0f} MB): acortar el texto"
+        )
+
+    def plan(self, estimates, max_chunk_batch):
+        """Partir un micro-lote para que cada parte quepa en el presupuesto
+
+        Devuelve [(índices, fragmentos a la vez, bytes estimados)]. Sin
+        presupuesto, o si cabe, es una sola parte con `max_chunk_batch`.
+        """
+        def group_total(indices, chunk_batch):
+            # El lote relleno ocupa lo que su fragmento más largo
+            chunk_bytes = max(estimates[i].chunk_bytes for i in indices)
+            chunks = sum(estimates[i].chunks for i in indices)
+            output = sum(estimates[i].output_bytes for i in indices)
+            return min(chunks, chunk_batch) * chunk_bytes + output, chunk_bytes, output
+
+        everything = list(range(len(estimates)))
+        total, _, _ = group_total(everything, max_chunk_batch)
+        if self.budget is None or total <= self.budget:
+            return [(everything, max_chunk_batch, total)]
+
+        groups, current = [], []
+        for index in everything:
+            if current and group_total(current + [index], 1)[0] > self.budget:
+                groups.append(current)
+                current = []
+            current.append(index)
+        groups.append(current)
+
+        plan = []
+        for indices in groups:
+            _, chunk_bytes, output = group_total(indices, 1)
+            chunk_batch = int(max(1, min(max_chunk_batch, (self.budget - output) // max(chunk_bytes, 1))))
+            plan.append((indices, chunk_batch, group_total(indices, chunk_batch)[0]))
+
+        with self._condition:
+            self.splits += 1
+        metrics.MEMORY_ADMISSION.labels('split').inc()
+        logger.info(f"🧠 Lote partido por memoria: {len(estimates)} trabajos en {len(plan)} partes, "
+                    f"fragmentos a la vez {[p[1] for p in plan]}")
+        return plan
+
+    @contextmanager
+    def reserve(self, estimated):
+        """Esperar a que `estimated` bytes quepan en el presupuesto y ejecutar
+
+        Si no hay nada más reservado se admite siempre (un trabajo más grande
+        que el presupuesto ya se partió o rechazó antes): nunca se bloquea.
+        """
+        if not self.enabled:
+            yield
+            return
+        waited = False
+        with self._condition:
+            while self.budget is not None and self.reserved and self.reserved + estimated > self.budget:
+                if not waited:
+                    waited = True
+                    self.waits += 1
+                    metrics.MEMORY_ADMISSION.labels('waited').inc()
+                self._condition.wait()
+            self.reserved += estimated
+            self._active += 1
+            # Medir el pico solo si este lote es el único en curso
+            measure = self._active == 1 and self._start_measure()
+        started = time.time()
+        try:
+            yield
+        finally:
+            actual = self._finish_measure() if measure else None
+            with self._condition:
+                self.reserved -= estimated
+                self._active -= 1
+                self._condition.notify_all()
+            if actual is not None:
+                self._observe(estimated, actual)
+            if estimated >= self.release_bytes:
+                self.release()
+            logger.debug(f"🧠 Lote de ~{estimated / 1e6:.0f} MB en {time.time() - started:.2f}s")
+
+    def _start_measure(self):
+        if self.device.startswith('cuda'):
+            import torch
+            torch.cuda.reset_peak_memory_stats()
+            self._baseline = torch.cuda.memory_allocated()
+            return True
+        if not _reset_peak_rss():
+            return False
+        self._baseline = metrics.process_rss()
+        return True
+
+    def _finish_measure(self):
+        if self.device.startswith('cuda'):
+            import torch
+            return max(0, torch.cuda.max_memory_allocated() - self._baseline)
+        peak = _peak_rss()
+        return max(0, peak - self._baseline) if peak is not None else None
+
+    def _observe(self, estimated, actual):
+        if estimated <= 0:
+            return
+        ratio = actual / estimated
+        metrics.MEMORY_ESTIMATE_RATIO.observe(ratio)
+        with self._condition:
+            self.last = (estimated, actual)
+            self.ratio = ratio if self.ratio is None else 0.8 * self.ratio + 0.2 * ratio
+            # La estimación solo se corrige al alza: quedarse corto es lo que acaba en OOM
+            if ratio > 1:
+                self.calibration = min(4.0, 0.8 * self.calibration + 0.2 * self.calibration * ratio)
+
+    def release(self):
+        """Devolver memoria tras un trabajo grande: objetos, caché de CUDA y heap de glibc"""
+        gc.collect()
+        if self.device.startswith('cuda'):
+            import torch
+            torch.cuda.empty_cache()
+        if self._trim is not None:
+            self._trim(0)
+        with self._condition:
+            self.releases += 1
+
+    def stats(self):
+        with self._condition:
+            return {
+                'enabled': self.enabled,
+                'budget': self.budget,
+                'reserved': self.reserved,
+                'rss': metrics.process_rss(),
+                'estimate_ratio': self.ratio,
+                'calibration': self.calibration,
+                'last_estimated': self.last[0] if self.last else None,
+                'last_actual': self.last[1] if self.last else None,
+                'waits': self.waits,
+                'splits': self.splits,
+                'rejected': self.rejected,
+                'releases': self.releases
+            }
@@ -0,0 +1,168 @@
+#!/usr/bin/env python3
+"""
+Métricas Prometheus del servicio Spanish-F5
+
+Histogramas por etapa de cada síntesis (espera en cola, carga de referencia,
+inferencia, claridad, codificación WAV, debug), contadores de peticiones y
+errores, factor de tiempo real por endpoint/voz/backend, gauges de trabajo
+en curso y memoria, niveles de calidad elegidos, síntesis agrupadas,
+presupuesto de memoria y duración de las fases del arranque. Las cachés y el
+planificador ya llevan sus propios contadores: se leen al hacer el scrape en
+lugar de duplicarlos.
+"""
+
+import os
+import time
+import resource
+
+from prometheus_client import Counter, Gauge, Histogram, REGISTRY, generate_latest, CONTENT_TYPE_LATEST
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily
+
+STAGE_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+RTF_BUCKETS = (0.05, 0.1, 0.2, 0.3, 0.5, 0.75, 1, 1.5, 2, 3, 5, 10)
+
+STAGE_SECONDS = Histogram(
+    'f5_stage_seconds',
+    'Duración de cada etapa de una síntesis',
+    ['stage'],
+    buckets=STAGE_BUCKETS
+)
+REQUESTS = Counter('f5_requests_total', 'Peticiones de síntesis recibidas', ['endpoint'])
+ERRORS = Counter('f5_request_errors_total', 'Peticiones de síntesis fallidas', ['endpoint', 'status'])
+IN_FLIGHT = Gauge('f5_in_flight_jobs', 'Síntesis en cola o en ejecución')
+REALTIME_FACTOR = Histogram(
+    'f5_realtime_factor',
+    'Segundos de síntesis por segundo de audio generado',
+    ['endpoint', 'voice', 'backend'],
+    buckets=RTF_BUCKETS
+)
+QUALITY_TIERS = Counter('f5_quality_tier_total', 'Síntesis por nivel de calidad', ['tier', 'mode'])
+MEMORY_ADMISSION = Counter('f5_memory_admission_total', 'Lotes que esperaron o se partieron, y peticiones rechazadas, por memoria',
+                           ['result'])
+MEMORY_ESTIMATE_RATIO = Histogram(
+    'f5_memory_estimate_ratio',
+    'Pico de memoria medido de un lote dividido por el estimado',
+    buckets=(0.1, 0.25, 0.5, 0.75, 1, 1.25, 1.5, 2, 3, 5)
+)
+COST_ESTIMATE_RATIO = Histogram(
+    'f5_cost_estimate_ratio',
+    'Cómputo medido de un lote dividido por el previsto por el modelo de coste',
+    buckets=(0.25, 0.5, 0.75, 0.9, 1, 1.1, 1.25, 1.5, 2, 4)
+)
+PROCESS_RSS = Gauge('f5_process_rss_bytes', 'Memoria residente del proceso')
+STARTUP_SECONDS = Gauge('f5_startup_phase_seconds', 'Duración de cada fase del arranque', ['phase'])
+TIME_TO_READY = Gauge('f5_time_to_ready_seconds', 'Segundos desde el arranque del proceso hasta estar listo')
+
+
+def process_rss():
+    """RSS actual desde /proc; si no existe, el máximo que da getrusage"""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+PROCESS_RSS.set_function(process_rss)
+
+
+def stage(name):
+    """Cronometrar una etapa; sirve como `with` o como decorador"""
+    return STAGE_SECONDS.labels(name).time()
+
+
+def observe_stage(name, seconds):
+    STAGE_SECONDS.labels(name).observe(seconds)
+
+
+def timed_iter(name, iterable):
+    """Cronometrar un iterador contando solo el tiempo de producir cada elemento"""
+    iterator = iter(iterable)
+    elapsed = 0.0
+    try:
+        while True:
+            started = time.perf_counter()
+            try:
+                item = next(iterator)
+            except StopIteration:
+                return
+            finally:
+                elapsed += time.perf_counter() - started
+            yield item
+    finally:
+        if hasattr(iterator, 'close'):
+            iterator.close()
+        observe_stage(name, elapsed)
+
+
+def observe_realtime_factor(endpoint, voice, backend, started, wav_data, sample_rate):
+    """Registrar el factor de tiempo real de una síntesis iniciada en `started`"""
+    audio_seconds = len(wav_data) / sample_rate if sample_rate else 0
+    if audio_seconds > 0:
+        REALTIME_FACTOR.labels(endpoint, voice, backend).observe((time.time() - started) / audio_seconds)
+
+
+class ServiceCollector:
+    """Expone en cada scrape los contadores de cachés y planificador"""
+
+    def __init__(self, audio_cache, reference_cache, scheduler, coalescing, memory):
+        self.audio_cache = audio_cache
+        self.reference_cache = reference_cache
+        self.scheduler = scheduler
+        self.coalescing = coalescing
+        self.memory = memory
+
+    def collect(self):
+        audio = self.audio_cache.stats()
+        lookups = CounterMetricFamily('f5_audio_cache_lookups', 'Búsquedas en la caché de audio', labels=['result'])
+        lookups.add_metric(['memory_hit'], audio['memory_hits'])
+        lookups.add_metric(['disk_hit'], audio['disk_hits'])
+        lookups.add_metric(['miss'], audio['misses'])
+        yield lookups
+        yield GaugeMetricFamily('f5_audio_cache_memory_bytes', 'Bytes en el nivel en memoria de la caché de audio',
+                                value=audio['memory_bytes'])
+
+        reference = self.reference_cache.stats()
+        ref_lookups = CounterMetricFamily('f5_reference_cache_lookups', 'Búsquedas en la caché de referencias',
+                                          labels=['result'])
+        ref_lookups.add_metric(['hit'], reference['hits'])
+        ref_lookups.add_metric(['miss'], reference['misses'])
+        yield ref_lookups
+
+        scheduler = self.scheduler.stats()
+        yield GaugeMetricFamily('f5_queue_depth', 'Síntesis esperando en la cola de inferencia',
+                                value=scheduler['pending'])
+        yield GaugeMetricFamily('f5_in_flight_batches', 'Lotes ejecutándose en el modelo',
+                                value=scheduler['in_flight'])
+        yield GaugeMetricFamily('f5_queue_estimated_seconds', 'Cómputo previsto de las síntesis en cola',
+                                value=scheduler['queued_seconds'])
+        yield CounterMetricFamily('f5_batches', 'Lotes ejecutados', value=scheduler['batches_run'])
+        dropped = CounterMetricFamily('f5_jobs_dropped', 'Síntesis no ejecutadas o interrumpidas', labels=['reason'])
+        dropped.add_metric(['queue_full'], scheduler['rejected'])
+        dropped.add_metric(['deadline'], scheduler['expired'])
+        dropped.add_metric(['cancelled'], scheduler['cancelled'])
+        yield dropped
+
+        coalescing = self.coalescing.stats()
+        syntheses = CounterMetricFamily('f5_singleflight_requests', 'Peticiones sin caché por resultado del single-flight',
+                                        labels=['result'])
+        syntheses.add_metric(['started'], coalescing['started'])
+        syntheses.add_metric(['coalesced'], coalescing['coalesced'])
+        syntheses.add_metric(['abandoned'], coalescing['abandoned'])
+        yield syntheses
+
+        memory = self.memory.stats()
+        if memory['budget'] is not None:
+            yield GaugeMetricFamily('f5_memory_budget_bytes', 'Presupuesto de memoria para inferencia',
+                                    value=memory['budget'])
+        yield GaugeMetricFamily('f5_memory_reserved_bytes', 'Memoria estimada de los lotes en curso',
+                                value=memory['reserved'])
+
+
+def register_service(audio_cache, reference_cache, scheduler, coalescing, memory):
+    REGISTRY.register(ServiceCollector(audio_cache, reference_cache, scheduler, coalescing, memory))
+
+
+def render():
+    """Cuerpo y tipo de contenido de la respuesta de /metrics"""
+    return generate_latest(REGISTRY), CONTENT_TYPE_LATEST
@@ -0,0 +1,229 @@
+#!/usr/bin/env python3
+"""
+Catálogo de frases frecuentes pre-renderizadas en un almacén empaquetado
+
+Saludos, "un momento, por favor", mensajes de error... se conocen de
+antemano. El servicio lee el catálogo (PHRASE_CATALOG) al arrancar y, tras el
+calentamiento, sintetiza en segundo plano cada frase con cada voz registrada.
+
+El audio (PCM16, tal como se sirve) se guarda concatenado en un único archivo
+de datos y un índice JSON con la posición de cada clave. El archivo se mapea
+en memoria: las respuestas son vistas de solo lectura sobre las páginas del
+mapa, sin inferencia ni copias, y varios procesos que mapean el mismo archivo
+comparten esas páginas en la caché del sistema operativo.
+
+Las claves son las de la caché de audio (texto normalizado, voz, velocidad,
+checkpoint, post-procesado y nivel), y el índice guarda la firma de checkpoint
+y post-procesado con la que se generó. Al reiniciar solo se sintetizan las
+frases o voces nuevas; si cambia la firma, se reconstruye entero. Cada
+reconstrucción escribe un archivo de datos nuevo y sustituye el índice de forma
+atómica: los procesos que aún mapean el anterior siguen leyendo datos válidos
+hasta que recargan el índice.
+"""
+
+import os
+import json
+import mmap
+import time
+import uuid
+import logging
+import threading
+
+import numpy as np
+
+import encoding
+
+logger = logging.getLogger(__name__)
+
+PHRASE_CATALOG = os.getenv('PHRASE_CATALOG', '')
+PHRASE_STORE_DIR = os.getenv('PHRASE_STORE_DIR', '/app/phrase_store')
+# Velocidad de las frases del catálogo que no la indican (la de por defecto de la API)
+PHRASE_CATALOG_SPEED = float(os.getenv('PHRASE_CATALOG_SPEED', 0.9))
+PHRASE_STORE_CHECK_SECONDS = float(os.getenv('PHRASE_STORE_CHECK_SECONDS', 5))
+
+INDEX_FILE = 'index.json'
+
+
+def load_catalog(path, default_speed=PHRASE_CATALOG_SPEED):
+    """Frases del catálogo: una por línea, o JSONL {text, voice, speed}
+
+    Las líneas vacías y las que empiezan por '#' se ignoran; sin `voice`, la
+    frase se renderiza con todas las voces registradas.
+    """
+    phrases = []
+    with open(path, encoding='utf-8') as f:
+        for line_number, line in enumerate(f, start=1):
+            line = line.strip()
+            if not line or line.startswith('#'):
+                continue
+            if line.startswith('{'):
+                try:
+                    item = json.loads(line)
+                except ValueError as e:
+                    logger.error(f"❌ Catálogo, línea {line_number} inválida: {e}")
+                    continue
+                if not isinstance(item, dict) or not item.get('text'):
+                    logger.error(f"❌ Catálogo, línea {line_number} sin texto, se omite")
+                    continue
+            else:
+                item = {'text': line}
+
+            try:
+                speed = float(item.get('speed', default_speed))
+            except (TypeError, ValueError):
+                logger.error(f"❌ Catálogo, línea {line_number}: velocidad inválida, se omite")
+                continue
+            phrases.append({'text': item['text'], 'voice': item.get('voice'), 'speed': speed})
+    return phrases
+
+
+class PhraseStore:
+    """Audio PCM16 de las frases del catálogo, mapeado en memoria desde un archivo empaquetado"""
+
+    def __init__(self, store_dir=PHRASE_STORE_DIR, check_interval=PHRASE_STORE_CHECK_SECONDS):
+        self.store_dir = store_dir
+        self.check_interval = check_interval
+        self.hits = 0
+        self.rebuilds = 0
+        # (firma, clave -> (posición, muestras, sample_rate), audio mapeado); se sustituye entero
+        self._state = (None, {}, None)
+        self._index_mtime = None
+        self._next_check = 0.0
+        self._lock = threading.Lock()
+
+    @property
+    def index_path(self):
+        return os.path.join(self.store_dir, INDEX_FILE)
+
+    def load(self):
+        """Mapear el almacén que haya en disco (o recargarlo si cambió)"""
+        with self._lock:
+            self._reload()
+            self._next_check = time.monotonic() + self.check_interval
+
+    def _reload(self):
+        try:
+            mtime = os.stat(self.index_path).st_mtime_ns
+        except OSError:
+            self._state, self._index_mtime = (None, {}, None), None
+            return
+        if mtime == self._index_mtime:
+            return
+
+        try:
+            with open(self.index_path, encoding='utf-8') as f:
+                index = json.load(f)
+            entries = {key: tuple(entry) for key, entry in index['entries'].items()}
+            audio = self._map(os.path.join(self.store_dir, index['data'])) if entries else None
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            # Índice a medio escribir o datos borrados: se mantiene lo anterior
+            logger.error(f"❌ Error leyendo el almacén de frases: {e}")
+            return
+
+        self._state = (index.get('signature'), entries, audio)
+        self._index_mtime = mtime
+        logger.info(f"🗂️  Almacén de frases: {len(entries)} audios mapeados")
+
+    @staticmethod
+    def _map(path):
+        """Archivo de datos como array int16 de solo lectura sobre un mmap"""
+        with open(path, 'rb') as f:
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        return np.frombuffer(mapped, dtype='<i2')
+
+    def _maybe_reload(self):
+        if time.monotonic() < self._next_check:
+            return
+        with self._lock:
+            if time.monotonic() < self._next_check:
+                return
+            self._next_check = time.monotonic() + self.check_interval
+            self._reload()
+
+    def get(self, key):
+        """(audio PCM16 de solo lectura, sample_rate) de una frase, o None"""
+        self._maybe_reload()
+        _, entries, audio = self._state
+        entry = entries.get(key)
+        if entry is None:
+            return None
+        offset, samples, sample_rate = entry
+        with self._lock:
+            self.hits += 1
+        return audio[offset:offset + samples], sample_rate
+
+    def contains(self, key):
+        """¿Está la frase en el almacén? (sin contarla como acierto)"""
+        self._maybe_reload()
+        return key in self._state[1]
+
+    def missing(self, keys, signature):
+        """Claves que hay que sintetizar: todas si el almacén es de otra firma"""
+        stored_signature, entries, _ = self._state
+        if stored_signature != signature:
+            return list(keys)
+        return [key for key in keys if key not in entries]
+
+    def write(self, signature, keys, rendered):
+        """Reescribir el almacén con `keys`: audio de `rendered` o, si no, el ya guardado
+
+        `rendered` es clave -> (audio PCM16, sample_rate). Las claves sin audio
+        (síntesis fallida) quedan fuera y se reintentan en el siguiente arranque.
+        """
+        stored_signature, entries, audio = self._state
+        reusable = entries if stored_signature == signature else {}
+
+        os.makedirs(self.store_dir, exist_ok=True)
+        data_name = f"phrases-{uuid.uuid4().hex[:12]}.pcm"
+        data_path = os.path.join(self.store_dir, data_name)
+        index = {'signature': signature, 'data': data_name, 'entries': {}}
+        offset = 0
+        with open(data_path, 'wb') as f:
+            for key in keys:
+                if key in rendered:
+                    wav_data, sample_rate = rendered[key]
+                    pcm = encoding.pcm16_array(wav_data)
+                elif key in reusable:
+                    stored_offset, samples, sample_rate = reusable[key]
+                    pcm = audio[stored_offset:stored_offset + samples]
+                else:
+                    continue
+                f.write(memoryview(pcm).cast('B'))
+                index['entries'][key] = [offset, len(pcm), sample_rate]
+                offset += len(pcm)
+
+        previous = self._data_name()
+        # Único entre réplicas que comparten el volumen (el PID suele coincidir en contenedores)
+        tmp_path = f"{self.index_path}.{uuid.uuid4().hex}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(index, f)
+        os.replace(tmp_path, self.index_path)
+
+        with self._lock:
+            self.rebuilds += 1
+            self._reload()
+        # Quien aún mapee el archivo anterior conserva sus páginas hasta recargar
+        if previous and previous != data_name:
+            try:
+                os.remove(os.path.join(self.store_dir, previous))
+            except OSError:
+                pass
+        logger.info(f"🗂️  Almacén de frases escrito: {len(index['entries'])} audios, {offset * 2 / 1e6:.1f} MB")
+
+    def _data_name(self):
+        """Archivo de datos al que apunta el índice actual en disco"""
+        try:
+            with open(self.index_path, encoding='utf-8') as f:
+                return json.load(f).get('data')
+        except (OSError, ValueError):
+            return None
+
+    def stats(self):
+        signature, entries, audio = self._state
+        return {
+            'entries': len(entries),
+            'bytes': audio.nbytes if audio is not None else 0,
+            'signature': signature,
+            'hits': self.hits,
+            'rebuilds': self.rebuilds
+        }
@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+"""
+Cadena de post-procesado de claridad para el audio de Spanish-F5
+
+Los filtros se diseñan una sola vez por frecuencia de muestreo (forma SOS) y
+todo el procesado se hace en float32 y en el sitio. Hay dos modos:
+- process(): fase cero (sosfiltfilt) sobre el audio completo, como siempre.
+- ClarityStream: causal y con estado, para procesar bloque a bloque en
+  streaming sin costuras entre bloques.
+"""
+
+import threading
+from functools import lru_cache
+
+import numpy as np
+
+HIGHPASS_HZ = 80                 # Cortar ruido por debajo de 80Hz
+PRESENCE_BAND_HZ = (1000, 4000)  # Rango de claridad vocal
+PRESENCE_GAIN = 0.15             # Realce sutil de la banda de presencia
+INPUT_PEAK = 0.9                 # Normalización suave de entrada
+SATURATION_DRIVE = 1.2           # Suavizado de picos (tanh)
+SATURATION_LEVEL = 0.8
+OUTPUT_PEAK = 0.85               # Normalización final
+
+# Suelo del pico en streaming: evita ganancias enormes en los primeros silencios
+STREAM_PEAK_FLOOR = 0.1
+
+
+def _signal():
+    """scipy.signal bajo demanda: importarlo cuesta ~1s y no hace falta para arrancar"""
+    from scipy import signal
+    return signal
+
+
+@lru_cache(maxsize=16)
+def design_filters(sample_rate):
+    """Filtros pasa-altos y de presencia en forma SOS (float32), cacheados"""
+    signal = _signal()
+    nyquist = sample_rate / 2
+    highpass = signal.butter(2, HIGHPASS_HZ / nyquist, btype='high', output='sos')
+    presence = signal.butter(2, [f / nyquist for f in PRESENCE_BAND_HZ], btype='band', output='sos')
+    return highpass.astype(np.float32), presence.astype(np.float32)
+
+
+def _peak(x):
+    """Pico absoluto sin crear un array temporal de |x|"""
+    if x.size == 0:
+        return 0.0
+    return float(max(x.max(), -x.min()))
+
+
+def _normalize_in_place(x, target):
+    peak = _peak(x)
+    if peak > 0:
+        x *= np.float32(target / peak)
+
+
+def _saturate_in_place(x):
+    x *= np.float32(SATURATION_DRIVE)
+    np.tanh(x, out=x)
+    x *= np.float32(SATURATION_LEVEL)
+
+
+def _zero_phase(sos, x):
+    """sosfiltfilt, o filtro causal si el audio es demasiado corto para el relleno"""
+    signal = _signal()
+    padlen = 3 * (2 * len(sos) + 1)
+    if x.shape[0] <= padlen:
+        return signal.sosfilt(np.vstack([sos, sos]), x)
+    return signal.sosfiltfilt(sos, x)
+
+
+def process(wav_data, sample_rate):
+    """Cadena completa de claridad sobre un audio entero (fase cero)"""
+    highpass, presence = design_filters(sample_rate)
+
+    # Única copia de trabajo: el resto de pasos se hacen sobre ella
+    x = np.array(wav_data, dtype=np.float32).reshape(-1)
+
+    _normalize_in_place(x, INPUT_PEAK)
+    x = _zero_phase(highpass, x)
+
+    band = _zero_phase(presence, x)
+    band *= np.float32(PRESENCE_GAIN)
+    x += band
+    del band
+
+    _saturate_in_place(x)
+    _normalize_in_place(x, OUTPUT_PEAK)
+    return x
+
+
+class ClarityStream:
+    """Cadena de claridad causal y con estado para procesar por bloques"""
+
+    def __init__(self, sample_rate):
+        highpass, presence = design_filters(sample_rate)
+        # Cada filtro se aplica dos veces en cascada: misma respuesta en
+        # magnitud que la pasada doble de sosfiltfilt
+        self._highpass = np.vstack([highpass, highpass])
+        self._presence = np.vstack([presence, presence])
+        self._highpass_zi = np.zeros((self._highpass.shape[0], 2), dtype=np.float32)
+        self._presence_zi = np.zeros((self._presence.shape[0], 2), dtype=np.float32)
+        self._peak = STREAM_PEAK_FLOOR
+        self._lock = threading.Lock()
+
+    def _normalize_input(self, x):
+        """Normalización por pico acumulado: la ganancia solo baja, muestra a muestra"""
+        running = np.abs(x)
+        np.maximum.accumulate(running, out=running)
+        np.maximum(running, np.float32(self._peak), out=running)
+        self._peak = float(running[-1])
+        np.divide(np.float32(INPUT_PEAK), running, out=running)
+        x *= running
+
+    def process(self, block):
+        """Procesar el siguiente bloque del flujo"""
+        x = np.array(block, dtype=np.float32).reshape(-1)
+        if x.size == 0:
+            return x
+
+        signal = _signal()
+        with self._lock:
+            self._normalize_input(x)
+            x, self._highpass_zi = signal.sosfilt(self._highpass, x, zi=self._highpass_zi)
+
+            band, self._presence_zi = signal.sosfilt(self._presence, x, zi=self._presence_zi)
+            band *= np.float32(PRESENCE_GAIN)
+            x += band
+            del band
+
+            # tanh ya acota el nivel: ganancia final fija, sin mirar bloques futuros
+            _saturate_in_place(x)
+            x *= np.float32(OUTPUT_PEAK / SATURATION_LEVEL)
+            return x
@@ -0,0 +1,184 @@
+#!/usr/bin/env python3
+"""
+Niveles de calidad/latencia del muestreo ODE de Spanish-F5
+
+Cada nivel fija los pasos del solver (NFE), el método ODE, el coeficiente de
+sway sampling y la fuerza de CFG. El coste de una síntesis es, en primera
+aproximación, proporcional a las evaluaciones del modelo: pasos x
+evaluaciones por paso del método.
+
+Una petición puede pedir un nivel concreto o 'auto'. En automático se parte
+del nivel QUALITY_AUTO_CEILING y se baja un escalón por cada umbral de cola
+superado (QUALITY_QUEUE_STEPS) y, si la petición trae plazo, hasta el mejor
+nivel que según el RTF medido de cada nivel termina a tiempo. Bajo carga es
+preferible servir algo menos de calidad que agotar plazos.
+"""
+
+import os
+import time
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+QUALITY_TIER = os.getenv('QUALITY_TIER', 'auto')
+QUALITY_AUTO_CEILING = os.getenv('QUALITY_AUTO_CEILING', 'balanced')
+# Trabajos en cola a partir de los que 'auto' baja un nivel (uno por umbral)
+QUALITY_QUEUE_STEPS = [int(step) for step in os.getenv('QUALITY_QUEUE_STEPS', '4,16').split(',') if step.strip()]
+# Bytes de texto por segundo de audio para estimar la duración antes de sintetizar
+ESTIMATED_CHARS_PER_SECOND = float(os.getenv('ESTIMATED_CHARS_PER_SECOND', 15))
+
+AUTO = 'auto'
+
+# Evaluaciones del campo vectorial por paso de cada método ODE
+SOLVER_EVALUATIONS = {'euler': 1, 'midpoint': 2, 'rk4': 4}
+
+
+class QualityTier:
+    """Parámetros de muestreo de un nivel de calidad"""
+
+    def __init__(self, name, nfe_step, ode_method='euler', sway_sampling_coef=-1.0, cfg_strength=2.0):
+        self.name = name
+        self.nfe_step = nfe_step
+        self.ode_method = ode_method
+        self.sway_sampling_coef = sway_sampling_coef
+        self.cfg_strength = cfg_strength
+
+    @property
+    def cost(self):
+        """Evaluaciones del modelo por síntesis (relativo entre niveles)"""
+        return self.nfe_step * SOLVER_EVALUATIONS.get(self.ode_method, 1)
+
+    @property
+    def signature(self):
+        """Todo lo que cambia el audio generado: entra en la clave de caché"""
+        return f"{self.ode_method}-{self.nfe_step}-sway{self.sway_sampling_coef:g}-cfg{self.cfg_strength:g}"
+
+    def params(self):
+        """Argumentos de muestreo para infer_batch / infer_with_conditioning"""
+        return {
+            'nfe_step': self.nfe_step,
+            'ode_method': self.ode_method,
+            'sway_sampling_coef': self.sway_sampling_coef,
+            'cfg_strength': self.cfg_strength
+        }
+
+    def to_dict(self):
+        return {'name': self.name, 'cost': self.cost, **self.params()}
+
+
+# De más rápido a mejor calidad; 'balanced' son los valores por defecto de F5-TTS
+TIERS = {
+    tier.name: tier for tier in (
+        QualityTier('fast', nfe_step=16),
+        QualityTier('balanced', nfe_step=32),
+        QualityTier('quality', nfe_step=32, ode_method='midpoint'),
+    )
+}
+DEFAULT_TIER = 'balanced'
+
+
+def get(name):
+    """Nivel por nombre (el de por defecto si es None)"""
+    return TIERS[name or DEFAULT_TIER]
+
+
+def with_model_solver(tier):
+    """Nivel que produce el mismo audio cuando el backend no deja elegir el método ODE
+
+    F5TTS.infer y el CLI de un solo uso integran siempre con el método del
+    modelo (euler): un nivel que solo se distingue por el método es, ahí, el
+    nivel euler con los mismos pasos, sway y CFG ('quality' -> 'balanced').
+    """
+    if tier.ode_method == 'euler':
+        return tier
+    for other in TIERS.values():
+        if other.ode_method == 'euler' and (other.nfe_step, other.sway_sampling_coef, other.cfg_strength) == (
+                tier.nfe_step, tier.sway_sampling_coef, tier.cfg_strength):
+            return other
+    return tier
+
+
+class QualitySelector:
+    """Elige el nivel de cada petición y aprende el RTF real de cada uno"""
+
+    def __init__(self, ceiling=QUALITY_AUTO_CEILING, queue_steps=QUALITY_QUEUE_STEPS,
+                 chars_per_second=ESTIMATED_CHARS_PER_SECOND):
+        names = list(TIERS)
+        self.ceiling = ceiling if ceiling in TIERS else DEFAULT_TIER
+        # Niveles candidatos en automático, del mejor al más rápido
+        self.ladder = names[:names.index(self.ceiling) + 1][::-1]
+        self.queue_steps = sorted(queue_steps)
+        self.chars_per_second = chars_per_second
+        self.stepped_down = 0
+        self._rtf = {}  # nivel -> media móvil de segundos de cómputo por segundo de audio
+        self._lock = threading.Lock()
+
+    def observe(self, name, seconds, audio_seconds):
+        """Registrar lo que tardó un lote de este nivel en generar `audio_seconds`"""
+        if audio_seconds <= 0:
+            return
+        rtf = seconds / audio_seconds
+        with self._lock:
+            previous = self._rtf.get(name)
+            self._rtf[name] = rtf if previous is None else 0.8 * previous + 0.2 * rtf
+
+    def rtf(self, name):
+        """RTF medido del nivel o, si aún no hay, escalado desde otro por coste"""
+        with self._lock:
+            if name in self._rtf:
+                return self._rtf[name]
+            for other, rtf in self._rtf.items():
+                return rtf * TIERS[name].cost / TIERS[other].cost
+        return None
+
+    def estimate_seconds(self, name, text, speed):
+        """Segundos de cómputo estimados para sintetizar `text` con el nivel"""
+        rtf = self.rtf(name)
+        if rtf is None:
+            return None
+        audio_seconds = len(text.encode('utf-8')) / self.chars_per_second / max(speed, 0.1)
+        return audio_seconds * rtf
+
+    def select(self, requested, text, speed, queue_depth=0, wait_seconds=0.0, deadline=None, estimate=None,
+               record=True):
+        """Nivel con el que sintetizar: el pedido tal cual, o el que permite la carga
+
+        `estimate(nombre)` (opcional) da los segundos de cómputo previstos con
+        un nivel; sin él se usa el RTF medido. Con record=False (previsiones
+        de /estimate) no se cuenta ni se registra la bajada de nivel.
+        """
+        if requested != AUTO:
+            return get(requested)
+
+        steps = sum(1 for threshold in self.queue_steps if queue_depth >= threshold)
+        candidates = self.ladder[min(steps, len(self.ladder) - 1):]
+
+        chosen = candidates[0]
+        if deadline is not None:
+            budget = deadline - time.time() - wait_seconds
+            # El mejor nivel que termina a tiempo; si ninguno, el más rápido
+            for name in candidates:
+                chosen = name
+                estimated = estimate(name) if estimate else self.estimate_seconds(name, text, speed)
+                if estimated is None or estimated <= budget:
+                    break
+
+        if chosen != self.ladder[0] and record:
+            with self._lock:
+                self.stepped_down += 1
+            logger.info(f"🎚️  Calidad automática: {chosen} (cola {queue_depth}, espera {wait_seconds:.1f}s)")
+        return TIERS[chosen]
+
+    def stats(self):
+        with self._lock:
+            return {
+                'default': QUALITY_TIER,
+                'ceiling': self.ceiling,
+                'queue_steps': self.queue_steps,
+                'tiers': {
+                    name: dict(tier.to_dict(), rtf=self._rtf.get(name))
+                    for name, tier in TIERS.items()
+                },
+                'stepped_down': self.stepped_down
+            }
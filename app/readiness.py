@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""
+Estado de arranque del servicio para /ready
+
+/health solo dice que el proceso responde; /ready dice si ya puede recibir
+tráfico: modelo cargado y calentado con una síntesis por voz. Cada fase del
+arranque se cronometra y se publica en /metrics, junto con el tiempo total
+desde que arrancó el proceso hasta estar listo.
+"""
+
+import os
+import time
+import logging
+import threading
+from contextlib import contextmanager
+
+import metrics
+
+logger = logging.getLogger(__name__)
+
+
+def process_start_time():
+    """Instante de arranque del proceso (incluye los imports), o ahora si no se sabe"""
+    try:
+        with open('/proc/self/stat') as f:
+            # El nombre del proceso va entre paréntesis y puede contener espacios
+            fields = f.read().rsplit(')', 1)[1].split()
+        with open('/proc/uptime') as f:
+            uptime = float(f.read().split()[0])
+        age = uptime - int(fields[19]) / os.sysconf('SC_CLK_TCK')
+        return time.time() - max(age, 0.0)
+    except (OSError, ValueError, IndexError):
+        return time.time()
+
+
+class Readiness:
+    """Fases del arranque y si el servicio está listo para recibir tráfico"""
+
+    def __init__(self):
+        self.started_at = process_start_time()
+        self.phase = 'starting'
+        self.phases = {}
+        self.ready_at = None
+        self.error = None
+        self._ready = threading.Event()
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def track(self, name):
+        """Cronometrar una fase del arranque"""
+        with self._lock:
+            self.phase = name
+        started = time.time()
+        try:
+            yield
+        finally:
+            seconds = time.time() - started
+            with self._lock:
+                self.phases[name] = seconds
+            metrics.STARTUP_SECONDS.labels(name).set(seconds)
+            logger.info(f"⏱️  Arranque: {name} en {seconds:.2f}s")
+
+    def mark_ready(self):
+        with self._lock:
+            self.phase = 'ready'
+            self.ready_at = time.time()
+            time_to_ready = self.ready_at - self.started_at
+        metrics.TIME_TO_READY.set(time_to_ready)
+        self._ready.set()
+        logger.info(f"🟢 Servicio listo en {time_to_ready:.1f}s desde el arranque del proceso")
+
+    def mark_failed(self, error):
+        with self._lock:
+            self.phase = 'failed'
+            self.error = str(error)
+
+    @property
+    def ready(self):
+        return self._ready.is_set()
+
+    def wait(self, timeout=None):
+        return self._ready.wait(timeout)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'ready': self._ready.is_set(),
+                'phase': self.phase,
+                'phases': dict(self.phases),
+                'uptime': time.time() - self.started_at,
+                'time_to_ready': self.ready_at - self.started_at if self.ready_at else None,
+                'error': self.error
+            }
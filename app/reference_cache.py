@@ -0,0 +1,161 @@
+#!/usr/bin/env python3
+"""
+Caché de condicionamiento de referencia para Spanish-F5
+
+Guarda en memoria el audio de referencia ya preprocesado (mono, RMS
+normalizado, remuestreado y en el dispositivo del modelo) junto con el
+texto de referencia tokenizado, para no repetir ese trabajo en cada petición.
+"""
+
+import os
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+REFERENCE_CACHE_MAX_BYTES = int(os.getenv('REFERENCE_CACHE_MAX_MB', 256)) * 1024 * 1024
+
+
+class ReferenceConditioning:
+    """Condicionamiento preprocesado de un archivo de referencia"""
+
+    def __init__(self, audio, ref_text, ref_tokens, rms, max_chars, source_file):
+        from f5_tts.infer.utils_infer import hop_length, target_sample_rate
+
+        self.audio = audio              # Tensor (1, muestras) ya en el dispositivo
+        self.ref_text = ref_text        # Texto de referencia preprocesado
+        self.ref_tokens = ref_tokens    # Texto de referencia tokenizado
+        self.rms = rms                  # RMS original, para deshacer la normalización
+        self.max_chars = max_chars      # Tamaño máximo de fragmento de texto a generar
+        self.source_file = source_file
+        self.sample_rate = target_sample_rate
+        self.ref_audio_len = audio.shape[-1] // hop_length  # Frames mel de la referencia
+        self.nbytes = audio.numel() * audio.element_size()
+
+    @property
+    def duration(self):
+        return self.audio.shape[-1] / self.sample_rate
+
+    @property
+    def chars_per_second(self):
+        """Ritmo de habla de la referencia (bytes de texto por segundo de audio)"""
+        return len(self.ref_text.encode('utf-8')) / self.duration
+
+
+def build_conditioning(ref_file, ref_text, device):
+    """Preprocesar la referencia igual que F5TTS.infer, pero una sola vez"""
+    import torch
+    import torchaudio
+    from f5_tts.infer.utils_infer import (
+        preprocess_ref_audio_text,
+        convert_char_to_pinyin,
+        target_sample_rate,
+        target_rms,
+    )
+
+    processed_file, processed_text = preprocess_ref_audio_text(ref_file, ref_text, show_info=logger.debug)
+
+    audio, sr = torchaudio.load(processed_file)
+    if audio.shape[0] > 1:
+        audio = torch.mean(audio, dim=0, keepdim=True)
+
+    # Tamaño de fragmento que usaría infer_process para esta referencia
+    ref_seconds = audio.shape[-1] / sr
+    max_chars = int(len(processed_text.encode('utf-8')) / ref_seconds * (25 - ref_seconds))
+
+    rms = torch.sqrt(torch.mean(torch.square(audio))).item()
+    if rms < target_rms:
+        audio = audio * target_rms / rms
+    if sr != target_sample_rate:
+        audio = torchaudio.transforms.Resample(sr, target_sample_rate)(audio)
+    audio = audio.to(device)
+
+    if len(processed_text[-1].encode('utf-8')) == 1:
+        processed_text = processed_text + " "
+    ref_tokens = convert_char_to_pinyin([processed_text])[0]
+
+    return ReferenceConditioning(audio, processed_text, ref_tokens, rms, max_chars, ref_file)
+
+
+class ReferenceCache:
+    """Caché LRU de condicionamientos, acotada por bytes"""
+
+    def __init__(self, max_bytes=REFERENCE_CACHE_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._digests = {}  # ruta -> (mtime_ns, tamaño, sha256)
+        self._lock = threading.Lock()
+        self._build_lock = threading.Lock()
+
+    def _file_digest(self, path):
+        """Hash del contenido, recalculado solo si cambia mtime o tamaño"""
+        st = os.stat(path)
+        cached = self._digests.get(path)
+        if cached and cached[0] == st.st_mtime_ns and cached[1] == st.st_size:
+            return cached[2], st.st_mtime_ns
+
+        sha = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for block in iter(lambda: f.read(1 << 20), b''):
+                sha.update(block)
+        digest = sha.hexdigest()
+        self._digests[path] = (st.st_mtime_ns, st.st_size, digest)
+        return digest, st.st_mtime_ns
+
+    def get(self, ref_file, ref_text, device):
+        """Obtener el condicionamiento de una referencia, construyéndolo si falta"""
+        digest, mtime_ns = self._file_digest(ref_file)
+        key = (digest, mtime_ns, ref_text, str(device))
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry
+
+        with self._build_lock:
+            # Otro hilo pudo construirlo mientras esperábamos
+            with self._lock:
+                entry = self._entries.get(key)
+                if entry is not None:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return entry
+
+            logger.info(f"🧩 Preprocesando referencia: {os.path.basename(ref_file)}")
+            entry = build_conditioning(ref_file, ref_text, device)
+
+            with self._lock:
+                self.misses += 1
+                self._entries[key] = entry
+                self.total_bytes += entry.nbytes
+                self._evict()
+            return entry
+
+    def _evict(self):
+        """Expulsar las entradas menos usadas hasta respetar el límite de bytes"""
+        while self.total_bytes > self.max_bytes and len(self._entries) > 1:
+            _, old = self._entries.popitem(last=False)
+            self.total_bytes -= old.nbytes
+            logger.info(f"🧹 Referencia expulsada de caché: {os.path.basename(old.source_file)}")
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.total_bytes = 0
+
+    def stats(self):
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'bytes': self.total_bytes,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses
+            }
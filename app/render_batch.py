@@ -0,0 +1,250 @@
+#!/usr/bin/env python3
+"""
+Renderizador offline y reanudable de peticiones de síntesis en JSONL
+
+Carga el modelo una vez por proceso (igual que el servicio, con
+initialize_spanish_f5) y renderiza cada línea del archivo de entrada a un
+WAV. Cada resultado se añade al manifiesto en cuanto termina: el manifiesto
+es a la vez el checkpoint, así que al relanzar un render interrumpido se
+saltan los ítems que ya tienen su WAV.
+
+Cada línea de entrada es un objeto JSON:
+    {"id": "bienvenida", "text": "Hola...", "voice": "es_female", "speed": 0.9}
+`id` es opcional (por defecto, el número de línea).
+
+Ejecución:
+    python render_batch.py prompts.jsonl --output-dir /app/renders --workers 2
+"""
+
+import os
+import re
+import sys
+import json
+import time
+import signal
+import hashlib
+import logging
+import argparse
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import soundfile as sf
+
+logger = logging.getLogger(__name__)
+
+RENDER_CHUNK_SIZE = int(os.getenv('RENDER_CHUNK_SIZE', 8))
+
+service = None  # Módulo del servicio con el modelo cargado, uno por proceso
+
+
+def load_requests(path):
+    """Leer el JSONL de entrada; las líneas inválidas se informan y se saltan"""
+    requests = []
+    seen = set()
+    with open(path, encoding='utf-8') as f:
+        for line_number, line in enumerate(f, start=1):
+            if not line.strip():
+                continue
+            try:
+                item = json.loads(line)
+                if not isinstance(item, dict) or not item.get('text'):
+                    logger.error(f"❌ Línea {line_number} sin texto, se omite")
+                    continue
+                speed = float(item.get('speed', 0.9))
+            except (ValueError, TypeError) as e:
+                logger.error(f"❌ Línea {line_number} inválida: {e}")
+                continue
+
+            item_id = str(item.get('id', line_number))
+            if item_id in seen:
+                logger.warning(f"⚠️  id repetido '{item_id}' en la línea {line_number}, se omite")
+                continue
+            seen.add(item_id)
+
+            requests.append({
+                'id': item_id,
+                'text': item['text'],
+                'voice': item.get('voice', 'es_female'),
+                'speed': speed,
+                'file': f"{safe_name(item_id)}.wav"
+            })
+    return requests
+
+
+def safe_name(item_id):
+    """Nombre de archivo seguro a partir del id
+
+    Si hay que cambiar caracteres se añade un hash corto del id original:
+    'a b', 'a/b' y 'a_b' no deben acabar en el mismo WAV.
+    """
+    name = re.sub(r'[^A-Za-z0-9_.-]+', '_', item_id).strip('.') or 'item'
+    if name != item_id:
+        name = f"{name}-{hashlib.sha1(item_id.encode('utf-8')).hexdigest()[:8]}"
+    return name
+
+
+def load_checkpoint(manifest_path, output_dir):
+    """Ids ya renderizados según el manifiesto (y cuyo WAV sigue existiendo)"""
+    done = set()
+    if not os.path.exists(manifest_path):
+        return done
+    with open(manifest_path, encoding='utf-8') as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue  # Última línea a medias si el render se cortó escribiéndola
+            if record.get('status') == 'ok' and os.path.exists(os.path.join(output_dir, record['file'])):
+                done.add(record['id'])
+    return done
+
+
+def init_worker():
+    """Cargar el modelo una vez en este proceso"""
+    global service
+    import app as service_module
+    if not service_module.initialize_spanish_f5():
+        raise RuntimeError("No se pudo inicializar Spanish-F5")
+    service = service_module
+
+
+def init_pool_worker():
+    """Inicializar un worker del pool: Ctrl+C lo gestiona el proceso principal"""
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    init_worker()
+
+
+def render_chunk(items, output_dir):
+    """Renderizar un bloque de ítems; se encolan juntos para que compartan lotes"""
+    started = {}
+    futures = {}
+    for item in items:
+        started[item['id']] = time.time()
+        try:
+            futures[item['id']] = service.submit_synthesis(
+                item['text'], item['voice'], item['speed'], priority='low', endpoint='render_batch'
+            )
+        except Exception as e:
+            futures[item['id']] = e
+
+    records = []
+    for item in items:
+        record = {key: item[key] for key in ('id', 'text', 'voice', 'speed', 'file')}
+        record['worker'] = os.getpid()
+        try:
+            future = futures[item['id']]
+            if isinstance(future, Exception):
+                raise future
+            wav_data, sample_rate = future.result()
+            seconds = time.time() - started[item['id']]
+
+            path = os.path.join(output_dir, item['file'])
+            tmp_path = f"{path}.tmp"
+            sf.write(tmp_path, wav_data, sample_rate, format='WAV')
+            os.replace(tmp_path, path)
+
+            record.update({
+                'status': 'ok',
+                'audio_duration': len(wav_data) / sample_rate,
+                'sample_rate': sample_rate,
+                'seconds': seconds
+            })
+        except Exception as e:
+            record.update({'status': 'error', 'error': str(e)})
+        record['rendered_at'] = time.time()
+        records.append(record)
+    return records
+
+
+def chunks(items, size):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def run(args):
+    os.makedirs(args.output_dir, exist_ok=True)
+    manifest_path = args.manifest or os.path.join(args.output_dir, 'manifest.jsonl')
+
+    requests = load_requests(args.input)
+    done = load_checkpoint(manifest_path, args.output_dir)
+    todo = [item for item in requests if item['id'] not in done]
+    logger.info(f"📋 {len(requests)} peticiones, {len(done)} ya renderizadas, {len(todo)} pendientes")
+    if not todo:
+        return 0
+
+    started = time.time()
+    ok = failed = 0
+    audio_seconds = 0.0
+
+    with open(manifest_path, 'a', encoding='utf-8') as manifest:
+        def checkpoint(records):
+            nonlocal ok, failed, audio_seconds
+            for record in records:
+                manifest.write(json.dumps(record, ensure_ascii=False) + '\n')
+                if record['status'] == 'ok':
+                    ok += 1
+                    audio_seconds += record['audio_duration']
+                else:
+                    failed += 1
+                    logger.error(f"❌ {record['id']}: {record['error']}")
+            manifest.flush()
+            os.fsync(manifest.fileno())
+            logger.info(f"📈 {ok + failed}/{len(todo)} renderizadas ({failed} con error)")
+
+        try:
+            if args.workers <= 1:
+                # Un solo proceso: el modelo se carga aquí mismo
+                init_worker()
+                for chunk in chunks(todo, args.chunk_size):
+                    checkpoint(render_chunk(chunk, args.output_dir))
+            else:
+                # Cada worker carga su propio modelo (memoria x workers)
+                context = multiprocessing.get_context('spawn')
+                with ProcessPoolExecutor(args.workers, mp_context=context, initializer=init_pool_worker) as pool:
+                    pending = [pool.submit(render_chunk, chunk, args.output_dir)
+                               for chunk in chunks(todo, args.chunk_size)]
+                    try:
+                        for future in as_completed(pending):
+                            checkpoint(future.result())
+                    except KeyboardInterrupt:
+                        for future in pending:
+                            future.cancel()
+                        raise
+        except KeyboardInterrupt:
+            logger.warning("⏹️  Render interrumpido: relanzar el mismo comando para continuar")
+            return 130
+
+    elapsed = time.time() - started
+    summary = {
+        'input': os.path.abspath(args.input),
+        'rendered': ok,
+        'failed': failed,
+        'skipped': len(done),
+        'audio_seconds': audio_seconds,
+        'elapsed_seconds': elapsed,
+        'realtime_factor': elapsed / audio_seconds if audio_seconds else None,
+        'workers': args.workers
+    }
+    with open(os.path.join(args.output_dir, 'summary.json'), 'w', encoding='utf-8') as f:
+        json.dump(summary, f, ensure_ascii=False, indent=2)
+
+    logger.info(f"✅ Render terminado: {ok} ok, {failed} con error, {audio_seconds:.1f}s de audio en {elapsed:.1f}s")
+    return 1 if failed else 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Renderizador offline de peticiones Spanish-F5 (JSONL)")
+    parser.add_argument('input', help="Archivo JSONL con una petición por línea")
+    parser.add_argument('--output-dir', default='/app/renders', help="Directorio de salida de los WAV")
+    parser.add_argument('--manifest', help="Manifiesto/checkpoint (por defecto <output-dir>/manifest.jsonl)")
+    parser.add_argument('--workers', type=int, default=1, help="Procesos worker (cada uno carga el modelo)")
+    parser.add_argument('--chunk-size', type=int, default=RENDER_CHUNK_SIZE,
+                        help="Peticiones que se encolan juntas en cada worker")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO)
+    return run(args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
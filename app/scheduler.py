@@ -0,0 +1,382 @@
+#!/usr/bin/env python3
+"""
+Planificador de micro-lotes para la inferencia Spanish-F5
+
+Junta las peticiones que llegan dentro de una ventana corta, las agrupa por
+voz de referencia, nivel de calidad y longitud estimada de salida, y las ejecuta como un único
+lote relleno (padding) en el modelo y el vocoder. Cada petición recibe su
+resultado a través de un Future.
+
+La cola está acotada: si se llena, submit() lanza QueueFullError con una
+estimación de cuándo volver a intentarlo, en vez de dejar crecer la latencia
+de todos. Un número fijo de ejecutores (hilos) drena la cola.
+
+Cada trabajo lleva una clase de prioridad y un plazo opcional: los lotes se
+eligen por prioridad y plazo, los trabajos vencidos se descartan antes de
+gastar cómputo en ellos y cancel() retira un trabajo de la cola o lo detiene
+entre fragmentos si ya se está ejecutando. promote() sube la prioridad o
+alarga el plazo de un trabajo ya encolado.
+
+Dentro de la misma prioridad y plazo, el lote más corto primero: cada trabajo
+trae su cómputo previsto (cost_model.py) y gana el cubo con menor coste por
+trabajo, de modo que una frase corta no espera detrás de párrafos. Para no
+dejar a los largos sin turno, cada segundo en cola descuenta SJF_AGING_RATE
+segundos de su coste. Los mismos costes dan la espera estimada y Retry-After.
+"""
+
+import os
+import math
+import time
+import bisect
+import logging
+import itertools
+import threading
+from concurrent.futures import Future
+
+logger = logging.getLogger(__name__)
+
+BATCH_WINDOW_MS = float(os.getenv('BATCH_WINDOW_MS', 15))
+MAX_BATCH_SIZE = int(os.getenv('MAX_BATCH_SIZE', 8))
+MAX_QUEUE_DEPTH = int(os.getenv('MAX_QUEUE_DEPTH', 32))
+MODEL_EXECUTORS = int(os.getenv('MODEL_EXECUTORS', 1))
+# Segundos de coste previsto que se descuentan por segundo de espera (0 = el más corto siempre)
+SJF_AGING_RATE = float(os.getenv('SJF_AGING_RATE', 0.1))
+
+# Clases de prioridad: menor valor = se atiende antes
+PRIORITIES = {'high': 0, 'normal': 1, 'low': 2}
+
+
+class QueueFullError(Exception):
+    """La cola de inferencia está llena; reintentar pasados retry_after segundos"""
+
+    def __init__(self, retry_after):
+        super().__init__(f"Cola de inferencia llena, reintentar en {retry_after}s")
+        self.retry_after = retry_after
+
+
+class DeadlineExceededError(Exception):
+    """El plazo de la petición venció antes de poder sintetizarla"""
+
+
+class JobCancelledError(Exception):
+    """La síntesis se interrumpió porque su petición fue cancelada"""
+
+
+class SynthesisJob:
+    """Petición de síntesis pendiente de ejecutar"""
+
+    _sequence = itertools.count()
+
+    def __init__(self, text, ref_audio, speed, priority='normal', deadline=None, quality=None, cost=None):
+        self.text = text
+        self.ref_audio = ref_audio
+        self.speed = speed
+        self.quality = quality    # Nivel de muestreo; todo el lote comparte el mismo
+        self.priority = PRIORITIES.get(priority, PRIORITIES['normal'])
+        self.deadline = deadline  # Instante absoluto (time.time()) o None
+        self.cost = cost          # Segundos de cómputo previstos, o None si no se conocen
+        self.future = Future()
+        self.future.job = self
+        self.enqueued_at = time.time()
+        self.cancel_requested = threading.Event()
+        self.seq = next(self._sequence)
+
+    @property
+    def sort_key(self):
+        deadline = self.deadline if self.deadline is not None else math.inf
+        return (self.priority, deadline, self.seq)
+
+    def __lt__(self, other):
+        return self.sort_key < other.sort_key
+
+    @property
+    def expired(self):
+        return self.deadline is not None and time.time() >= self.deadline
+
+    @property
+    def cancelled(self):
+        return self.cancel_requested.is_set()
+
+    def stop_reason(self):
+        """Excepción con la que abandonar el trabajo en curso, o None si debe seguir"""
+        if self.cancelled:
+            return JobCancelledError("Síntesis cancelada")
+        if self.expired:
+            return DeadlineExceededError("El plazo de la petición venció durante la síntesis")
+        return None
+
+    @property
+    def length_bucket(self):
+        """Cubo de longitud de salida (potencias de 2 de bytes de texto / velocidad)"""
+        estimated = len(self.text.encode('utf-8')) / max(self.speed, 0.1)
+        return int(math.log2(max(estimated, 1)))
+
+    @property
+    def bucket_key(self):
+        return (self.ref_audio, self.quality, self.length_bucket)
+
+
+class InferenceScheduler:
+    """Agrupa peticiones en micro-lotes y las ejecuta con `runner`"""
+
+    def __init__(self, runner, window_ms=BATCH_WINDOW_MS, max_batch_size=MAX_BATCH_SIZE,
+                 max_queue_depth=MAX_QUEUE_DEPTH, executors=MODEL_EXECUTORS, aging_rate=SJF_AGING_RATE):
+        self.runner = runner
+        self.window = window_ms / 1000.0
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_queue_depth = max(1, max_queue_depth)
+        self.executors = max(1, executors)
+        self.aging_rate = max(0.0, aging_rate)
+        self.batches_run = 0
+        self.jobs_run = 0
+        self.rejected = 0
+        self.expired = 0
+        self.cancelled = 0
+        self.in_flight = 0
+        self._job_seconds = None  # Media móvil del tiempo por trabajo (coste de los que no lo traen)
+        self._pending = 0
+        self._buckets = {}  # clave -> trabajos ordenados por (prioridad, plazo, llegada)
+        self._running = {}  # lote en ejecución -> (inicio, segundos previstos)
+        self._cond = threading.Condition()
+        self._threads = []
+
+    def configure(self, executors=None, max_batch_size=None):
+        """Ajustar ejecutores y tamaño de lote antes de recibir trabajo"""
+        with self._cond:
+            if self._threads:
+                raise RuntimeError("El planificador ya está en marcha")
+            if executors is not None:
+                self.executors = max(1, executors)
+            if max_batch_size is not None:
+                self.max_batch_size = max(1, max_batch_size)
+
+    def _ensure_started(self):
+        if not self._threads:
+            for i in range(self.executors):
+                thread = threading.Thread(target=self._loop, name=f"f5-executor-{i}", daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    def submit(self, text, ref_audio, speed, priority='normal', deadline=None, quality=None, cost=None):
+        """Encolar una síntesis y devolver su Future (o QueueFullError)
+
+        `cost` son los segundos de cómputo previstos: ordenan los lotes (el
+        más corto primero) y entran en las estimaciones de espera.
+        """
+        job = SynthesisJob(text, ref_audio, speed, priority, deadline, quality, cost)
+        with self._cond:
+            if job.expired:
+                self.expired += 1
+                raise DeadlineExceededError("El plazo de la petición ya había vencido")
+            if self._pending >= self.max_queue_depth:
+                self.rejected += 1
+                raise QueueFullError(self._retry_after())
+            self._ensure_started()
+            bisect.insort(self._buckets.setdefault(job.bucket_key, []), job)
+            self._pending += 1
+            self._cond.notify()
+        return job.future
+
+    def cancel(self, future):
+        """Cancelar un trabajo: sale de la cola o se detiene en el siguiente fragmento"""
+        job = getattr(future, 'job', None)
+        if job is None:
+            return future.cancel()
+
+        job.cancel_requested.set()
+        with self._cond:
+            jobs = self._buckets.get(job.bucket_key)
+            if jobs and job in jobs:
+                jobs.remove(job)
+                if not jobs:
+                    del self._buckets[job.bucket_key]
+                self._pending -= 1
+                self.cancelled += 1
+                return future.cancel()
+        return False
+
+    def promote(self, future, priority='normal', deadline=None):
+        """Atender un trabajo con otra prioridad y plazo (otra petición se adjuntó a él)
+
+        La prioridad solo sube; el plazo se sustituye tal cual (None = sin
+        plazo). Si sigue en cola, se recoloca en su cubo.
+        """
+        job = getattr(future, 'job', None)
+        if job is None:
+            return False
+        with self._cond:
+            jobs = self._buckets.get(job.bucket_key)
+            queued = bool(jobs) and job in jobs
+            if queued:
+                jobs.remove(job)
+            job.priority = min(job.priority, PRIORITIES.get(priority, PRIORITIES['normal']))
+            job.deadline = deadline
+            if queued:
+                bisect.insort(jobs, job)
+                self._cond.notify()
+        return True
+
+    def pending(self):
+        with self._cond:
+            return self._pending
+
+    def estimate_wait(self, priority=None, cost=None):
+        """Segundos estimados hasta que un trabajo nuevo empiece a ejecutarse
+
+        Con `priority` y `cost` (cómputo previsto del trabajo) solo cuenta lo
+        que se le adelantaría: lo de más prioridad y, en la suya, lo más corto
+        o lo que ya lleva tiempo en cola. Sin ellos, toda la cola.
+        """
+        with self._cond:
+            return self._estimate_wait(priority, cost)
+
+    def retry_after(self):
+        """Segundos (enteros) tras los que habrá sitio en la cola"""
+        with self._cond:
+            return self._retry_after()
+
+    def _cost(self, job):
+        if job.cost is not None:
+            return job.cost
+        return self._job_seconds if self._job_seconds is not None else 1.0
+
+    def _aged_cost(self, job, now):
+        return self._cost(job) - self.aging_rate * (now - job.enqueued_at)
+
+    def _estimate_wait(self, priority=None, cost=None):
+        now = time.time()
+        rank = PRIORITIES.get(priority, PRIORITIES['normal']) if priority is not None else None
+        queued = 0.0
+        for jobs in self._buckets.values():
+            for job in jobs:
+                if (rank is None or job.priority < rank
+                        or (job.priority == rank and (cost is None or self._aged_cost(job, now) <= cost))):
+                    queued += self._cost(job)
+        # Con algún ejecutor libre lo que está en curso no retrasa a nadie
+        running = 0.0
+        if len(self._running) >= self.executors:
+            running = sum(max(0.0, predicted - (now - started)) for started, predicted in self._running.values())
+        return (queued + running) / self.executors
+
+    def _retry_after(self):
+        """Segundos hasta que un ejecutor saque el siguiente lote y deje sitio en la cola"""
+        if len(self._running) < self.executors:
+            return 1
+        now = time.time()
+        remaining = min(predicted - (now - started) for started, predicted in self._running.values())
+        return max(1, math.ceil(remaining))
+
+    def _batch_cost(self, jobs, now):
+        """Coste previsto por trabajo del lote que saldría del cubo, descontada su espera"""
+        batch = jobs[:self.max_batch_size]
+        cost = sum(self._cost(job) for job in batch) / len(batch)
+        waited = now - min(job.enqueued_at for job in batch)
+        return cost - self.aging_rate * waited
+
+    def _bucket_rank(self, key, now):
+        """Prioridad y plazo de la cabeza del cubo, luego el lote más corto y la llegada"""
+        jobs = self._buckets[key]
+        priority, deadline, seq = jobs[0].sort_key
+        return (priority, deadline, self._batch_cost(jobs, now), seq)
+
+    def _next_batch(self):
+        """Esperar a que haya un lote listo y sacarlo de la cola"""
+        with self._cond:
+            # Ventana de agrupación desde la llegada del trabajo más antiguo
+            while True:
+                # Otro ejecutor puede haberse llevado los trabajos mientras esperábamos
+                while not self._buckets:
+                    self._cond.wait()
+
+                oldest = min((jobs[0] for jobs in self._buckets.values()), key=lambda job: job.enqueued_at)
+                full = any(len(jobs) >= self.max_batch_size for jobs in self._buckets.values())
+                remaining = oldest.enqueued_at + self.window - time.time()
+                if full or remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+
+            now = time.time()
+            key = min(self._buckets, key=lambda key: self._bucket_rank(key, now))
+            jobs = self._buckets[key]
+            batch, rest = jobs[:self.max_batch_size], jobs[self.max_batch_size:]
+            if rest:
+                self._buckets[key] = rest
+            else:
+                del self._buckets[key]
+            self._pending -= len(batch)
+            self.in_flight += 1
+            self._running[id(batch)] = (now, sum(self._cost(job) for job in batch))
+            return batch
+
+    def _admit(self, batch):
+        """Descartar trabajos cancelados o con el plazo vencido antes de ejecutar"""
+        admitted = []
+        for job in batch:
+            if job.cancelled:
+                job.future.cancel()
+            if not job.future.set_running_or_notify_cancel():
+                self.cancelled += 1
+                continue
+            if job.expired:
+                self.expired += 1
+                job.future.set_exception(DeadlineExceededError("El plazo de la petición venció en cola"))
+                continue
+            admitted.append(job)
+        return admitted
+
+    def _loop(self):
+        while True:
+            taken = self._next_batch()
+            batch = self._admit(taken)
+            if not batch:
+                with self._cond:
+                    self.in_flight -= 1
+                    self._running.pop(id(taken), None)
+                continue
+
+            logger.info(f"📦 Ejecutando lote de {len(batch)} síntesis")
+            started = time.time()
+            try:
+                results = self.runner(batch)
+                for job, result in zip(batch, results):
+                    if isinstance(result, Exception):
+                        job.future.set_exception(result)
+                    else:
+                        job.future.set_result(result)
+            except Exception as e:
+                logger.error(f"❌ Error en lote de síntesis: {e}")
+                for job in batch:
+                    if not job.future.done():
+                        job.future.set_exception(e)
+
+            elapsed = time.time() - started
+            with self._cond:
+                self.in_flight -= 1
+                self._running.pop(id(taken), None)
+                self.batches_run += 1
+                self.jobs_run += len(batch)
+                self.cancelled += sum(1 for job in batch if job.cancelled)
+                job_seconds = elapsed / len(batch)
+                if self._job_seconds is None:
+                    self._job_seconds = job_seconds
+                else:
+                    self._job_seconds = 0.8 * self._job_seconds + 0.2 * job_seconds
+
+    def stats(self):
+        with self._cond:
+            return {
+                'pending': self._pending,
+                'in_flight': self.in_flight,
+                'max_queue_depth': self.max_queue_depth,
+                'executors': self.executors,
+                'batches_run': self.batches_run,
+                'jobs_run': self.jobs_run,
+                'rejected': self.rejected,
+                'expired': self.expired,
+                'cancelled': self.cancelled,
+                'estimated_wait': self._estimate_wait(),
+                'queued_seconds': sum(self._cost(job) for jobs in self._buckets.values() for job in jobs),
+                'aging_rate': self.aging_rate,
+                'window_ms': self.window * 1000,
+                'max_batch_size': self.max_batch_size
+            }
@@ -0,0 +1,172 @@
+#!/usr/bin/env python3
+"""
+Agrupación de síntesis idénticas en curso (single-flight)
+
+Cuando muchos clientes piden a la vez el mismo audio (un aviso masivo, el
+prompt de bienvenida tras un despliegue), la caché todavía no lo tiene y cada
+petición lanzaría su propia inferencia. Aquí la primera petición de una clave
+lanza la síntesis y las siguientes se adjuntan a ella: una sola inferencia
+para toda la ráfaga.
+
+Cada petición recibe su propio Future. Cancelarlo (cliente desconectado,
+plazo vencido) solo suelta a ese cliente; la síntesis compartida se cancela
+cuando ya no queda nadie esperándola. El trabajo compartido se atiende con la
+mejor prioridad y el plazo más holgado de quienes lo esperan (sin plazo si
+alguno no lo tiene): adjuntarse nunca empeora lo que pidió cada cliente, y
+cada uno sigue aplicando su propio plazo a su espera.
+"""
+
+import time
+import logging
+import threading
+from concurrent.futures import Future
+
+from scheduler import PRIORITIES
+
+logger = logging.getLogger(__name__)
+
+
+def _copy_outcome(source, target):
+    """Trasladar el resultado de un Future terminado a otro (si sigue pendiente)"""
+    if target.done():
+        return
+    try:
+        if source.cancelled():
+            target.cancel()
+        elif source.exception() is not None:
+            target.set_exception(source.exception())
+        else:
+            target.set_result(source.result())
+    except Exception:
+        # El cliente canceló justo a la vez: nada que entregar
+        pass
+
+
+class _Call:
+    """Una síntesis en curso y cuántas peticiones la esperan"""
+
+    def __init__(self, priority, deadline):
+        self.shared = Future()
+        self.job = None
+        self.waiters = 0
+        self.priority = priority    # La mejor de las peticiones adjuntas
+        self.deadline = deadline    # El más tardío, o None si alguna no tiene
+
+    def join(self, priority, deadline):
+        """Incorporar los requisitos de otra petición; True si cambian los del trabajo"""
+        best = min(self.priority, priority, key=lambda name: PRIORITIES.get(name, PRIORITIES['normal']))
+        latest = None if self.deadline is None or deadline is None else max(self.deadline, deadline)
+        changed = (best, latest) != (self.priority, self.deadline)
+        self.priority, self.deadline = best, latest
+        return changed
+
+
+class SingleFlight:
+    """Una sola síntesis en curso por clave; las peticiones repetidas se adjuntan"""
+
+    def __init__(self):
+        self._calls = {}
+        self._lock = threading.Lock()
+        self.started = 0
+        self.coalesced = 0
+        self.abandoned = 0
+
+    def submit(self, key, start, priority='normal', deadline=None):
+        """Future propio de esta petición con el resultado de la síntesis de `key`
+
+        `start()` lanza la síntesis con `priority` y `deadline` y devuelve su
+        Future; solo se llama si no hay otra en curso con la misma clave. Sus
+        excepciones (cola llena...) se propagan a quien la lanzó y a los que
+        ya se habían adjuntado. Si el Future de la síntesis tiene
+        `promote(priority, deadline)`, se llama cuando una petición adjunta
+        mejora la prioridad o el plazo del trabajo.
+
+        El Future devuelto tiene a su vez `promote`: quien lo espera (un texto
+        largo, por sus segmentos) puede mejorar así sus propios requisitos.
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call(priority, deadline)
+                self.started += 1
+                changed = False
+            else:
+                self.coalesced += 1
+                changed = call.join(priority, deadline)
+            call.waiters += 1
+
+        if leader:
+            try:
+                job = start()
+            except Exception as e:
+                self._forget(key, call)
+                call.shared.set_exception(e)
+                raise
+            with self._lock:
+                call.job = job
+                # Alguien pudo adjuntarse mientras se lanzaba
+                changed = (call.priority, call.deadline) != (priority, deadline)
+            job.add_done_callback(lambda done: self._settle(key, call, done))
+        else:
+            logger.info(f"🔗 Síntesis idéntica en curso: esperando a la misma ({key[:12]})")
+        if changed:
+            self._promote(call)
+
+        waiter = Future()
+        waiter.promote = lambda priority, deadline: self._raise(call, priority, deadline)
+        call.shared.add_done_callback(lambda shared: _copy_outcome(shared, waiter))
+        waiter.add_done_callback(lambda done: self._release(key, call, done))
+        return waiter
+
+    def _raise(self, call, priority, deadline):
+        with self._lock:
+            changed = call.join(priority, deadline)
+        if changed:
+            self._promote(call)
+
+    def _promote(self, call):
+        with self._lock:
+            job, priority, deadline = call.job, call.priority, call.deadline
+        promote = getattr(job, 'promote', None)
+        if promote is not None and not job.done():
+            logger.info(f"⏫ Síntesis compartida: prioridad {priority}, "
+                        f"plazo {'ninguno' if deadline is None else f'{deadline - time.time():.1f}s'}")
+            promote(priority, deadline)
+
+    def _forget(self, key, call):
+        with self._lock:
+            if self._calls.get(key) is call:
+                del self._calls[key]
+
+    def _settle(self, key, call, done):
+        # Primero se suelta la clave: las peticiones que lleguen después ya encuentran la caché
+        self._forget(key, call)
+        _copy_outcome(done, call.shared)
+
+    def _release(self, key, call, waiter):
+        """Un cliente dejó de esperar; si era el último, la síntesis sobra"""
+        if not waiter.cancelled():
+            return
+        with self._lock:
+            call.waiters -= 1
+            last = call.waiters == 0 and not call.shared.done()
+            if last:
+                self.abandoned += 1
+                if self._calls.get(key) is call:
+                    del self._calls[key]
+        if last and call.job is not None:
+            call.job.cancel()
+
+    def in_flight(self):
+        with self._lock:
+            return len(self._calls)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'in_flight': len(self._calls),
+                'started': self.started,
+                'coalesced': self.coalesced,
+                'abandoned': self.abandoned
+            }
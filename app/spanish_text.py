@@ -0,0 +1,473 @@
+#!/usr/bin/env python3
+"""
+Front-end de texto en español para Spanish-F5
+
+normalize() expande lo que el modelo lee mal tal cual: números (cardinales,
+decimales, negativos), ordinales, fechas, horas, importes, porcentajes,
+unidades, abreviaturas y siglos en números romanos. Teléfonos, códigos
+postales y demás códigos (cifras largas sin separadores, o con cero inicial)
+se leen cifra a cifra. split() parte el texto en
+frases y, si son demasiado largas, en cláusulas; segment() agrupa esas piezas
+en segmentos de longitud equilibrada hacia un objetivo, para que los lotes
+vayan parejos y el coste de cada segmento quede acotado. Ambos resultados se
+memorizan: los prompts se repiten mucho.
+
+Las longitudes se miden en bytes UTF-8, igual que max_chars del
+condicionamiento de referencia.
+"""
+
+import os
+import re
+import math
+from functools import lru_cache
+
+TEXT_NORMALIZATION = os.getenv('TEXT_NORMALIZATION', 'true').lower() == 'true'
+TEXT_CACHE_SIZE = int(os.getenv('TEXT_CACHE_SIZE', 4096))
+# Duración objetivo de cada segmento generado
+SEGMENT_TARGET_SECONDS = float(os.getenv('SEGMENT_TARGET_SECONDS', 10))
+
+# Números mayores se leen cifra a cifra
+MAX_CARDINAL = 10 ** 15
+
+UNITS = ['cero', 'uno', 'dos', 'tres', 'cuatro', 'cinco', 'seis', 'siete', 'ocho', 'nueve',
+         'diez', 'once', 'doce', 'trece', 'catorce', 'quince', 'dieciséis', 'diecisiete',
+         'dieciocho', 'diecinueve', 'veinte', 'veintiuno', 'veintidós', 'veintitrés',
+         'veinticuatro', 'veinticinco', 'veintiséis', 'veintisiete', 'veintiocho', 'veintinueve']
+TENS = {3: 'treinta', 4: 'cuarenta', 5: 'cincuenta', 6: 'sesenta', 7: 'setenta', 8: 'ochenta', 9: 'noventa'}
+HUNDREDS = {1: 'ciento', 2: 'doscientos', 3: 'trescientos', 4: 'cuatrocientos', 5: 'quinientos',
+            6: 'seiscientos', 7: 'setecientos', 8: 'ochocientos', 9: 'novecientos'}
+
+ORDINAL_UNITS = ['', 'primero', 'segundo', 'tercero', 'cuarto', 'quinto', 'sexto', 'séptimo', 'octavo', 'noveno']
+ORDINAL_TENS = ['', 'décimo', 'vigésimo', 'trigésimo', 'cuadragésimo', 'quincuagésimo', 'sexagésimo',
+                'septuagésimo', 'octogésimo', 'nonagésimo']
+
+MONTHS = ['enero', 'febrero', 'marzo', 'abril', 'mayo', 'junio', 'julio', 'agosto', 'septiembre',
+          'octubre', 'noviembre', 'diciembre']
+
+ROMAN = {'I': 1, 'V': 5, 'X': 10, 'L': 50, 'C': 100, 'D': 500, 'M': 1000}
+
+# Moneda: (singular, plural, género, fracción singular, fracción plural)
+CURRENCIES = {
+    '€': ('euro', 'euros', 'm', 'céntimo', 'céntimos'),
+    'EUR': ('euro', 'euros', 'm', 'céntimo', 'céntimos'),
+    '$': ('dólar', 'dólares', 'm', 'centavo', 'centavos'),
+    'USD': ('dólar', 'dólares', 'm', 'centavo', 'centavos'),
+    '£': ('libra', 'libras', 'f', 'penique', 'peniques'),
+    'GBP': ('libra', 'libras', 'f', 'penique', 'peniques'),
+}
+
+# Unidades tras un número: (singular, plural, género)
+UNIT_NAMES = {
+    'km/h': ('kilómetro por hora', 'kilómetros por hora', 'm'),
+    'm²': ('metro cuadrado', 'metros cuadrados', 'm'),
+    'm2': ('metro cuadrado', 'metros cuadrados', 'm'),
+    'km²': ('kilómetro cuadrado', 'kilómetros cuadrados', 'm'),
+    'm³': ('metro cúbico', 'metros cúbicos', 'm'),
+    'km': ('kilómetro', 'kilómetros', 'm'),
+    'cm': ('centímetro', 'centímetros', 'm'),
+    'mm': ('milímetro', 'milímetros', 'm'),
+    'm': ('metro', 'metros', 'm'),
+    'kg': ('kilo', 'kilos', 'm'),
+    'mg': ('miligramo', 'miligramos', 'm'),
+    'g': ('gramo', 'gramos', 'm'),
+    'ml': ('mililitro', 'mililitros', 'm'),
+    'l': ('litro', 'litros', 'm'),
+    'h': ('hora', 'horas', 'f'),
+    'min': ('minuto', 'minutos', 'm'),
+    's': ('segundo', 'segundos', 'm'),
+    'seg': ('segundo', 'segundos', 'm'),
+    'ºC': ('grado', 'grados', 'm'),
+    '°C': ('grado', 'grados', 'm'),
+    '°': ('grado', 'grados', 'm'),
+    'GB': ('gigabyte', 'gigabytes', 'm'),
+    'MB': ('megabyte', 'megabytes', 'm'),
+    'kW': ('kilovatio', 'kilovatios', 'm'),
+    'W': ('vatio', 'vatios', 'm'),
+}
+
+ABBREVIATIONS = [
+    (r'\bEE\.\s?UU\.', 'Estados Unidos'),
+    (r'\bp\.\s?ej\.', 'por ejemplo'),
+    (r'\ba\.\s?C\.', 'antes de Cristo'),
+    (r'\bd\.\s?C\.', 'después de Cristo'),
+    (r'\bSrta\.', 'señorita'),
+    (r'\bSra\.', 'señora'),
+    (r'\bSr\.', 'señor'),
+    (r'\bSres\.', 'señores'),
+    (r'\bDra\.', 'doctora'),
+    (r'\bDr\.', 'doctor'),
+    (r'\bDña\.', 'doña'),
+    (r'\bUds\.', 'ustedes'),
+    (r'\bUd\.', 'usted'),
+    (r'\bVd\.', 'usted'),
+    (r'\betc\.', 'etcétera'),
+    (r'\bpágs\.', 'páginas'),
+    (r'\bpág\.', 'página'),
+    (r'\bnúm\.', 'número'),
+    (r'\bn\.?º', 'número'),
+    (r'\btel(?:f)?\.', 'teléfono'),
+    (r'\btlf\.', 'teléfono'),
+    (r'\baprox\.', 'aproximadamente'),
+    (r'\bavda\.', 'avenida'),
+    (r'\bav\.', 'avenida'),
+    (r'\bc/\s?', 'calle '),
+    (r'\bmáx\.', 'máximo'),
+    (r'\bmín\.', 'mínimo'),
+    (r'\bvs\.', 'versus'),
+]
+ABBREVIATION_PATTERNS = [(re.compile(pattern), expansion) for pattern, expansion in ABBREVIATIONS]
+
+NUMBER = r'\d{1,3}(?:\.\d{3})+(?:,\d+)?|\d+(?:[.,]\d+)?'
+CURRENCY_SYMBOLS = '|'.join(re.escape(symbol) for symbol in sorted(CURRENCIES, key=len, reverse=True))
+UNIT_SYMBOLS = '|'.join(re.escape(unit) for unit in sorted(UNIT_NAMES, key=len, reverse=True))
+
+DATE_RE = re.compile(r'\b(\d{1,2})[/-](\d{1,2})[/-](\d{4}|\d{2})\b')
+TIME_RE = re.compile(r'\b([01]?\d|2[0-3]):([0-5]\d)\b')
+ORDINAL_RE = re.compile(r'\b(\d{1,3})\.?((?:º|ª)(?!C)|er\b)')
+CURRENCY_BEFORE_RE = re.compile(rf'(?<![\w])({CURRENCY_SYMBOLS})\s?(-?(?:{NUMBER}))')
+CURRENCY_AFTER_RE = re.compile(rf'(-?(?:{NUMBER}))\s?({CURRENCY_SYMBOLS})(?!\w)')
+PERCENT_RE = re.compile(rf'(-?(?:{NUMBER}))\s?%')
+UNIT_RE = re.compile(rf'(?<![\w.,])(-?(?:{NUMBER}))\s?({UNIT_SYMBOLS})(?![\w²³])')
+CENTURY_RE = re.compile(r'\b([Ss]iglos?)\s+([IVXLC]+)\b')
+NUMBER_RE = re.compile(rf'(?<![\w.,])(-)?({NUMBER})(?![\w])')
+
+# Concordancia de un número suelto con la palabra siguiente ("un año", "una hora")
+FEMININE_EXCEPTIONS = {'día', 'días', 'mapa', 'mapas', 'problema', 'problemas', 'programa', 'programas',
+                       'sistema', 'sistemas', 'tema', 'temas', 'idioma', 'idiomas', 'planeta', 'planetas'}
+FEMININE_ENDINGS = ('a', 'as', 'ión', 'iones', 'dad', 'dades', 'tud', 'tudes')
+FUNCTION_WORDS = {'y', 'o', 'u', 'e', 'ni', 'de', 'del', 'a', 'al', 'en', 'por', 'para', 'con', 'sin', 'que',
+                  'coma', 'menos', 'más', 'entre', 'sobre', 'es', 'son'}
+NEXT_WORD_RE = re.compile(r'\s+([^\W\d_]+)')
+
+# Cifras seguidas a partir de las que un número es un código (teléfono, referencia) y no una cantidad
+CODE_MIN_DIGITS = 7
+# Palabras tras las que un número es un código aunque sea corto ("código postal 28013")
+CODE_CONTEXT_RE = re.compile(
+    r'(?:c[óo]digo postal|c\.\s?p\.|\bcp|tel[ée]fono|m[óo]vil|fax|extensi[óo]n)\s*:?\s*$', re.IGNORECASE
+)
+
+SENTENCE_BOUNDARY = re.compile(r'(?<=[.!?…;:])\s+|\n+')
+CLAUSE_BOUNDARY = re.compile(r'(?<=[,—])\s+')
+
+
+def _size(text):
+    return len(text.encode('utf-8'))
+
+
+def _below_thousand(n, gender):
+    """0 < n < 1000 en palabras ('uno'/'un'/'una' según género o apócope)"""
+    words = []
+    hundreds, rest = divmod(n, 100)
+    if hundreds:
+        if n == 100:
+            return 'cien'
+        word = HUNDREDS[hundreds]
+        if gender == 'f' and hundreds > 1:
+            word = word[:-2] + 'as'
+        words.append(word)
+    if rest:
+        if rest < 30:
+            word = UNITS[rest]
+        else:
+            tens, unit = divmod(rest, 10)
+            word = TENS[tens] + (f' y {UNITS[unit]}' if unit else '')
+        if word.endswith('uno'):
+            if gender == 'f':
+                word = word[:-1] + 'a'
+            elif gender == 'apocope':
+                word = word[:-1]
+                if word == 'veintiun':
+                    word = 'veintiún'
+        words.append(word)
+    return ' '.join(words)
+
+
+def cardinal(n, gender='m'):
+    """Número entero en palabras; gender 'm' (uno), 'apocope' (un) o 'f' (una)"""
+    if n < 0:
+        return f"menos {cardinal(-n, gender)}"
+    if n == 0:
+        return 'cero'
+    if n >= MAX_CARDINAL:
+        return digit_words(str(n))
+
+    words = []
+    for value, singular, plural in ((10 ** 12, 'un billón', 'billones'), (10 ** 6, 'un millón', 'millones')):
+        count, n = divmod(n, value)
+        if count == 1:
+            words.append(singular)
+        elif count:
+            words.append(f"{cardinal(count, 'apocope')} {plural}")
+    # Tras millones/billones el resto de la cifra concuerda con el sustantivo
+    thousands, n = divmod(n, 1000)
+    if thousands == 1:
+        words.append('mil')
+    elif thousands:
+        words.append(f"{_below_thousand(thousands, 'f' if gender == 'f' else 'apocope')} mil")
+    if n:
+        words.append(_below_thousand(n, gender))
+    return ' '.join(words)
+
+
+def ordinal(n, feminine=False, apocope=False):
+    """Ordinal en palabras (1-199); por encima, el cardinal"""
+    if not 0 < n < 200:
+        return cardinal(n)
+    words = ['centésimo'] if n >= 100 else []
+    rest = n % 100
+    tens, unit = divmod(rest, 10)
+    if rest in (11, 12):
+        words.append('undécimo' if rest == 11 else 'duodécimo')
+    elif tens == 1 and unit:
+        words.append('decimo' + ORDINAL_UNITS[unit])
+    else:
+        if tens:
+            words.append(ORDINAL_TENS[tens])
+        if unit:
+            words.append(ORDINAL_UNITS[unit])
+    if feminine:
+        words = [word[:-1] + 'a' for word in words]
+    elif apocope and words[-1] in ('primero', 'tercero'):
+        words[-1] = words[-1][:-1]
+    return ' '.join(words)
+
+
+def _parse_number(text):
+    """'1.234,5' / '3.5' / '12' -> (parte entera, decimales como texto o None)"""
+    if re.fullmatch(r'\d{1,3}(?:\.\d{3})+(?:,\d+)?', text):
+        text = text.replace('.', '')
+    integer, _, decimals = text.replace(',', '.').partition('.')
+    return int(integer), decimals or None
+
+
+def digit_words(digits):
+    """Cifra a cifra: '0800' -> 'cero ocho cero cero'"""
+    return ' '.join(UNITS[int(d)] for d in digits)
+
+
+def _decimals(digits):
+    """Parte decimal: como número si no empieza por cero y es corta; si no, cifra a cifra"""
+    if len(digits) <= 3 and not digits.startswith('0'):
+        return cardinal(int(digits))
+    return digit_words(digits)
+
+
+def number_words(text, gender='m'):
+    """Número escrito ('1.234', '3,5', '-2') en palabras"""
+    negative = text.startswith('-')
+    integer, decimals = _parse_number(text.lstrip('-'))
+    words = cardinal(integer, gender if decimals is None else 'm')
+    if decimals:
+        words = f"{words} coma {_decimals(decimals)}"
+    return f"menos {words}" if negative else words
+
+
+def _is_one(text):
+    integer, decimals = _parse_number(text.lstrip('-'))
+    return integer == 1 and decimals is None
+
+
+def _expand_currency(amount, symbol):
+    singular, plural, gender, cent_singular, cent_plural = CURRENCIES[symbol]
+    negative = amount.startswith('-')
+    integer, decimals = _parse_number(amount.lstrip('-'))
+    amount_gender = 'f' if gender == 'f' else 'apocope'
+    # "un millón de euros"
+    of = 'de ' if integer and integer % 10 ** 6 == 0 else ''
+    words = f"{cardinal(integer, amount_gender)} {of}{singular if integer == 1 else plural}"
+    if decimals:
+        cents = int((decimals + '0')[:2])
+        if cents:
+            words += f" con {cardinal(cents, 'apocope')} {cent_singular if cents == 1 else cent_plural}"
+    return f"menos {words}" if negative else words
+
+
+def _expand_unit(match):
+    amount, unit = match.group(1), match.group(2)
+    singular, plural, gender = UNIT_NAMES[unit]
+    one = _is_one(amount)
+    number = number_words(amount, 'f' if gender == 'f' else 'apocope')
+    return f"{number} {singular if one else plural}"
+
+
+def _expand_date(match):
+    day, month, year = int(match.group(1)), int(match.group(2)), match.group(3)
+    if not (1 <= day <= 31 and 1 <= month <= 12):
+        return match.group(0)
+    if len(year) == 2:
+        year = f"20{year}" if int(year) < 50 else f"19{year}"
+    return f"{cardinal(day)} de {MONTHS[month - 1]} de {cardinal(int(year))}"
+
+
+def _expand_time(match):
+    hour, minute = int(match.group(1)), int(match.group(2))
+    hour_words = cardinal(hour, 'f')
+    if minute == 0:
+        return f"{hour_words} en punto"
+    return f"{hour_words} y {cardinal(minute)}"
+
+
+def _expand_ordinal(match):
+    n, suffix = int(match.group(1)), match.group(2)
+    return ordinal(n, feminine=suffix == 'ª', apocope=suffix == 'er')
+
+
+def _roman_value(numeral):
+    total = 0
+    for current, following in zip(numeral, numeral[1:] + ' '):
+        value = ROMAN[current]
+        total += -value if following != ' ' and ROMAN[following] > value else value
+    return total
+
+
+def _expand_century(match):
+    value = _roman_value(match.group(2))
+    return f"{match.group(1)} {cardinal(value)}" if 0 < value < 100 else match.group(0)
+
+
+def _gender_before(text, position):
+    """Género con el que leer un número según la palabra que le sigue"""
+    following = NEXT_WORD_RE.match(text, position)
+    word = following.group(1).lower() if following else ''
+    if not word or word in FUNCTION_WORDS:
+        return 'm'
+    if word.endswith(FEMININE_ENDINGS) and word not in FEMININE_EXCEPTIONS:
+        return 'f'
+    return 'apocope'
+
+
+def _is_code(match):
+    """¿Es el número un código que se lee cifra a cifra? (teléfono, código postal, referencia)"""
+    number = match.group(2)
+    if not number.isdigit() or match.group(1):
+        return False
+    if len(number) >= CODE_MIN_DIGITS or (len(number) > 1 and number.startswith('0')):
+        return True
+    return CODE_CONTEXT_RE.search(match.string, max(0, match.start() - 20), match.start()) is not None
+
+
+def _expand_number(match):
+    if _is_code(match):
+        return digit_words(match.group(2))
+    sign, number = match.group(1) or '', match.group(2)
+    return number_words(sign + number, _gender_before(match.string, match.end()))
+
+
+@lru_cache(maxsize=TEXT_CACHE_SIZE)
+def _normalize(text):
+    for pattern, expansion in ABBREVIATION_PATTERNS:
+        text = pattern.sub(expansion, text)
+
+    text = CENTURY_RE.sub(_expand_century, text)
+    text = DATE_RE.sub(_expand_date, text)
+    text = TIME_RE.sub(_expand_time, text)
+    text = ORDINAL_RE.sub(_expand_ordinal, text)
+    text = CURRENCY_BEFORE_RE.sub(lambda m: _expand_currency(m.group(2), m.group(1)), text)
+    text = CURRENCY_AFTER_RE.sub(lambda m: _expand_currency(m.group(1), m.group(2)), text)
+    text = PERCENT_RE.sub(lambda m: f"{number_words(m.group(1))} por ciento", text)
+    text = UNIT_RE.sub(_expand_unit, text)
+    text = NUMBER_RE.sub(_expand_number, text)
+    text = text.replace('&', ' y ')
+
+    return re.sub(r'[ \t]+', ' ', text).strip()
+
+
+def normalize(text):
+    """Texto listo para el modelo (memorizado); sin cambios si TEXT_NORMALIZATION=false"""
+    if not TEXT_NORMALIZATION or not text:
+        return text
+    return _normalize(text)
+
+
+def _split_words(text, max_chars):
+    pieces, current = [], ''
+    for word in text.split():
+        if current and _size(current) + 1 + _size(word) > max_chars:
+            pieces.append(current)
+            current = word
+        else:
+            current = f"{current} {word}".strip()
+    if current:
+        pieces.append(current)
+    return pieces
+
+
+@lru_cache(maxsize=TEXT_CACHE_SIZE)
+def _split(text, max_chars):
+    pieces = []
+    for sentence in SENTENCE_BOUNDARY.split(text):
+        sentence = sentence.strip()
+        if not sentence:
+            continue
+        if _size(sentence) <= max_chars:
+            pieces.append(sentence)
+            continue
+        # Frase demasiado larga: cláusulas y, en último caso, palabras
+        current = ''
+        for clause in CLAUSE_BOUNDARY.split(sentence):
+            for part in ([clause] if _size(clause) <= max_chars else _split_words(clause, max_chars)):
+                if current and _size(current) + 1 + _size(part) > max_chars:
+                    pieces.append(current)
+                    current = part
+                else:
+                    current = f"{current} {part}".strip()
+        if current:
+            pieces.append(current)
+    return tuple(pieces)
+
+
+def split(text, max_chars):
+    """Frases (y cláusulas de las frases largas) de como mucho max_chars bytes"""
+    return list(_split(text, max(1, int(max_chars))))
+
+
+@lru_cache(maxsize=TEXT_CACHE_SIZE)
+def _segment(text, max_chars, target_chars):
+    pieces = _split(text, max_chars)
+    if len(pieces) <= 1:
+        return pieces
+
+    # Tantos segmentos como pida el objetivo, todos de longitud parecida
+    total = sum(_size(piece) for piece in pieces) + len(pieces) - 1
+    ideal = total / max(1, math.ceil(total / target_chars))
+
+    segments, current = [], ''
+    for piece in pieces:
+        if not current:
+            current = piece
+            continue
+        joined = _size(current) + 1 + _size(piece)
+        if joined <= max_chars and (joined <= ideal or joined - ideal < ideal - _size(current)):
+            current = f"{current} {piece}"
+        else:
+            segments.append(current)
+            current = piece
+    # Sin colas diminutas: el último trozo corto se une al anterior si cabe
+    if segments and _size(current) < ideal / 2 and _size(segments[-1]) + 1 + _size(current) <= max_chars:
+        current = f"{segments.pop()} {current}"
+    segments.append(current)
+    return tuple(segments)
+
+
+def segment(text, max_chars, target_chars=None):
+    """Segmentos de frases/cláusulas completas equilibrados hacia target_chars bytes"""
+    max_chars = max(1, int(max_chars))
+    target_chars = max(1, min(int(target_chars or max_chars), max_chars))
+    return list(_segment(text, max_chars, target_chars))
+
+
+def target_chars(chars_per_second, speed=1.0, seconds=SEGMENT_TARGET_SECONDS):
+    """Bytes de texto que producen unos `seconds` de audio a esta velocidad"""
+    return max(1, int(chars_per_second * seconds * speed))
+
+
+def stats():
+    normalized = _normalize.cache_info()
+    segmented = _segment.cache_info()
+    return {
+        'enabled': TEXT_NORMALIZATION,
+        'normalize_hits': normalized.hits,
+        'normalize_misses': normalized.misses,
+        'segment_hits': segmented.hits,
+        'segment_misses': segmented.misses
+    }
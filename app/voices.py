@@ -0,0 +1,224 @@
+#!/usr/bin/env python3
+"""
+Registro de voces de referencia para Spanish-F5
+
+Las voces se leen una vez del manifiesto `voices.json` del directorio de
+referencias (id de voz -> archivo WAV, transcripción y metadatos) y se
+sirven desde diccionarios en memoria. Solo se vuelve a cargar cuando cambia
+el directorio, el manifiesto o alguno de los WAV; la comprobación es un
+puñado de stat() como mucho cada VOICES_CHECK_SECONDS, nunca un glob por
+petición.
+
+Sin manifiesto se registra cada WAV del directorio con su nombre como id y
+la transcripción del `.txt` homónimo, si existe.
+
+Formato del manifiesto:
+    {
+      "default": "es_carlos",
+      "voices": {
+        "es_carlos": {"file": "es_masc_presentacion.wav", "text": "Hola, soy Carlos...",
+                      "gender": "male", "description": "Presentación"}
+      },
+      "aliases": {"es_male": "es_carlos"}
+    }
+"""
+
+import os
+import json
+import time
+import hashlib
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+REFERENCES_DIR = os.getenv('REFERENCES_DIR', '/app/references')
+DEFAULT_VOICE = os.getenv('DEFAULT_VOICE', 'es_female')
+VOICES_CHECK_SECONDS = float(os.getenv('VOICES_CHECK_SECONDS', 5))
+
+MANIFEST_FILE = 'voices.json'
+GENERIC_REFERENCE_TEXT = "Esta es una voz de referencia en español con pronunciación natural."
+
+
+class Voice:
+    """Voz registrada: archivo de referencia, transcripción y metadatos"""
+
+    def __init__(self, voice_id, file, text, gender=None, description=None, metadata=None):
+        self.id = voice_id
+        self.file = file                # Ruta absoluta del WAV de referencia
+        self.text = text                # Transcripción exacta de la referencia
+        self.gender = gender
+        self.description = description
+        self.metadata = metadata or {}
+        st = os.stat(file)
+        text_hash = hashlib.sha1(text.encode('utf-8')).hexdigest()[:8]
+        # Cambia si se sustituye el WAV o su transcripción: invalida la caché de audio
+        self.fingerprint = f"{voice_id}@{st.st_mtime_ns}-{st.st_size}-{text_hash}"
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'file': os.path.basename(self.file),
+            'text': self.text,
+            'gender': self.gender,
+            'description': self.description,
+            **self.metadata
+        }
+
+
+class VoiceRegistry:
+    """Índice en memoria de voces, recargado cuando cambian las referencias"""
+
+    def __init__(self, references_dir=REFERENCES_DIR, default_voice=DEFAULT_VOICE,
+                 check_interval=VOICES_CHECK_SECONDS):
+        self.references_dir = references_dir
+        self.default_voice = default_voice
+        self.check_interval = check_interval
+        self.reloads = 0
+        # (voces, alias, archivo -> voz, id por defecto); se sustituye entero al recargar
+        self._state = ({}, {}, {}, None)
+        self._signature = None
+        self._next_check = 0.0
+        self._lock = threading.Lock()
+
+    @property
+    def manifest_path(self):
+        return os.path.join(self.references_dir, MANIFEST_FILE)
+
+    def load(self):
+        """Cargar (o recargar) el registro ahora mismo"""
+        with self._lock:
+            self._reload(self._current_signature())
+            self._next_check = time.monotonic() + self.check_interval
+
+    def _current_signature(self):
+        """Estado en disco del directorio, el manifiesto y los WAV registrados"""
+        signature = []
+        paths = [self.references_dir, self.manifest_path] + sorted(self._state[2])
+        for path in paths:
+            try:
+                st = os.stat(path)
+                signature.append((path, st.st_mtime_ns, st.st_size))
+            except OSError:
+                signature.append((path, None, None))
+        return tuple(signature)
+
+    def _maybe_reload(self):
+        if time.monotonic() < self._next_check:
+            return
+        with self._lock:
+            if time.monotonic() < self._next_check:
+                return
+            self._next_check = time.monotonic() + self.check_interval
+            signature = self._current_signature()
+            if signature != self._signature:
+                self._reload(signature)
+
+    def _reload(self, signature):
+        try:
+            if os.path.exists(self.manifest_path):
+                voices, aliases, manifest_default = self._read_manifest()
+            else:
+                voices, aliases, manifest_default = self._discover(), {}, None
+        except (OSError, ValueError) as e:
+            # Manifiesto a medio escribir o inválido: se mantiene el registro anterior
+            logger.error(f"❌ Error leyendo {MANIFEST_FILE}: {e}")
+            self._signature = signature
+            return
+
+        aliases = {alias: target for alias, target in aliases.items() if target in voices}
+        default = None
+        for candidate in (self.default_voice, manifest_default):
+            candidate = aliases.get(candidate, candidate)
+            if candidate in voices:
+                default = candidate
+                break
+        if default is None and voices:
+            default = sorted(voices)[0]
+
+        by_file = {voice.file: voice for voice in voices.values()}
+        self._state = (voices, aliases, by_file, default)
+        self.reloads += 1
+        # Firma recalculada con los WAV ya registrados
+        self._signature = self._current_signature()
+        logger.info(f"🎤 Registro de voces cargado: {len(voices)} voces (por defecto: {default})")
+
+    def _read_manifest(self):
+        with open(self.manifest_path, encoding='utf-8') as f:
+            manifest = json.load(f)
+        if not isinstance(manifest.get('voices'), dict):
+            raise ValueError("'voices' must be an object")
+
+        voices = {}
+        for voice_id, entry in manifest['voices'].items():
+            entry = dict(entry)
+            path = os.path.join(self.references_dir, entry.pop('file', f"{voice_id}.wav"))
+            if not os.path.isfile(path):
+                logger.warning(f"⚠️  Voz '{voice_id}' sin archivo de referencia: {os.path.basename(path)}")
+                continue
+            voices[voice_id] = Voice(
+                voice_id, path,
+                entry.pop('text', None) or self._sidecar_text(path),
+                entry.pop('gender', None), entry.pop('description', None),
+                metadata=entry
+            )
+        return voices, manifest.get('aliases', {}), manifest.get('default')
+
+    def _discover(self):
+        """Sin manifiesto: una voz por WAV, con el nombre del archivo como id"""
+        voices = {}
+        if not os.path.isdir(self.references_dir):
+            return voices
+        for entry in sorted(os.scandir(self.references_dir), key=lambda e: e.name):
+            if entry.name.endswith('.wav') and entry.is_file():
+                voice_id = os.path.splitext(entry.name)[0]
+                voices[voice_id] = Voice(voice_id, entry.path, self._sidecar_text(entry.path))
+        return voices
+
+    @staticmethod
+    def _sidecar_text(path):
+        try:
+            with open(os.path.splitext(path)[0] + '.txt', encoding='utf-8') as f:
+                return f.read().strip() or GENERIC_REFERENCE_TEXT
+        except OSError:
+            return GENERIC_REFERENCE_TEXT
+
+    def get(self, voice_id=None):
+        """Voz por id o alias; si no existe, la voz por defecto (None si no hay voces)"""
+        self._maybe_reload()
+        voices, aliases, _, default = self._state
+        voice = voices.get(aliases.get(voice_id, voice_id))
+        if voice is None and default is not None:
+            logger.debug(f"Voz desconocida '{voice_id}', usando '{default}'")
+            voice = voices[default]
+        return voice
+
+    def text_for(self, ref_file):
+        """Transcripción de un archivo de referencia registrado"""
+        voice = self._state[2].get(ref_file)
+        return voice.text if voice else GENERIC_REFERENCE_TEXT
+
+    @property
+    def default(self):
+        self._maybe_reload()
+        return self._state[3]
+
+    def list(self):
+        """Voces registradas, ordenadas por id"""
+        self._maybe_reload()
+        voices = self._state[0]
+        return [voices[voice_id] for voice_id in sorted(voices)]
+
+    def aliases(self):
+        self._maybe_reload()
+        return dict(self._state[1])
+
+    def stats(self):
+        voices, aliases, _, default = self._state
+        return {
+            'voices': len(voices),
+            'aliases': len(aliases),
+            'default': default,
+            'reloads': self.reloads,
+            'manifest': os.path.exists(self.manifest_path)
+        }
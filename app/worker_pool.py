@@ -0,0 +1,476 @@
+#!/usr/bin/env python3
+"""
+Pool de workers Spanish-F5 persistentes
+
+Cada worker es un proceso que carga el checkpoint y el vocoder una sola vez
+y después atiende trabajos que le llegan por un pipe. El audio vuelve por un
+segmento de memoria compartida propio de cada worker (o por el pipe si no
+cabe), sin pasar por archivos temporales. Los trabajos van al worker con
+menos trabajo pendiente y un hilo supervisor reinicia los que se caen.
+
+En nodos solo CPU, una inferencia satura con pocos hilos: el modo CPU lanza
+varios workers, cada uno fijado a su bloque de núcleos y con ese número de
+hilos intra-op, para aprovechar la máquina entera.
+"""
+
+import os
+import time
+import uuid
+import queue
+import logging
+import threading
+import multiprocessing
+from multiprocessing import shared_memory
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+CLI_WORKERS = int(os.getenv('CLI_WORKERS', 1))
+CLI_JOB_TIMEOUT = float(os.getenv('CLI_JOB_TIMEOUT', 120))
+WORKER_START_TIMEOUT = float(os.getenv('WORKER_START_TIMEOUT', 600))
+
+# Modo CPU: workers fijados a núcleos ('0' = desactivado, 'auto' = núcleos / hilos por worker)
+CPU_WORKERS = os.getenv('CPU_WORKERS', '0')
+CPU_THREADS_PER_WORKER = int(os.getenv('CPU_THREADS_PER_WORKER', 4))
+# Segmento de memoria compartida por worker para devolver el audio (~5 min a 24 kHz con 32 MB)
+WORKER_SHM_MB = int(os.getenv('WORKER_SHM_MB', 32))
+
+# Misma arquitectura que usa f5-tts_infer-cli para el modelo F5-TTS
+F5_MODEL_CFG = dict(dim=1024, depth=22, heads=16, ff_mult=2, text_dim=512, conv_layers=4)
+
+
+class WorkerModel:
+    """Modelo cargado dentro de un worker, con la interfaz que usa f5_inference"""
+
+    def __init__(self, ckpt_file, device):
+        from f5_tts.model import DiT
+        from f5_tts.infer.utils_infer import load_model, load_vocoder
+
+        self.device = device
+        self.mel_spec_type = 'vocos'
+        self.vocoder = load_vocoder(vocoder_name=self.mel_spec_type, device=device)
+        self.ema_model = load_model(
+            DiT,
+            F5_MODEL_CFG,
+            ckpt_file,
+            mel_spec_type=self.mel_spec_type,
+            vocab_file='',
+            device=device
+        )
+
+
+def _attach_shared_memory(name):
+    """Abrir el segmento del servidor sin que este proceso lo dé por suyo al salir"""
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:  # Python < 3.13
+        return shared_memory.SharedMemory(name=name)
+
+
+def _pin_cpus(cpus):
+    """Fijar afinidad e hilos de BLAS/OpenMP del worker
+
+    Las variables de entorno solo valen para las bibliotecas que aún no se
+    han cargado. Al arrancar el worker, este módulo (y el __main__ del
+    servidor) ya importaron numpy, cuyo BLAS leyó su número de hilos. Por eso
+    el límite se aplica también en caliente con threadpoolctl.
+    """
+    threads = str(len(cpus))
+    for var in ('OMP_NUM_THREADS', 'MKL_NUM_THREADS', 'OPENBLAS_NUM_THREADS'):
+        os.environ[var] = threads
+    try:
+        os.sched_setaffinity(0, cpus)
+    except (AttributeError, OSError) as e:
+        logger.warning(f"⚠️  No se pudo fijar la afinidad de CPU: {e}")
+    _limit_threadpools(len(cpus))
+
+
+def _limit_threadpools(threads):
+    """Limitar los pools de hilos de BLAS/OpenMP ya cargados en el proceso"""
+    try:
+        from threadpoolctl import threadpool_limits
+    except ImportError:
+        logger.warning("⚠️  threadpoolctl no disponible: el BLAS de numpy conserva sus hilos")
+        return
+    threadpool_limits(limits=threads)
+
+
+def _worker_main(conn, ckpt_file, device=None, cpus=None, shm_name=None):
+    """Bucle principal de un worker: cargar el modelo y atender trabajos"""
+    if cpus:
+        _pin_cpus(cpus)
+
+    import torch
+    from reference_cache import ReferenceCache
+    from f5_inference import infer_with_conditioning
+
+    logging.basicConfig(level=logging.INFO)
+    if cpus:
+        # torch trae su propio OpenMP/MKL: también se limita tras importarlo
+        _limit_threadpools(len(cpus))
+        torch.set_num_threads(len(cpus))
+        try:
+            torch.set_num_interop_threads(1)
+        except RuntimeError:
+            pass
+    device = device or ("cuda" if torch.cuda.is_available() else "cpu")
+
+    try:
+        model = WorkerModel(ckpt_file, device)
+        references = ReferenceCache()
+        shm = _attach_shared_memory(shm_name) if shm_name else None
+    except Exception as e:
+        conn.send({'status': 'error', 'error': f"Error cargando modelo: {e}"})
+        return
+
+    conn.send({'status': 'ready', 'pid': os.getpid()})
+
+    while True:
+        try:
+            job = conn.recv()
+        except (EOFError, OSError):
+            break
+
+        if job is None:
+            break
+
+        try:
+            conditioning = references.get(job['ref_audio'], job['ref_text'], device)
+            wav_data, sample_rate = infer_with_conditioning(
+                model,
+                conditioning,
+                job['text'],
+                speed=job['speed'],
+                **job.get('quality', {})
+            )
+            wav_data = np.ascontiguousarray(wav_data, dtype=np.float32)
+
+            # Audio en el segmento compartido si cabe; si no, por el pipe
+            in_shm = shm is not None and wav_data.nbytes <= shm.size
+            if in_shm:
+                view = np.ndarray(wav_data.shape, dtype=np.float32, buffer=shm.buf)
+                view[:] = wav_data
+                del view
+
+            conn.send({
+                'status': 'ok',
+                'job_id': job['job_id'],
+                'sample_rate': sample_rate,
+                'samples': len(wav_data),
+                'shm': in_shm
+            })
+            if not in_shm:
+                conn.send_bytes(memoryview(wav_data).cast('B'))
+
+        except Exception as e:
+            conn.send({'status': 'error', 'job_id': job['job_id'], 'error': str(e)})
+
+    if shm is not None:
+        shm.close()
+
+
+def available_cpus():
+    """CPUs que puede usar este proceso (respeta cgroups/taskset)"""
+    try:
+        return sorted(os.sched_getaffinity(0))
+    except AttributeError:
+        return list(range(os.cpu_count() or 1))
+
+
+def cpu_pool_layout(workers=CPU_WORKERS, threads=CPU_THREADS_PER_WORKER):
+    """Reparto de núcleos entre workers: una lista de CPUs por worker ([] = sin pool)
+
+    Con 'auto' se crean tantos workers como bloques de `threads` núcleos
+    quepan; con un número fijo, los núcleos se reparten a partes iguales.
+    """
+    cpus = available_cpus()
+    if str(workers).lower() == 'auto':
+        count = max(1, len(cpus) // max(1, threads))
+    else:
+        count = int(workers)
+    if count <= 0:
+        return []
+
+    per_worker = max(1, len(cpus) // count)
+    layout = []
+    for i in range(count):
+        block = cpus[i * per_worker:(i + 1) * per_worker]
+        # Más workers que núcleos: se comparten
+        layout.append(block or [cpus[i % len(cpus)]])
+    return layout
+
+
+class _Worker:
+    """Proceso worker visto desde el servidor"""
+
+    def __init__(self, index, ctx, ckpt_file, device=None, cpus=None, shm=None):
+        self.index = index
+        self.cpus = cpus
+        self.shm = shm
+        self.conn, child_conn = ctx.Pipe()
+        self.process = ctx.Process(
+            target=_worker_main,
+            args=(child_conn, ckpt_file, device, cpus, shm.name if shm else None),
+            name=f"f5-worker-{index}",
+            daemon=True
+        )
+        self.process.start()
+        child_conn.close()
+        self.healthy = False
+        self.lock = threading.Lock()  # Un trabajo a la vez por pipe
+        self.inflight = 0             # Trabajos asignados (en curso o esperando)
+        self.pending_chars = 0        # Texto asignado aún sin terminar
+        self.jobs = 0
+        self.pid = None
+
+    def wait_ready(self, timeout):
+        """Esperar a que el worker termine de cargar el modelo"""
+        if not self.conn.poll(timeout):
+            raise Exception(f"Worker {self.index} no respondió en {timeout:.0f}s")
+        message = self.conn.recv()
+        if message.get('status') != 'ready':
+            raise Exception(message.get('error', 'worker no disponible'))
+        self.healthy = True
+        self.pid = message.get('pid')
+        cpus = f", CPUs {self.cpus[0]}-{self.cpus[-1]}" if self.cpus else ""
+        logger.info(f"✅ Worker {self.index} listo (pid {self.pid}{cpus})")
+
+    def run(self, job, timeout):
+        """Enviar un trabajo y recibir el audio en un buffer propio"""
+        self.conn.send(job)
+
+        if not self.conn.poll(timeout):
+            raise TimeoutError(f"Worker {self.index} superó {timeout:.0f}s")
+
+        header = self.conn.recv()
+        if header.get('status') != 'ok':
+            raise Exception(header.get('error', 'error desconocido en worker'))
+
+        if header.get('shm'):
+            # Una sola copia desde la memoria compartida (el siguiente trabajo la sobrescribe)
+            wav_data = np.frombuffer(self.shm.buf, dtype=np.float32, count=header['samples']).copy()
+        else:
+            wav_data = np.empty(header['samples'], dtype=np.float32)
+            if header['samples']:
+                self.conn.recv_bytes_into(memoryview(wav_data).cast('B'))
+        self.jobs += 1
+        return wav_data, header['sample_rate']
+
+    @property
+    def alive(self):
+        return self.healthy and self.process.is_alive()
+
+    def stop(self):
+        try:
+            self.conn.send(None)
+        except Exception:
+            pass
+        self.process.join(timeout=5)
+        if self.process.is_alive():
+            self.process.kill()
+
+
+class WorkerPool:
+    """Pool de workers Spanish-F5 con supervisor y reparto al menos cargado
+
+    Con `cpu_sets` (modo CPU) cada worker queda fijado a sus núcleos con ese
+    número de hilos intra-op, y el audio vuelve por memoria compartida.
+    """
+
+    def __init__(self, ckpt_file, size=CLI_WORKERS, job_timeout=CLI_JOB_TIMEOUT, device=None, cpu_sets=None,
+                 shm_bytes=WORKER_SHM_MB * 1024 * 1024):
+        self.ckpt_file = ckpt_file
+        self.cpu_sets = cpu_sets or []
+        self.size = len(self.cpu_sets) if self.cpu_sets else max(1, size)
+        self.job_timeout = job_timeout
+        self.device = device
+        self.shm_bytes = shm_bytes
+        self.restarts = 0
+        self._ctx = multiprocessing.get_context('spawn')
+        self._shm = {}
+        self._dead = queue.Queue()
+        self._workers = {}
+        self._available = threading.Condition()
+        self._stopping = threading.Event()
+        self._supervisor = None
+
+    def _spawn(self, index):
+        if self.shm_bytes and index not in self._shm:
+            self._shm[index] = shared_memory.SharedMemory(create=True, size=self.shm_bytes)
+        cpus = self.cpu_sets[index] if self.cpu_sets else None
+        return _Worker(index, self._ctx, self.ckpt_file, self.device, cpus, self._shm.get(index))
+
+    def start(self):
+        """Arrancar todos los workers y el supervisor"""
+        logger.info(f"🔥 Arrancando {self.size} workers Spanish-F5 persistentes...")
+        workers = [self._spawn(i) for i in range(self.size)]
+
+        for worker in workers:
+            try:
+                worker.wait_ready(WORKER_START_TIMEOUT)
+            except Exception:
+                for w in workers:
+                    w.stop()
+                self._release_shared_memory()
+                raise
+            self._workers[worker.index] = worker
+
+        self._supervisor = threading.Thread(target=self._supervise, name="f5-worker-supervisor", daemon=True)
+        self._supervisor.start()
+        return True
+
+    def _supervise(self):
+        """Reiniciar los workers caídos"""
+        while not self._stopping.is_set():
+            try:
+                worker = self._dead.get(timeout=5)
+            except queue.Empty:
+                # Detectar workers que murieron estando libres
+                for w in list(self._workers.values()):
+                    if w.healthy and not w.process.is_alive():
+                        w.healthy = False
+                        self._dead.put(w)
+                continue
+
+            if self._stopping.is_set():
+                break
+
+            logger.warning(f"♻️  Reiniciando worker {worker.index}...")
+            worker.stop()
+            try:
+                replacement = self._spawn(worker.index)
+                replacement.wait_ready(WORKER_START_TIMEOUT)
+            except Exception as e:
+                logger.error(f"❌ No se pudo reiniciar worker {worker.index}: {e}")
+                time.sleep(5)
+                self._dead.put(worker)
+                continue
+
+            self.restarts += 1
+            with self._available:
+                self._workers[worker.index] = replacement
+                self._available.notify_all()
+
+    def _mark_dead(self, worker):
+        if worker.healthy:
+            worker.healthy = False
+            self._dead.put(worker)
+
+    def _assign(self, load, deadline):
+        """Elegir el worker vivo con menos trabajo pendiente y reservarlo"""
+        with self._available:
+            while True:
+                candidates = []
+                for worker in self._workers.values():
+                    if worker.alive:
+                        candidates.append(worker)
+                    else:
+                        self._mark_dead(worker)
+                if candidates:
+                    worker = min(candidates, key=lambda w: (w.inflight, w.pending_chars, w.index))
+                    worker.inflight += 1
+                    worker.pending_chars += load
+                    return worker
+
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    raise Exception(f"Ningún worker disponible en {self.job_timeout:.0f}s")
+                self._available.wait(remaining)
+
+    def _release(self, worker, load):
+        with self._available:
+            worker.inflight -= 1
+            worker.pending_chars -= load
+            self._available.notify_all()
+
+    def synthesize(self, text, ref_audio, ref_text, speed=1.0, worker_index=None, quality=None):
+        """Sintetizar en el worker menos cargado (o en uno concreto)
+
+        `quality` son los parámetros de muestreo del nivel (QualityTier.params()).
+        """
+        deadline = time.time() + self.job_timeout
+        job = {
+            'job_id': uuid.uuid4().hex,
+            'text': text,
+            'ref_audio': ref_audio,
+            'ref_text': ref_text,
+            'speed': speed,
+            'quality': quality or {}
+        }
+
+        while True:
+            if worker_index is None:
+                worker = self._assign(len(text), deadline)
+            else:
+                worker = self._workers[worker_index]
+                with self._available:
+                    worker.inflight += 1
+                    worker.pending_chars += len(text)
+
+            try:
+                with worker.lock:
+                    if not worker.alive:
+                        # Murió mientras esperábamos su turno: a otro worker
+                        if worker_index is not None:
+                            raise Exception(f"Worker {worker.index} no disponible")
+                        continue
+                    try:
+                        return worker.run(job, max(1.0, deadline - time.time()))
+                    except (EOFError, OSError, TimeoutError) as e:
+                        # El worker murió o quedó colgado: lo reinicia el supervisor
+                        logger.error(f"💥 Worker {worker.index} perdido: {e}")
+                        self._mark_dead(worker)
+                        raise Exception(f"Worker {worker.index} perdido durante la síntesis: {e}")
+            finally:
+                self._release(worker, len(text))
+
+    def warmup(self, jobs):
+        """Ejecutar (texto, referencia, texto de referencia) en todos los workers a la vez"""
+        def warm(index):
+            for text, ref_audio, ref_text in jobs:
+                try:
+                    self.synthesize(text, ref_audio, ref_text, 1.0, worker_index=index)
+                except Exception as e:
+                    logger.warning(f"⚠️  Calentamiento del worker {index} falló: {e}")
+
+        threads = [threading.Thread(target=warm, args=(index,), daemon=True) for index in list(self._workers)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+    def _release_shared_memory(self):
+        for shm in self._shm.values():
+            try:
+                shm.close()
+                shm.unlink()
+            except (BufferError, FileNotFoundError):
+                pass
+        self._shm.clear()
+
+    def stop(self):
+        self._stopping.set()
+        for worker in self._workers.values():
+            worker.stop()
+        self._release_shared_memory()
+
+    def stats(self):
+        workers = list(self._workers.values())
+        return {
+            'size': self.size,
+            'idle': sum(1 for w in workers if w.alive and w.inflight == 0),
+            'alive': sum(1 for w in workers if w.process.is_alive()),
+            'inflight': sum(w.inflight for w in workers),
+            'restarts': self.restarts,
+            'workers': [
+                {
+                    'index': w.index,
+                    'pid': w.pid,
+                    'cpus': w.cpus,
+                    'inflight': w.inflight,
+                    'jobs': w.jobs
+                }
+                for w in sorted(workers, key=lambda w: w.index)
+            ]
+        }
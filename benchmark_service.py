@@ -0,0 +1,475 @@
+#!/usr/bin/env python3
+"""
+Benchmark de carga del servicio F5-TTS Español
+Usa TestRunner y make_request de test_service.py (solo librerías estándar)
+
+Modos:
+- Bucle cerrado: N clientes concurrentes, cada uno lanza la siguiente
+  petición al recibir la anterior (--concurrency 1,4,16 barre varios).
+- Bucle abierto: llegadas de Poisson a un ritmo fijo (--rate 0.5,1,2),
+  independientes de lo que tarde el servicio. La latencia se mide desde la
+  llegada programada, así que incluye la espera si el cliente se satura.
+
+Cada escenario mezcla textos cortos, medios y largos (--mix) y reporta en
+JSON latencia p50/p95/p99, tiempo hasta el primer byte, RTF (segundos de
+respuesta por segundo de audio), throughput y tasa de errores.
+
+Con --stub el servicio se arranca dentro de este proceso con un modelo
+simulado (audio sintético, retardo de --stub-rtf por segundo de audio): mide
+el coste del propio servidor (colas, lotes, post-procesado, codificación)
+sin GPU ni checkpoint.
+
+Con --quality fast,balanced,quality cada escenario se repite con cada nivel
+de calidad y el JSON añade la comparación de RTF entre niveles
+(quality_comparison), relativa al primero de la lista.
+
+Ejecución:
+    python3 benchmark_service.py --concurrency 1,4,8 --duration 60
+    python3 benchmark_service.py --mode open --rate 0.5,1,2 --duration 120
+    python3 benchmark_service.py --stub --concurrency 16 --requests 500 --output bench.json
+    python3 benchmark_service.py --concurrency 1 --requests 10 --quality fast,balanced,quality
+"""
+
+import os
+import sys
+import json
+import math
+import time
+import random
+import struct
+import tempfile
+import threading
+import itertools
+import urllib.parse
+from concurrent.futures import ThreadPoolExecutor
+
+import test_service
+from test_service import TestRunner, make_request, check_service_availability
+
+APP_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'app')
+REFERENCES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'references')
+
+# Textos por clase de longitud (~2 s, ~8 s y ~25 s de audio)
+TEXTS = {
+    'short': [
+        "Hola, ¿en qué puedo ayudarte?",
+        "Tu pedido ya está en camino.",
+        "Gracias por llamar, que tengas un buen día.",
+    ],
+    'medium': [
+        "La síntesis de voz convierte cualquier texto escrito en audio hablado con una pronunciación natural "
+        "y una entonación clara.",
+        "Mañana se esperan lluvias en el norte de la península y temperaturas suaves en la costa mediterránea.",
+        "Para cambiar la contraseña, entra en la configuración de tu cuenta y sigue las instrucciones del correo.",
+    ],
+    'long': [
+        "El servicio de atención al cliente está disponible de lunes a viernes, de nueve de la mañana a siete "
+        "de la tarde. Si tu consulta es urgente, puedes escribirnos por el chat de la aplicación y uno de "
+        "nuestros agentes te responderá en unos minutos. Recuerda tener a mano tu número de cliente y el "
+        "identificador del pedido para que podamos ayudarte lo antes posible.",
+        "España, México, Argentina, Colombia, Chile y Perú comparten el idioma, pero cada país tiene su "
+        "acento, su vocabulario y sus expresiones propias. Un buen sistema de síntesis debe sonar natural en "
+        "todos ellos, respetar la puntuación y hacer las pausas donde un hablante las haría, sin cortar las "
+        "frases a mitad ni acelerar al final de los párrafos largos.",
+    ],
+}
+DEFAULT_MIX = 'short:6,medium:3,long:1'
+
+ENDPOINTS = ('synthesize_json', 'synthesize', 'synthesize_stream')
+
+
+def parse_mix(spec):
+    """'short:6,medium:3,long:1' -> [('short', 6.0), ...]"""
+    mix = []
+    for part in spec.split(','):
+        name, _, weight = part.partition(':')
+        if name not in TEXTS:
+            raise ValueError(f"Clase de texto desconocida: {name} (disponibles: {', '.join(TEXTS)})")
+        mix.append((name, float(weight or 1)))
+    return mix
+
+
+def percentile(values, p):
+    """Percentil por rango más cercano (None si no hay valores)"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = min(len(ordered), max(1, math.ceil(p / 100 * len(ordered)))) - 1
+    return ordered[index]
+
+
+def distribution(values):
+    if not values:
+        return None
+    return {
+        'p50': percentile(values, 50),
+        'p95': percentile(values, 95),
+        'p99': percentile(values, 99),
+        'mean': sum(values) / len(values),
+        'max': max(values)
+    }
+
+
+def wav_seconds(body):
+    """Duración de un WAV PCM16 mono, también con la cabecera de streaming (tamaño desconocido)"""
+    if len(body) < 44 or body[:4] != b'RIFF':
+        return None
+    sample_rate = struct.unpack('<I', body[24:28])[0]
+    return (len(body) - 44) / 2 / sample_rate if sample_rate else None
+
+
+class LoadGenerator:
+    """Lanza peticiones de síntesis y guarda una muestra por petición"""
+
+    def __init__(self, base_url, endpoint='synthesize_json', mix=DEFAULT_MIX, voice=None, quality=None,
+                 unique=True, seed=None):
+        self.base_url = base_url
+        self.endpoint = endpoint
+        self.mix = parse_mix(mix)
+        self.voice = voice
+        self.quality = quality
+        self.unique = unique
+        self.random = random.Random(seed)
+        self._sequence = itertools.count()
+        self._lock = threading.Lock()
+
+    def next_text(self):
+        with self._lock:
+            text_class = self.random.choices([name for name, _ in self.mix], [w for _, w in self.mix])[0]
+            text = self.random.choice(TEXTS[text_class])
+            n = next(self._sequence)
+        if self.unique:
+            # Sin esto la caché de audio respondería casi todo
+            text = f"{text} Referencia {n}."
+        return text_class, text
+
+    def request(self, text):
+        """(url, datos, cabeceras) para el endpoint configurado"""
+        params = {'text': text, 'language': 'es'}
+        if self.voice:
+            params['voice'] = self.voice
+        if self.quality:
+            params['quality'] = self.quality
+        url = f"{self.base_url}/{self.endpoint}"
+        if self.endpoint == 'synthesize':
+            return url, urllib.parse.urlencode(params), None
+        return url, params, None
+
+    def send(self, scheduled=None):
+        """Una petición; la latencia cuenta desde `scheduled` si se pasa (bucle abierto)"""
+        text_class, text = self.next_text()
+        url, data, headers = self.request(text)
+        started = time.time()
+        origin = scheduled if scheduled is not None else started
+        timings = {}
+        sample = {'class': text_class, 'started': started, 'client_wait': started - origin}
+        try:
+            response = make_request(url, method='POST', data=data, headers=headers, timings=timings)
+        except Exception as e:
+            sample.update({'status': None, 'error': str(e), 'latency': time.time() - origin})
+            return sample
+
+        sample['status'] = response['status_code']
+        sample['latency'] = timings['total'] + sample['client_wait']
+        sample['ttfb'] = timings['ttfb'] + sample['client_wait']
+        sample['bytes'] = len(response['body'])
+        if response['status_code'] != 200:
+            sample['error'] = response['content'][:200]
+            return sample
+
+        if self.endpoint == 'synthesize_json':
+            try:
+                payload = json.loads(response['content'])
+                sample['audio_seconds'] = payload.get('audio_duration')
+                # Nivel que ejecutó el servicio (puede no ser el pedido si el backend no lo distingue)
+                sample['quality'] = payload.get('quality')
+            except ValueError:
+                sample['audio_seconds'] = None
+        else:
+            sample['audio_seconds'] = wav_seconds(response['body'])
+        if sample['audio_seconds']:
+            sample['rtf'] = sample['latency'] / sample['audio_seconds']
+        return sample
+
+    def closed_loop(self, concurrency, duration=None, requests=None):
+        """N clientes que encadenan peticiones hasta agotar la duración o el total"""
+        samples = []
+        remaining = itertools.count()
+        deadline = time.time() + duration if duration else None
+
+        def client():
+            while True:
+                if deadline is not None and time.time() >= deadline:
+                    return
+                if requests is not None and next(remaining) >= requests:
+                    return
+                sample = self.send()
+                with self._lock:
+                    samples.append(sample)
+
+        threads = [threading.Thread(target=client, daemon=True) for _ in range(concurrency)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return samples
+
+    def open_loop(self, rate, duration=None, requests=None, max_in_flight=256):
+        """Llegadas de Poisson a `rate` peticiones/s, sin esperar a las respuestas"""
+        if duration is None and requests is None:
+            raise ValueError("El bucle abierto necesita --duration o --requests")
+        futures = []
+        started = time.time()
+        scheduled = started
+        with ThreadPoolExecutor(max_workers=max_in_flight, thread_name_prefix="bench") as executor:
+            for n in itertools.count():
+                if requests is not None and n >= requests:
+                    break
+                scheduled += self.random.expovariate(rate)
+                if duration is not None and scheduled - started >= duration:
+                    break
+                delay = scheduled - time.time()
+                if delay > 0:
+                    time.sleep(delay)
+                futures.append(executor.submit(self.send, scheduled))
+        return [future.result() for future in futures]
+
+
+def summarize(samples, elapsed):
+    """Métricas agregadas de un escenario"""
+    ok = [s for s in samples if s['status'] == 200]
+    statuses = {}
+    for sample in samples:
+        key = str(sample['status']) if sample['status'] is not None else 'connection_error'
+        statuses[key] = statuses.get(key, 0) + 1
+
+    audio_seconds = sum(s.get('audio_seconds') or 0 for s in ok)
+    by_class = {}
+    for text_class in TEXTS:
+        class_ok = [s for s in ok if s['class'] == text_class]
+        if class_ok:
+            by_class[text_class] = {
+                'requests': sum(1 for s in samples if s['class'] == text_class),
+                'latency': distribution([s['latency'] for s in class_ok]),
+                'rtf': distribution([s['rtf'] for s in class_ok if 'rtf' in s])
+            }
+
+    return {
+        'requests': len(samples),
+        'ok': len(ok),
+        'errors': len(samples) - len(ok),
+        'error_rate': (len(samples) - len(ok)) / len(samples) if samples else 0.0,
+        'statuses': statuses,
+        'elapsed': elapsed,
+        'throughput_rps': len(ok) / elapsed if elapsed > 0 else 0.0,
+        'audio_seconds_per_second': audio_seconds / elapsed if elapsed > 0 else 0.0,
+        'latency': distribution([s['latency'] for s in ok]),
+        'ttfb': distribution([s['ttfb'] for s in ok if 'ttfb' in s]),
+        'rtf': distribution([s['rtf'] for s in ok if 'rtf' in s]),
+        'client_wait': distribution([s['client_wait'] for s in samples]),
+        'served_quality': sorted({s['quality'] for s in ok if s.get('quality')}),
+        'by_class': by_class
+    }
+
+
+def compare_qualities(scenarios):
+    """RTF y latencia de cada nivel de calidad, relativos al primero medido"""
+    tiers = {}
+    for scenario in scenarios:
+        if scenario.get('quality') and scenario['rtf']:
+            tiers.setdefault(scenario['quality'], []).append(scenario)
+    comparison = {}
+    baseline = None
+    for tier, runs in tiers.items():
+        rtf = sum(run['rtf']['p50'] for run in runs) / len(runs)
+        latency = sum(run['latency']['p50'] for run in runs) / len(runs)
+        baseline = baseline or rtf
+        comparison[tier] = {
+            'scenarios': len(runs),
+            'rtf_p50': rtf,
+            'latency_p50': latency,
+            'served_as': sorted({served for run in runs for served in run['served_quality']}),
+            'relative_rtf': rtf / baseline if baseline else None
+        }
+    return comparison
+
+
+class StubModel:
+    """Modelo simulado: audio sintético con la duración esperada tras un retardo de `rtf` por segundo"""
+
+    def __init__(self, rtf=0.0, chars_per_second=15, sample_rate=24000):
+        self.rtf = rtf
+        self.chars_per_second = chars_per_second
+        self.sample_rate = sample_rate
+
+    def infer(self, ref_file=None, ref_text=None, gen_text='', speed=1.0, nfe_step=32, **kwargs):
+        import numpy as np
+        seconds = len(gen_text.encode('utf-8')) / self.chars_per_second / max(speed, 0.1)
+        # El coste simulado escala con los pasos del nivel de calidad, como el real
+        time.sleep(seconds * self.rtf * nfe_step / 32)
+        t = np.arange(int(seconds * self.sample_rate), dtype=np.float32) / self.sample_rate
+        return 0.1 * np.sin(2 * np.pi * 220 * t), self.sample_rate, None
+
+
+def start_stub_service(rtf, server='flask'):
+    """Arrancar el servicio en este proceso con StubModel; devuelve su URL"""
+    workdir = tempfile.mkdtemp(prefix="f5_bench_")
+    os.environ.setdefault('AUDIO_CACHE_DIR', os.path.join(workdir, 'audio_cache'))
+    os.environ.setdefault('DEBUG_AUDIO', 'false')
+    os.environ.setdefault('REFERENCES_DIR', REFERENCES_DIR)
+    sys.path.insert(0, APP_DIR)
+
+    import app as service
+    service.f5_model = StubModel(rtf)
+    service.device = 'cpu'
+    service.voice_registry.load()
+    service.readiness.mark_ready()
+
+    import socket
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        port = sock.getsockname()[1]
+
+    if server == 'asgi':
+        import uvicorn
+        import asgi
+        config = uvicorn.Config(asgi.app, host='127.0.0.1', port=port, log_level='warning')
+        uvicorn_server = uvicorn.Server(config)
+        threading.Thread(target=uvicorn_server.run, name="bench-asgi", daemon=True).start()
+    else:
+        from werkzeug.serving import make_server
+        flask_server = make_server('127.0.0.1', port, service.app, threaded=True)
+        threading.Thread(target=flask_server.serve_forever, name="bench-flask", daemon=True).start()
+
+    base_url = f"http://127.0.0.1:{port}"
+    for _ in range(100):
+        if check_service_availability_at(base_url):
+            break
+        time.sleep(0.1)
+    print(f"🧪 Servicio simulado ({server}, RTF {rtf}) en {base_url}")
+    return base_url
+
+
+def check_service_availability_at(base_url):
+    previous = test_service.BASE_URL
+    test_service.BASE_URL = base_url
+    try:
+        return check_service_availability()
+    finally:
+        test_service.BASE_URL = previous
+
+
+def parse_values(spec, cast):
+    return [cast(value) for value in str(spec).split(',') if value.strip()]
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Benchmark de carga del servicio F5-TTS Español')
+    parser.add_argument('--url', default=test_service.BASE_URL, help='URL del servicio F5-TTS')
+    parser.add_argument('--mode', choices=['closed', 'open'], default='closed',
+                        help='Bucle cerrado (clientes concurrentes) o abierto (ritmo de llegadas)')
+    parser.add_argument('--concurrency', default='1,4', help='Clientes concurrentes (bucle cerrado), lista separada por comas')
+    parser.add_argument('--rate', default='1', help='Peticiones por segundo (bucle abierto), lista separada por comas')
+    parser.add_argument('--duration', type=float, default=None, help='Segundos por escenario')
+    parser.add_argument('--requests', type=int, default=None, help='Peticiones por escenario')
+    parser.add_argument('--warmup', type=int, default=2, help='Peticiones de calentamiento no medidas')
+    parser.add_argument('--endpoint', choices=ENDPOINTS, default='synthesize_json')
+    parser.add_argument('--mix', default=DEFAULT_MIX, help='Pesos de longitud de texto (short:6,medium:3,long:1)')
+    parser.add_argument('--voice', default=None)
+    parser.add_argument('--quality', default=None,
+                        help='Nivel de calidad (fast, balanced, quality, auto); varios separados por comas se comparan')
+    parser.add_argument('--repeat-texts', action='store_true', help='No hacer únicos los textos (permite aciertos de caché)')
+    parser.add_argument('--max-in-flight', type=int, default=256, help='Peticiones simultáneas máximas del cliente (bucle abierto)')
+    parser.add_argument('--max-error-rate', type=float, default=0.01, help='Tasa de errores máxima para dar un escenario por bueno')
+    parser.add_argument('--timeout', type=int, default=300, help='Timeout por petición (segundos)')
+    parser.add_argument('--seed', type=int, default=None)
+    parser.add_argument('--output', default=None, help='Archivo JSON de resultados (por defecto, stdout)')
+    parser.add_argument('--stub', action='store_true', help='Arrancar el servicio en proceso con un modelo simulado')
+    parser.add_argument('--stub-rtf', type=float, default=0.0, help='Segundos de cómputo simulado por segundo de audio')
+    parser.add_argument('--stub-server', choices=['flask', 'asgi'], default='flask')
+    parser.add_argument('--verbose', '-v', action='store_true')
+    args = parser.parse_args()
+
+    if args.duration is None and args.requests is None:
+        args.requests = 20
+
+    test_service.TEST_TIMEOUT = args.timeout
+    base_url = start_stub_service(args.stub_rtf, args.stub_server) if args.stub else args.url
+
+    print("🏋️  BENCHMARK DE CARGA F5-TTS ESPAÑOL")
+    print("=" * 50)
+    print(f"🌐 URL del servicio: {base_url}")
+    print(f"🎯 Endpoint: /{args.endpoint} | Mezcla: {args.mix} | Modo: {args.mode}")
+    print()
+
+    if not check_service_availability_at(base_url):
+        print(f"❌ ERROR: Servicio no disponible en {base_url}")
+        return False
+
+    qualities = parse_values(args.quality, str) if args.quality else [None]
+    generator = LoadGenerator(base_url, args.endpoint, args.mix, args.voice, qualities[0],
+                              unique=not args.repeat_texts, seed=args.seed)
+    if args.warmup:
+        generator.closed_loop(1, requests=args.warmup)
+
+    runner = TestRunner(verbose=args.verbose)
+    scenarios = []
+
+    def scenario(name, run, config):
+        quality = config.get('quality')
+        if quality:
+            name = f"{name}, calidad {quality}"
+
+        def test():
+            generator.quality = quality
+            started = time.time()
+            samples = run()
+            summary = summarize(samples, time.time() - started)
+            scenarios.append(dict(config, name=name, **summary))
+            latency = summary['latency'] or {}
+            print(f"{summary['throughput_rps']:.2f} req/s, p50 {latency.get('p50') or 0:.2f}s, "
+                  f"p99 {latency.get('p99') or 0:.2f}s, errores {summary['error_rate']:.1%}", end=" ")
+            return summary['requests'] > 0 and summary['error_rate'] <= args.max_error_rate
+        runner.run_test(name, test)
+
+    for quality in qualities:
+        if args.mode == 'closed':
+            for concurrency in parse_values(args.concurrency, int):
+                scenario(
+                    f"Bucle cerrado, {concurrency} clientes",
+                    lambda c=concurrency: generator.closed_loop(c, args.duration, args.requests),
+                    {'mode': 'closed', 'concurrency': concurrency, 'quality': quality}
+                )
+        else:
+            for rate in parse_values(args.rate, float):
+                scenario(
+                    f"Bucle abierto, {rate:g} peticiones/s",
+                    lambda r=rate: generator.open_loop(r, args.duration, args.requests, args.max_in_flight),
+                    {'mode': 'open', 'rate': rate, 'quality': quality}
+                )
+
+    success = runner.print_summary()
+
+    report = json.dumps({
+        'url': base_url,
+        'endpoint': args.endpoint,
+        'mix': args.mix,
+        'quality': qualities if args.quality else None,
+        'quality_comparison': compare_qualities(scenarios) if len(qualities) > 1 else None,
+        'stub': {'rtf': args.stub_rtf, 'server': args.stub_server} if args.stub else None,
+        'scenarios': scenarios
+    }, indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(report)
+        print(f"\n📄 Resultados en {args.output}")
+    else:
+        print(report)
+
+    return success
+
+
+if __name__ == '__main__':
+    sys.exit(0 if main() else 1)
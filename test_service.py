@@ -11,7 +11,9 @@ Funcionalidades:
 - ✅ Tests de diferentes voces
 - ✅ Tests de velocidades
 - ✅ Tests de caracteres especiales
+- ✅ Lectura de teléfonos y códigos postales
 - ✅ Tests de rendimiento básico
+- ✅ Niveles de calidad
 - ✅ Diagnóstico del sistema
 
 Ejecución:
@@ -24,6 +26,8 @@ import os
 import sys
 import time
 import json
+import uuid
+import threading
 import urllib.request
 import urllib.parse
 import urllib.error
@@ -115,8 +119,13 @@ class TestRunner:
         return self.tests_failed == 0
 
 
-def make_request(url, method='GET', data=None, headers=None):
-    """Hacer petición HTTP usando urllib"""
+def make_request(url, method='GET', data=None, headers=None, timings=None):
+    """Hacer petición HTTP usando urllib
+    
+    Si se pasa un dict en `timings`, se rellena con 'ttfb' (primer byte del
+    cuerpo) y 'total', en segundos desde el envío.
+    """
+    started = time.time()
     try:
         if headers is None:
             headers = {}
@@ -133,17 +142,27 @@ def make_request(url, method='GET', data=None, headers=None):
         req = urllib.request.Request(url, data=data, headers=headers, method=method)
         
         with urllib.request.urlopen(req, timeout=TEST_TIMEOUT) as response:
-            content = response.read().decode('utf-8')
+            body = response.read(1)
+            if timings is not None:
+                timings['ttfb'] = time.time() - started
+            body += response.read()
+            if timings is not None:
+                timings['total'] = time.time() - started
             return {
                 'status_code': response.getcode(),
-                'content': content,
+                'content': body.decode('utf-8', errors='replace'),
+                'body': body,
                 'headers': dict(response.headers)
             }
             
     except urllib.error.HTTPError as e:
+        body = e.read() if e.fp else b''
+        if timings is not None:
+            timings['ttfb'] = timings['total'] = time.time() - started
         return {
             'status_code': e.code,
-            'content': e.read().decode('utf-8') if e.fp else '',
+            'content': body.decode('utf-8', errors='replace'),
+            'body': body,
             'headers': dict(e.headers) if e.headers else {}
         }
     except Exception as e:
@@ -190,6 +209,32 @@ def test_service_health():
     return True
 
 
+def test_readiness():
+    """Test de /ready: 200 solo con el modelo cargado y calentado"""
+    response = make_request(f"{BASE_URL}/ready")
+    data = json.loads(response['content'])
+    
+    if response['status_code'] not in (200, 503) or 'ready' not in data:
+        if VERBOSE:
+            print(f"❌ Respuesta de /ready inesperada: {response['status_code']}")
+        return False
+    
+    if data['ready'] != (response['status_code'] == 200):
+        if VERBOSE:
+            print(f"❌ Código {response['status_code']} incoherente con ready={data['ready']}")
+        return False
+    
+    if not data['ready']:
+        if VERBOSE:
+            print(f"⚠️  Servicio aún no listo (fase: {data.get('phase')})")
+        return False
+    
+    if VERBOSE:
+        print(f"✅ Listo en {data['time_to_ready']:.1f}s - Fases: {data['phases']}")
+    
+    return True
+
+
 def test_voices_endpoint():
     """Test endpoint de voces disponibles"""
     # Test para español (debe funcionar)
@@ -302,6 +347,15 @@ def test_error_handling():
             print(f"❌ Texto vacío debería dar 400, dio: {response['status_code']}")
         return False
     
+    # Test 1b: Solo espacios (nada que sintetizar tras normalizar)
+    payload = {"text": "   \n\t", "language": "es"}
+    response = make_request(f"{BASE_URL}/synthesize_json", method='POST', data=payload)
+    
+    if response['status_code'] != 400:
+        if VERBOSE:
+            print(f"❌ Texto solo con espacios debería dar 400, dio: {response['status_code']}")
+        return False
+    
     # Test 2: Idioma no soportado
     payload = {"text": "Hello world", "language": "en"}
     response = make_request(f"{BASE_URL}/synthesize_json", method='POST', data=payload)
@@ -320,7 +374,7 @@ def test_error_handling():
         return False
     
     if VERBOSE:
-        print("✅ Manejo de errores correcto (texto vacío, idioma inválido, JSON faltante)")
+        print("✅ Manejo de errores correcto (texto vacío o en blanco, idioma inválido, JSON faltante)")
     
     return True
 
@@ -496,6 +550,305 @@ def test_response_time():
     return True
 
 
+def test_quality_tiers():
+    """Test niveles de calidad: cada nivel se acepta, 'auto' también y uno desconocido da 400
+    
+    La comparación de RTF entre niveles está en benchmark_service.py --quality.
+    """
+    # Sin elección de método ODE (F5TTS.infer, CLI de un solo uso) 'quality' se sirve como 'balanced'
+    served = {'fast': ['fast'], 'balanced': ['balanced'], 'quality': ['quality', 'balanced']}
+    
+    for tier, expected in served.items():
+        # Texto distinto en cada ejecución: la caché de audio no debe responder
+        payload = {
+            "text": f"Prueba del nivel {tier}, marca {time.time_ns()}.",
+            "language": "es",
+            "quality": tier
+        }
+        response = make_request(f"{BASE_URL}/synthesize_json", method='POST', data=payload)
+        if response['status_code'] != 200:
+            if VERBOSE:
+                print(f"   ❌ {tier}: HTTP {response['status_code']}")
+            return False
+        data = json.loads(response['content'])
+        if data.get('quality') not in expected or not data.get('audio_duration'):
+            if VERBOSE:
+                print(f"   ❌ {tier}: respuesta inesperada {data}")
+            return False
+        if VERBOSE:
+            print(f"   ✅ {tier}: servido como {data['quality']}")
+    
+    # El modo automático se acepta e informa del nivel que eligió; nivel desconocido da 400
+    response = make_request(f"{BASE_URL}/synthesize_json", method='POST',
+                            data={"text": "Prueba de calidad automática", "language": "es", "quality": "auto"})
+    if response['status_code'] != 200:
+        return False
+    chosen = json.loads(response['content']).get('quality')
+    if chosen not in served:
+        if VERBOSE:
+            print(f"   ❌ auto: informa '{chosen}' en lugar del nivel servido")
+        return False
+    response = make_request(f"{BASE_URL}/synthesize_json", method='POST',
+                            data={"text": "Prueba", "language": "es", "quality": "ultra"})
+    if response['status_code'] != 400:
+        return False
+    
+    return True
+
+
+def test_streaming_synthesis():
+    """Test síntesis en streaming por frases"""
+    payload = json.dumps({
+        "text": "Primera frase de prueba. Segunda frase de prueba.",
+        "language": "es"
+    }).encode('utf-8')
+    
+    req = urllib.request.Request(
+        f"{BASE_URL}/synthesize_stream",
+        data=payload,
+        headers={'Content-Type': 'application/json'},
+        method='POST'
+    )
+    
+    start_time = time.time()
+    with urllib.request.urlopen(req, timeout=TEST_TIMEOUT) as response:
+        if response.getcode() != 200:
+            if VERBOSE:
+                print(f"❌ Error en streaming: HTTP {response.getcode()}")
+            return False
+        
+        header = response.read(44)
+        first_byte_time = time.time() - start_time
+        body = response.read()
+    
+    if header[:4] != b'RIFF' or header[8:12] != b'WAVE':
+        if VERBOSE:
+            print("❌ Cabecera WAV inválida en streaming")
+        return False
+    
+    if len(body) == 0:
+        if VERBOSE:
+            print("❌ Streaming sin muestras de audio")
+        return False
+    
+    if VERBOSE:
+        print(f"✅ Streaming OK - Cabecera en {first_byte_time:.2f}s, {len(body)} bytes de audio")
+    
+    return True
+
+
+def test_batch_synthesis():
+    """Test síntesis masiva con ítems repetidos (NDJSON)"""
+    items = [
+        {"text": "Bienvenido al servicio.", "id": "welcome"},
+        {"text": "Pulse uno para continuar.", "id": "press-1"},
+        {"text": "Bienvenido al servicio.", "id": "welcome-again"}
+    ]
+    body = "\n".join(json.dumps(item) for item in items).encode('utf-8')
+    
+    req = urllib.request.Request(
+        f"{BASE_URL}/synthesize_batch",
+        data=body,
+        headers={'Content-Type': 'application/x-ndjson'},
+        method='POST'
+    )
+    
+    with urllib.request.urlopen(req, timeout=TEST_TIMEOUT * 2) as response:
+        if response.getcode() != 200:
+            if VERBOSE:
+                print(f"❌ Error en síntesis masiva: HTTP {response.getcode()}")
+            return False
+        lines = [json.loads(line) for line in response.read().decode('utf-8').splitlines() if line.strip()]
+    
+    records = [line for line in lines if 'index' in line]
+    summary = lines[-1] if lines else {}
+    
+    if sorted(record['index'] for record in records) != [0, 1, 2] or not all(r['success'] for r in records):
+        if VERBOSE:
+            print(f"❌ Resultados masivos incompletos: {records}")
+        return False
+    
+    if not summary.get('done') or summary.get('unique') != 2:
+        if VERBOSE:
+            print(f"❌ Resumen masivo inesperado: {summary}")
+        return False
+    
+    by_id = {record['id']: record for record in records}
+    if by_id['welcome']['key'] != by_id['welcome-again']['key']:
+        if VERBOSE:
+            print("❌ Ítems idénticos no deduplicados")
+        return False
+    
+    if VERBOSE:
+        print(f"✅ Síntesis masiva OK - {len(records)} ítems, {summary['unique']} únicos en {summary['elapsed']:.2f}s")
+    
+    return True
+
+
+def test_long_form_synthesis():
+    """Test texto largo: segmentos en paralelo y caché por segmento"""
+    paragraph = ("El ayuntamiento aprobó ayer el nuevo plan de movilidad, que entrará en vigor "
+                 "el próximo mes. Los vecinos podrán consultar los cambios en la web municipal. ")
+    # Marca propia: cada ejecución parte de segmentos aún no sintetizados
+    sections = [f"Apartado {i}. {paragraph}" for i in range(1, 7)]
+    text = f"Boletín {uuid.uuid4().hex[:6]}. " + " ".join(sections)
+    
+    timings = {}
+    response = make_request(f"{BASE_URL}/synthesize_json", method='POST', data={"text": text}, timings=timings)
+    if response['status_code'] != 200:
+        if VERBOSE:
+            print(f"❌ Error en texto largo: HTTP {response['status_code']}")
+        return False
+    
+    data = json.loads(response['content'])
+    # A ~15 bytes por segundo de audio, el artículo dura bastante más que un segmento
+    if data['audio_duration'] < len(text.encode('utf-8')) / 60:
+        if VERBOSE:
+            print(f"❌ Audio demasiado corto para el texto: {data['audio_duration']:.1f}s")
+        return False
+    
+    # Retocar un apartado sin cambiar longitudes (mismos cortes): solo se sintetiza ese segmento
+    edited_text = text.replace("Apartado 4.", "Apartado 9.")
+    before = json.loads(make_request(f"{BASE_URL}/cache/stats")['content'])
+    edited = {}
+    response = make_request(f"{BASE_URL}/synthesize_json", method='POST',
+                            data={"text": edited_text}, timings=edited)
+    if response['status_code'] != 200:
+        if VERBOSE:
+            print(f"❌ Error en texto largo retocado: HTTP {response['status_code']}")
+        return False
+    after = json.loads(make_request(f"{BASE_URL}/cache/stats")['content'])
+    
+    if before.get('enabled'):
+        hits = (after['memory_hits'] + after['disk_hits']) - (before['memory_hits'] + before['disk_hits'])
+        misses = after['misses'] - before['misses']
+        # Fallos: el artículo retocado completo y su segmento cambiado; el resto, aciertos
+        if misses != 2 or hits < 1:
+            if VERBOSE:
+                print(f"❌ El retoque volvió a sintetizar de más: {misses} fallos, {hits} aciertos de caché")
+            return False
+    
+    if VERBOSE:
+        print(f"✅ Texto largo OK - {data['audio_duration']:.1f}s de audio en {timings['total']:.1f}s, "
+              f"retocado en {edited['total']:.1f}s", end=" ")
+    
+    return True
+
+
+def test_request_coalescing():
+    """Test peticiones idénticas simultáneas: una sola síntesis para todas"""
+    payload = {"text": f"Aviso {uuid.uuid4().hex[:6]}: el servicio se interrumpirá esta noche.", "voice": "es_female"}
+    before = json.loads(make_request(f"{BASE_URL}/health")['content']).get('coalescing') or {}
+    
+    results = []
+    def request_audio():
+        results.append(make_request(f"{BASE_URL}/synthesize_json", method='POST', data=dict(payload)))
+    
+    threads = [threading.Thread(target=request_audio) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    
+    if len(results) != 8 or any(r['status_code'] != 200 for r in results):
+        if VERBOSE:
+            print(f"❌ Peticiones simultáneas fallidas: {[r['status_code'] for r in results]}")
+        return False
+    
+    durations = {json.loads(r['content'])['audio_duration'] for r in results}
+    if len(durations) != 1:
+        if VERBOSE:
+            print(f"❌ Resultados distintos para la misma petición: {durations}")
+        return False
+    
+    after = json.loads(make_request(f"{BASE_URL}/health")['content']).get('coalescing') or {}
+    started = after.get('started', 0) - before.get('started', 0)
+    coalesced = after.get('coalesced', 0) - before.get('coalesced', 0)
+    
+    # Una sola inferencia: el resto se adjuntó a ella o llegó ya con el audio en caché
+    if started != 1:
+        if VERBOSE:
+            print(f"❌ 8 peticiones idénticas lanzaron {started} síntesis ({coalesced} agrupadas)")
+        return False
+    
+    if VERBOSE:
+        print(f"✅ 8 peticiones idénticas -> {started} síntesis, {coalesced} agrupadas", end=" ")
+    
+    return True
+
+
+def test_cost_estimate():
+    """Test /estimate: duración y cómputo previstos, y fuente tras sintetizar"""
+    short = {"text": f"Hola {uuid.uuid4().hex[:6]}, ¿en qué puedo ayudarle?", "voice": "es_female", "speed": 1.0}
+    long = dict(short, text=short['text'] + " Le atenderemos de lunes a viernes, de nueve a seis, salvo festivos." * 4)
+    
+    estimates = []
+    for payload in (short, long):
+        response = make_request(f"{BASE_URL}/estimate", method='POST', data=payload)
+        if response['status_code'] != 200:
+            if VERBOSE:
+                print(f"❌ /estimate falló: HTTP {response['status_code']}")
+            return False
+        estimates.append(json.loads(response['content']))
+    
+    brief, paragraph = estimates
+    if not (0 < brief['audio_seconds'] < paragraph['audio_seconds']
+            and 0 < brief['compute_seconds'] < paragraph['compute_seconds']):
+        if VERBOSE:
+            print(f"❌ Previsiones incoherentes: {brief} / {paragraph}")
+        return False
+    
+    response = make_request(f"{BASE_URL}/synthesize_json", method='POST', data=dict(short))
+    if response['status_code'] != 200:
+        if VERBOSE:
+            print(f"❌ Síntesis falló: HTTP {response['status_code']}")
+        return False
+    actual = json.loads(response['content'])['audio_duration']
+    
+    # La duración sale de la misma regla que usa el modelo: error acotado
+    if not 0.5 <= brief['audio_seconds'] / actual <= 2:
+        if VERBOSE:
+            print(f"❌ Duración prevista {brief['audio_seconds']:.2f}s, real {actual:.2f}s")
+        return False
+    
+    again = json.loads(make_request(f"{BASE_URL}/estimate", method='POST', data=dict(short))['content'])
+    if VERBOSE:
+        print(f"✅ Prevista {brief['audio_seconds']:.2f}s, real {actual:.2f}s, "
+              f"cómputo {brief['compute_seconds']:.2f}s vs {paragraph['compute_seconds']:.2f}s; "
+              f"de nuevo: {again['source']}", end=" ")
+    
+    return True
+
+
+def test_code_normalization():
+    """Test normalización de códigos: teléfonos y códigos postales se leen cifra a cifra
+    
+    /estimate cuenta los bytes del texto ya normalizado: el texto con cifras
+    y el mismo texto escrito cifra a cifra deben medir lo mismo.
+    """
+    cases = [
+        ("Llame al 600123456 para confirmar.", "Llame al seis cero cero uno dos tres cuatro cinco seis para confirmar."),
+        ("Código postal 28013, Madrid.", "Código postal dos ocho cero uno tres, Madrid."),
+        ("La oficina del 08001 abre hoy.", "La oficina del cero ocho cero cero uno abre hoy."),
+    ]
+    
+    for written, spelled in cases:
+        chars = []
+        for text in (written, spelled):
+            response = make_request(f"{BASE_URL}/estimate", method='POST', data={"text": text, "voice": "es_female"})
+            if response['status_code'] != 200:
+                if VERBOSE:
+                    print(f"❌ /estimate falló: HTTP {response['status_code']}")
+                return False
+            chars.append(json.loads(response['content'])['chars'])
+        if chars[0] != chars[1]:
+            if VERBOSE:
+                print(f"❌ '{written}' no se lee cifra a cifra ({chars[0]} vs {chars[1]} bytes)")
+            return False
+    
+    return True
+
+
 def test_debug_functionality():
     """Test funcionalidad de debug del servicio"""
     payload = {
@@ -609,6 +962,7 @@ def main():
     
     # Tests básicos
     runner.run_test("Conectividad y salud del servicio", test_service_health)
+    runner.run_test("Preparación (/ready)", test_readiness)
     runner.run_test("Endpoint de voces", test_voices_endpoint)
     runner.run_test("Síntesis básica", test_basic_synthesis)
     runner.run_test("Manejo de errores", test_error_handling)
@@ -618,8 +972,16 @@ def main():
     runner.run_test("Variaciones de velocidad", test_speed_variations)
     runner.run_test("Caracteres especiales", test_special_characters)
     
+    runner.run_test("Síntesis en streaming", test_streaming_synthesis)
+    runner.run_test("Síntesis masiva", test_batch_synthesis)
+    runner.run_test("Texto largo", test_long_form_synthesis)
+    runner.run_test("Peticiones idénticas simultáneas", test_request_coalescing)
+    runner.run_test("Estimación de coste (/estimate)", test_cost_estimate)
+    runner.run_test("Teléfonos y códigos postales", test_code_normalization)
+    
     # Tests de rendimiento
     runner.run_test("Tiempo de respuesta", test_response_time)
+    runner.run_test("Niveles de calidad", test_quality_tiers)
     
     # Tests adicionales
     runner.run_test("Funcionalidad de debug", test_debug_functionality)